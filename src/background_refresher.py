@@ -0,0 +1,134 @@
+import logging
+import threading
+import psutil
+import pytz
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from plugins.plugin_registry import get_plugin_instance
+from refresh_task import PlaylistRefresh
+from utils.refresh_budget import RefreshBudget
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scans for plugin instances that are due for a refresh
+SCAN_INTERVAL_SECONDS = 60
+DEFAULT_WORKERS = 2
+DEFAULT_MEMORY_LIMIT_MB = 256
+
+class BackgroundRefresher:
+    """Keeps the cached image of every plugin instance up to date using a bounded pool of worker threads.
+
+    Periodically scans all playlists for plugin instances that are due for a refresh and regenerates them
+    concurrently, so the refresh task can usually display the latest image without rendering it first.
+
+    Configured with the device config keys `background_refresh` (enable), `background_refresh_workers`
+    (number of concurrent renders) and `background_refresh_memory_limit_mb` (no new renders are started
+    while the process uses more memory than this).
+    """
+
+    def __init__(self, device_config):
+        self.device_config = device_config
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.executor = None
+        self.workers = 0
+        self.in_flight = {}
+
+    def start(self):
+        """Starts the background thread scanning for plugin instances to refresh."""
+        if not self.thread or not self.thread.is_alive():
+            logger.info("Starting background refresher")
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stops scanning and waits for renders in progress to finish."""
+        self.stop_event.set()
+        if self.thread:
+            logger.info("Stopping background refresher")
+            self.thread.join()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.device_config.get_config("background_refresh", default=False):
+                    self.scan()
+            except Exception:
+                logger.exception("Exception during background refresh scan")
+            self.stop_event.wait(SCAN_INTERVAL_SECONDS)
+
+    def scan(self):
+        """Submits refreshes for due plugin instances, up to the number of free workers and the memory limit."""
+        self.in_flight = {key: future for key, future in self.in_flight.items() if not future.done()}
+        executor = self._get_executor()
+
+        current_dt = self._get_current_datetime()
+        for playlist, plugin_instance in self._get_due_instances(current_dt):
+            key = (playlist.name, plugin_instance.plugin_id, plugin_instance.name)
+            if key in self.in_flight:
+                continue
+            if len(self.in_flight) >= self.workers:
+                logger.debug("All background refresh workers busy, deferring remaining instances")
+                break
+            if self._memory_limit_exceeded():
+                break
+
+            logger.info(f"Scheduling background refresh. | playlist: {playlist.name} | plugin_instance: {plugin_instance.name}")
+            self.in_flight[key] = executor.submit(self._refresh, playlist, plugin_instance, current_dt)
+
+    def _get_due_instances(self, current_dt):
+        playlist_manager = self.device_config.get_playlist_manager()
+        for playlist in list(playlist_manager.playlists):
+            for plugin_instance in list(playlist.plugins):
+                if plugin_instance.should_refresh(current_dt):
+                    yield playlist, plugin_instance
+
+    def _refresh(self, playlist, plugin_instance, current_dt):
+        try:
+            if not plugin_instance.should_refresh(current_dt):
+                # refreshed by the refresh task in the meantime
+                return
+
+            plugin_config = self.device_config.get_plugin(plugin_instance.plugin_id)
+            if plugin_config is None:
+                logger.error(f"Plugin config not found for '{plugin_instance.plugin_id}'.")
+                return
+            plugin = get_plugin_instance(plugin_config)
+
+            # reuses the playlist refresh, which saves the image and records the refresh time
+            refresh_action = PlaylistRefresh(playlist, plugin_instance)
+            with RefreshBudget.from_config(self.device_config).stage(RefreshBudget.GENERATE), \
+                    metrics.labels(plugin_id=plugin_instance.plugin_id, instance=plugin_instance.name):
+                refresh_action.execute(plugin, self.device_config, current_dt)
+            self.device_config.write_config()
+        except Exception:
+            logger.exception(f"Background refresh failed. | plugin_instance: {plugin_instance.name}")
+
+    def _get_executor(self):
+        """Returns the worker pool, recreating it if the configured number of workers changed."""
+        workers = max(1, int(self.device_config.get_config("background_refresh_workers", default=DEFAULT_WORKERS)))
+        if self.executor is None or workers != self.workers:
+            if self.executor:
+                self.executor.shutdown(wait=False)
+            logger.info(f"Starting background refresh pool with {workers} workers")
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="background-refresh")
+            self.workers = workers
+        return self.executor
+
+    def _memory_limit_exceeded(self):
+        limit_mb = self.device_config.get_config("background_refresh_memory_limit_mb", default=DEFAULT_MEMORY_LIMIT_MB)
+        rss_mb = psutil.Process().memory_info().rss / (1024 ** 2)
+        if limit_mb and rss_mb >= limit_mb:
+            logger.info(f"Memory limit reached, deferring background refreshes. | rss_mb: {rss_mb:.0f} | limit_mb: {limit_mb}")
+            return True
+        return False
+
+    def _get_current_datetime(self):
+        tz_str = self.device_config.get_config("timezone", default="UTC")
+        return datetime.now(pytz.timezone(tz_str))
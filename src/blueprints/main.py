@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app, render_template, send_file
 import os
 from datetime import datetime
+from utils import metrics
+from utils.image_writer import get_preview_file
 
 main_bp = Blueprint("main", __name__)
 
@@ -35,10 +37,25 @@ def image_updates():
     from flask import Response
     return Response(event_stream(), mimetype='text/event-stream')
 
+@main_bp.route('/api/metrics')
+def get_metrics():
+    """Returns refresh stage timings in the Prometheus text format, or the recent spans as JSON with ?format=json."""
+    if request.args.get("format") == "json":
+        limit = request.args.get("limit", type=int)
+        return jsonify([span._asdict() for span in metrics.get_recent_spans(limit)])
+
+    from flask import Response
+    return Response(metrics.export_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @main_bp.route('/api/current_image')
 def get_current_image():
-    """Serve current_image.png with conditional request support (If-Modified-Since)."""
+    """Serve current_image.png, or its smaller preview with ?preview=1, with conditional request support (If-Modified-Since)."""
     image_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'images', 'current_image.png')
+    if request.args.get('preview'):
+        preview_path = get_preview_file(current_app.config['DEVICE_CONFIG'])
+        # the preview is missing until the first image is written by this version
+        if os.path.exists(preview_path):
+            image_path = preview_path
     
     if not os.path.exists(image_path):
         return jsonify({"error": "Image not found"}), 404
@@ -62,7 +79,7 @@ def get_current_image():
             pass
     
     # Send the file with Last-Modified header
-    response = send_file(image_path, mimetype='image/png')
+    response = send_file(image_path)
     response.headers['Last-Modified'] = last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
     response.headers['Cache-Control'] = 'no-cache'
     return response
@@ -63,6 +63,7 @@ def add_plugin():
             return jsonify({"error": "Failed to add to playlist"}), 500
 
         device_config.write_config()
+        refresh_task.signal_config_change()
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": "Scheduled refresh configured."})
@@ -107,6 +108,7 @@ def create_playlist():
 
         # save changes to device config file
         device_config.write_config()
+        current_app.config['REFRESH_TASK'].signal_config_change()
 
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
@@ -136,6 +138,7 @@ def update_playlist(playlist_name):
     if not result:
         return jsonify({"error": "Failed to delete playlist"}), 500
     device_config.write_config()
+    current_app.config['REFRESH_TASK'].signal_config_change()
 
     return jsonify({"success": True, "message": f"Updated playlist '{playlist_name}'!"})
 
@@ -158,6 +161,7 @@ def delete_playlist(playlist_name):
 
     playlist_manager.delete_playlist(playlist_name)
     device_config.write_config()
+    current_app.config['REFRESH_TASK'].signal_config_change()
 
     return jsonify({"success": True, "message": f"Deleted playlist '{playlist_name}'!"})
 
@@ -1,14 +1,20 @@
-from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory, send_file, url_for, Response
 from plugins.plugin_registry import get_plugin_instance
 from utils.app_utils import resolve_path, handle_request_files, parse_form
 from refresh_task import ManualRefresh, PlaylistRefresh
+from utils.image_cache import get_image_cache
+from io import BytesIO
 import json
 import os
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 plugin_bp = Blueprint("plugin", __name__)
 
+# Longest time a refresh job event stream holds a server thread, clients poll the status URL afterwards
+REFRESH_JOB_EVENTS_MAX_SECONDS = 300
+
 def _delete_plugin_instance_images(device_config, plugin_instance_obj):
     """Delete all images associated with a plugin instance."""
     # Delete the plugin instance's generated image
@@ -110,13 +116,20 @@ def plugin_instance_image(playlist_name, plugin_id, instance_name):
     image_filename = plugin_instance.get_image_path()
     image_path = os.path.join(device_config.plugin_image_dir, image_filename)
 
-    # Check if the image exists
-    if not os.path.exists(image_path):
+    # Serve the image, from memory if it is cached
+    try:
+        encoded, mtime_ns = get_image_cache(device_config).get_encoded(image_path)
+    except FileNotFoundError:
         # Return a placeholder or 404
         return "Image not yet generated", 404
 
-    # Serve the image
-    return send_from_directory(device_config.plugin_image_dir, image_filename)
+    return send_file(
+        BytesIO(encoded),
+        mimetype='image/png',
+        etag=f"{mtime_ns:x}-{len(encoded):x}",
+        last_modified=mtime_ns / 1e9,
+        conditional=True
+    )
 
 @plugin_bp.route('/delete_plugin_instance', methods=['POST'])
 def delete_plugin_instance():
@@ -196,6 +209,7 @@ def update_plugin_instance(instance_name):
             plugin_instance.settings = plugin_settings
 
         device_config.write_config()
+        current_app.config['REFRESH_TASK'].signal_config_change()
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": f"Updated plugin instance {instance_name}."})
@@ -220,11 +234,13 @@ def display_plugin_instance():
         if not plugin_instance:
             return jsonify({"success": False, "message": f"Plugin instance '{plugin_instance_name}' not found"}), 400
 
-        refresh_task.manual_update(PlaylistRefresh(playlist, plugin_instance, force=True))
+        job = refresh_task.submit_manual_update(PlaylistRefresh(playlist, plugin_instance, force=True))
+        if not job:
+            return jsonify({"error": "Background refresh task is not running"}), 500
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"success": True, "message": "Display updated"}), 200
+    return _refresh_job_response(job)
 
 @plugin_bp.route('/update_now', methods=['POST'])
 def update_now():
@@ -239,7 +255,8 @@ def update_now():
 
         # Check if refresh task is running
         if refresh_task.running:
-            refresh_task.manual_update(ManualRefresh(plugin_id, plugin_settings))
+            job = refresh_task.submit_manual_update(ManualRefresh(plugin_id, plugin_settings))
+            return _refresh_job_response(job)
         else:
             # In development mode, directly update the display
             logger.info("Refresh task not running, updating display directly")
@@ -256,3 +273,47 @@ def update_now():
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
     return jsonify({"success": True, "message": "Display updated"}), 200
+
+@plugin_bp.route('/refresh_job/<job_id>')
+def refresh_job_status(job_id):
+    """Returns the status of a manual refresh job."""
+    refresh_task = current_app.config['REFRESH_TASK']
+    job = refresh_task.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Refresh job not found"}), 404
+    return jsonify(job.to_dict())
+
+@plugin_bp.route('/refresh_job/<job_id>/events')
+def refresh_job_events(job_id):
+    """SSE endpoint streaming the status of a manual refresh job until it finishes.
+
+    The stream ends after REFRESH_JOB_EVENTS_MAX_SECONDS even if the job has not finished, so a job that stays
+    queued cannot hold a server thread indefinitely. Clients then poll the job status instead.
+    """
+    refresh_task = current_app.config['REFRESH_TASK']
+    job = refresh_task.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Refresh job not found"}), 404
+
+    def event_stream():
+        deadline = time.monotonic() + REFRESH_JOB_EVENTS_MAX_SECONDS
+        version = None
+        while True:
+            remaining = deadline - time.monotonic()
+            version = job.wait_for_update(version, timeout=max(0, min(30, remaining))) # Keep-alive every 30s
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.is_finished() or time.monotonic() >= deadline:
+                break
+
+    return Response(event_stream(), mimetype='text/event-stream')
+
+def _refresh_job_response(job):
+    """Returns the accepted response for a queued manual refresh job."""
+    response = job.to_dict()
+    response.update({
+        "success": True,
+        "message": "Display update queued",
+        "status_url": url_for('plugin.refresh_job_status', job_id=job.job_id),
+        "events_url": url_for('plugin.refresh_job_events', job_id=job.job_id)
+    })
+    return jsonify(response), 202
@@ -47,7 +47,6 @@ def save_settings():
             return jsonify({"error": "Time Zone is required"}), 400
         if not time_format or time_format not in ["12h", "24h"]:
             return jsonify({"error": "Time format is required"}), 400
-        previous_interval_seconds = device_config.get_config("plugin_cycle_interval_seconds")
         plugin_cycle_interval_seconds = calculate_seconds(int(interval), unit)
         if plugin_cycle_interval_seconds > 86400 or plugin_cycle_interval_seconds <= 0:
             return jsonify({"error": "Plugin cycle interval must be less than 24 hours"}), 400
@@ -57,6 +56,8 @@ def save_settings():
             "orientation": form_data.get("orientation"),
             "inverted_image": form_data.get("invertImage"),
             "log_system_stats": form_data.get("logSystemStats"),
+            "lookahead_rendering": form_data.get("lookaheadRendering"),
+            "background_refresh": form_data.get("backgroundRefresh"),
             "timezone": form_data.get("timezoneName"),
             "time_format": form_data.get("timeFormat"),
             "plugin_cycle_interval_seconds": plugin_cycle_interval_seconds,
@@ -71,10 +72,9 @@ def save_settings():
             settings["image_settings"]["inky_saturation"] = float(form_data.get("inky_saturation", "0.5"))
         device_config.update_config(settings)
 
-        if plugin_cycle_interval_seconds != previous_interval_seconds:
-            # wake the background thread up to signal interval config change
-            refresh_task = current_app.config['REFRESH_TASK']
-            refresh_task.signal_config_change()
+        # wake the background thread up to recompute its next refresh deadline
+        refresh_task = current_app.config['REFRESH_TASK']
+        refresh_task.signal_config_change()
     except RuntimeError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -92,6 +92,13 @@ def shutdown():
         os.system("sudo shutdown -h now")
     return jsonify({"success": True})
 
+@settings_bp.route('/api/system_stats')
+def get_system_stats():
+    """Returns the recent system stats samples, optionally only those taken after the 'since' timestamp."""
+    sampler = current_app.config['SYSTEM_STATS']
+    since = request.args.get("since", type=float)
+    return jsonify({"interval": sampler.get_interval(), "samples": sampler.get_samples(since)})
+
 @settings_bp.route('/download-logs')
 def download_logs():
     try:
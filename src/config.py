@@ -1,6 +1,7 @@
 import os
 import json
 import logging
+import threading
 from dotenv import load_dotenv
 from model import PlaylistManager, RefreshInfo
 from user_manager import UserManager
@@ -22,6 +23,7 @@ class Config:
     plugin_image_dir = os.path.join(BASE_DIR, "static", "images", "plugins")
 
     def __init__(self):
+        self.write_lock = threading.Lock()
         self.config = self.read_config()
         self.plugins_list = self.read_plugins_list()
         self.playlist_manager = self.load_playlist_manager()
@@ -58,10 +60,12 @@ class Config:
     def write_config(self):
         """Updates the cached config from the model objects and writes to the config file."""
         logger.debug(f"Writing device config to {self.config_file}")
-        self.update_value("playlist_config", self.playlist_manager.to_dict())
-        self.update_value("refresh_info", self.refresh_info.to_dict())
-        with open(self.config_file, 'w') as outfile:
-            json.dump(self.config, outfile, indent=4)
+        # the config is written from web requests and background refresh threads
+        with self.write_lock:
+            self.update_value("playlist_config", self.playlist_manager.to_dict())
+            self.update_value("refresh_info", self.refresh_info.to_dict())
+            with open(self.config_file, 'w') as outfile:
+                json.dump(self.config, outfile, indent=4)
 
     def get_config(self, key=None, default={}):
         """Gets the value of a specific configuration key or returns the entire config if none provided."""
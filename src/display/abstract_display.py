@@ -43,3 +43,57 @@ class AbstractDisplay:
             NotImplementedError: If not implemented in a subclass.
         """
         raise NotImplementedError("Method 'display_image(...) must be provided in a subclass.")
+
+    def get_conversion_settings(self):
+        """
+        Returns the settings the display uses to convert an image into its panel buffer.
+
+        Returns:
+            dict: Empty unless overridden by a subclass.
+        """
+        return {}
+
+    def supports_partial_refresh(self):
+        """
+        Returns whether the display can update only the changed regions of the screen.
+
+        Returns:
+            bool: False unless overridden by a subclass.
+        """
+        return False
+
+    def needs_full_refresh(self, image):
+        """
+        Returns whether the image has to be shown with a full refresh, e.g. because the panel is due to be
+        cleared, even if only a small part of it changed.
+
+        Args:
+            image (PIL.Image): The image to be displayed.
+
+        Returns:
+            bool: False unless overridden by a subclass.
+        """
+        return False
+
+    def display_partial(self, image, regions, image_settings=[]):
+        """
+        Method to update only the changed regions of the screen, implemented by displays
+        that support partial refresh.
+
+        Args:
+            image (PIL.Image): The full image to be displayed.
+            regions (list): Changed regions as (left, top, right, bottom) boxes in image coordinates,
+                            right and bottom exclusive.
+            image_settings (list, optional): List of settings to modify how the image is displayed.
+
+        Raises:
+            NotImplementedError: If not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'display_partial(...) must be provided in a subclass.")
+
+    def shutdown(self):
+        """
+        Method to put the display hardware into a safe state when the application stops,
+        implemented by displays that keep their hardware powered between updates.
+        """
+        pass
@@ -1,13 +1,29 @@
+import contextvars
 import fnmatch
+import hashlib
 import json
 import logging
 import threading
+from concurrent.futures import Future
 
-from utils.image_utils import resize_image, change_orientation, apply_image_enhancement
+import numpy as np
+
+from utils.image_utils import prepare_panel_image, compute_image_hash
+from utils.image_writer import get_image_writer
 from display.mock_display import MockDisplay
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# Largest share of the screen that is still updated with a partial refresh
+DEFAULT_PARTIAL_REFRESH_MAX_AREA = 0.25
+# Changed rows closer together than this are merged into one region
+REGION_MERGE_GAP = 16
+# Regions beyond this number are merged into their bounding box
+MAX_REGIONS = 4
+# Seconds given to the image writer to save the last image on shutdown
+STOP_FLUSH_TIMEOUT_SECONDS = 10
+
 # Try to import hardware displays, but don't fail if they're not available
 try:
     from display.inky_display import InkyDisplay
@@ -39,6 +55,15 @@ class DisplayManager:
         self.device_config = device_config
         self.lock = threading.Lock()
         self.update_event = threading.Event()
+        # single frame slot of the display worker, a newer frame replaces a frame that is still waiting
+        self.condition = threading.Condition()
+        self.pending_frame = None
+        self.worker = None
+        self.running = False
+        # last frame sent to the panel, used to find the regions that changed
+        self.last_frame = None
+        # source image hash and display settings of the frame the panel shows
+        self.shown_source = None
      
         display_type = device_config.get_config("display_type", default="inky")
 
@@ -57,15 +82,123 @@ class DisplayManager:
         else:
             raise ValueError(f"Unsupported display type: {display_type}")
 
+    def start(self):
+        """Starts the display worker thread, which from then on owns the display hardware."""
+        if not self.worker or not self.worker.is_alive():
+            logger.info("Starting display worker")
+            self.running = True
+            self.worker = threading.Thread(target=self._run, name="display-worker", daemon=True)
+            self.worker.start()
+
+    def stop(self):
+        """Stops the display worker after the frame it is showing, dropping a frame that is still waiting."""
+        with self.condition:
+            self.running = False
+            stale_frame, self.pending_frame = self.pending_frame, None
+            self.condition.notify_all()
+        if stale_frame:
+            stale_frame[2].cancel()
+        if self.worker:
+            logger.info("Stopping display worker")
+            self.worker.join()
+        get_image_writer().flush(timeout=STOP_FLUSH_TIMEOUT_SECONDS)
+        self.display.shutdown()
+
+    def submit_image(self, image, image_settings=[]):
+
+        """
+        Queues an image for the display worker and returns without waiting for the panel.
+
+        Only the latest frame is kept: a frame that is still waiting when a newer one is submitted
+        is dropped and its future cancelled. Without a running worker the image is shown directly.
+
+        Args:
+            image (PIL.Image): The image to be displayed.
+            image_settings (list, optional): List of settings to modify image rendering.
+
+        Returns:
+            concurrent.futures.Future: Resolves to True if the panel was updated, False if it already
+            showed the image. Cancelled if the frame was dropped for a newer one.
+        """
+
+        future = Future()
+        # the worker shows the frame in the caller's context, keeping its metric labels
+        context = contextvars.copy_context()
+        with self.condition:
+            if self.running:
+                stale_frame, self.pending_frame = self.pending_frame, (image, image_settings, future, context)
+                self.condition.notify_all()
+                queued = True
+            else:
+                queued = False
+
+        if not queued:
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(self._show_image(image, image_settings))
+            except Exception as e:
+                future.set_exception(e)
+        elif stale_frame:
+            logger.info("Dropping frame superseded by a newer frame.")
+            stale_frame[2].cancel()
+        return future
+
+    def _run(self):
+        """Shows the frames in the frame slot until the worker is stopped."""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending_frame or not self.running)
+                if not self.running:
+                    break
+                (image, image_settings, future, context), self.pending_frame = self.pending_frame, None
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(self._show_image, image, image_settings))
+            except Exception as e:
+                logger.exception("Exception while updating the display")
+                future.set_exception(e)
+
     def display_image(self, image, image_settings=[]):
+
+        """
+        Shows the image on the display and waits for the update to finish.
+
+        With a running display worker the image goes through its frame slot, so the update is
+        ordered with other submitted frames. Otherwise the image is shown on the calling thread.
+
+        Args:
+            image (PIL.Image): The image to be displayed.
+            image_settings (list, optional): List of settings to modify image rendering.
+
+        Returns:
+            bool: True if the panel was updated, False if it already showed the image.
+
+        Raises:
+            ValueError: If no valid display instance is found.
+            concurrent.futures.CancelledError: If a newer frame was submitted before this one was shown.
+        """
+
+        if self.running:
+            return self.submit_image(image, image_settings).result()
+        return self._show_image(image, image_settings)
+
+    def _show_image(self, image, image_settings=[]):
         
         """
         Delegates image rendering to the appropriate display instance.
 
+        The panel is only written when the final frame differs from the one it already shows,
+        also across restarts, so identical output from different plugins does not trigger a refresh.
+
         Args:
             image (PIL.Image): The image to be displayed.
             image_settings (list, optional): List of settings to modify image rendering.
 
+        Returns:
+            bool: True if the panel was updated, False if it already showed the image.
+
         Raises:
             ValueError: If no valid display instance is found.
         """
@@ -73,20 +206,153 @@ class DisplayManager:
         with self.lock:
             if not hasattr(self, "display"):
                 raise ValueError("No valid display instance initialized.")
-            
-            # Save the image
-            logger.info(f"Saving image to {self.device_config.current_image_file}")
-            image.save(self.device_config.current_image_file)
+            source = self._get_source_key(compute_image_hash(image), image_settings)
 
             # Resize and adjust orientation
-            image = change_orientation(image, self.device_config.get_config("orientation"))
-            image = resize_image(image, self.device_config.get_resolution(), image_settings)
-            if self.device_config.get_config("inverted_image"): image = image.rotate(180)
-            image = apply_image_enhancement(image, self.device_config.get_config("image_settings"))
-
-            # Pass to the concrete instance to render to the device.
-            self.display.display_image(image, image_settings)
-            
-            # Signal that an update has occurred
-            self.update_event.set()
-            self.update_event.clear()
\ No newline at end of file
+            with metrics.span("postprocess"):
+                panel_image = prepare_panel_image(
+                    image,
+                    self.device_config.get_resolution(),
+                    self.device_config.get_config("orientation"),
+                    inverted=self.device_config.get_config("inverted_image"),
+                    image_settings=image_settings,
+                    enhancements=self.device_config.get_config("image_settings")
+                )
+
+            panel_digest = self._get_panel_digest(panel_image)
+            updated = panel_digest != self.device_config.get_config("panel_digest", default=None)
+            if updated:
+                # Save the image and its preview in the background, web clients are notified once they are written
+                get_image_writer().submit(image, self.device_config, on_written=self._notify_update)
+
+                frame = np.asarray(panel_image)
+                regions = self._get_partial_refresh_regions(frame, panel_image)
+
+                # Pass to the concrete instance to render to the device.
+                with metrics.span("display"):
+                    if regions:
+                        self.display.display_partial(panel_image, regions, image_settings)
+                    else:
+                        self.display.display_image(panel_image, image_settings)
+                self.last_frame = frame
+                # written right away, so a restart never trusts the digest of a frame that was not shown
+                self.device_config.update_value("panel_digest", panel_digest, write=True)
+            else:
+                logger.info("Panel already shows this image, skipping display update.")
+
+            self.shown_source = source
+            return updated
+
+    def shows_image(self, image_hash, image_settings=[]):
+
+        """
+        Returns whether the panel shows the image with the given hash, prepared with the current display
+        settings, so showing it again can be skipped without preparing the panel frame.
+
+        Args:
+            image_hash (str): Hash of the image, as returned by compute_image_hash.
+            image_settings (list, optional): List of settings to modify image rendering.
+        """
+
+        return self.shown_source is not None and self.shown_source == self._get_source_key(image_hash, image_settings)
+
+    def _get_source_key(self, image_hash, image_settings):
+        """Returns a key of the image and the settings its panel frame is prepared with."""
+        return json.dumps([
+            image_hash,
+            self.device_config.get_resolution(),
+            self.device_config.get_config("orientation"),
+            self.device_config.get_config("inverted_image"),
+            image_settings,
+            self.device_config.get_config("image_settings")
+        ], sort_keys=True, default=str)
+
+    def _notify_update(self):
+        """Signals that an update has occurred."""
+        self.update_event.set()
+        self.update_event.clear()
+
+    def _get_panel_digest(self, image):
+
+        """
+        Returns a digest of the buffer the display would write for the final frame.
+
+        The buffer is fully determined by the final frame, the display type and the display's own
+        conversion settings, so these are hashed instead of running the driver conversion twice.
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(compute_image_hash(image).encode())
+        digest.update(self.device_config.get_config("display_type", default="inky").encode())
+        digest.update(json.dumps(self.display.get_conversion_settings(), sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _get_partial_refresh_regions(self, frame, panel_image):
+
+        """
+        Returns the changed regions to update with a partial refresh, or None if a full refresh is needed.
+
+        A full refresh is used when the display does not support partial refresh, partial refresh is
+        disabled in the device config, there is no previous frame, too much of the screen changed, or
+        the display needs a full refresh for the image, e.g. to clear the panel.
+        """
+
+        if not self.display.supports_partial_refresh() or not self.device_config.get_config("partial_refresh", default=True):
+            return None
+        if self.last_frame is None or self.last_frame.shape != frame.shape:
+            return None
+
+        regions = get_changed_regions(self.last_frame, frame)
+        if not regions:
+            return None
+
+        changed_area = sum((right - left) * (bottom - top) for left, top, right, bottom in regions)
+        max_area = self.device_config.get_config("partial_refresh_max_area", default=DEFAULT_PARTIAL_REFRESH_MAX_AREA)
+        if changed_area > max_area * frame.shape[0] * frame.shape[1]:
+            logger.info(f"Too much of the screen changed for a partial refresh. | regions: {regions}")
+            return None
+        if self.display.needs_full_refresh(panel_image):
+            return None
+        return regions
+
+
+def get_changed_regions(previous, current):
+
+    """
+    Returns the bounding boxes of the pixels that differ between two frames of the same shape.
+
+    Changed rows are grouped into horizontal bands, merging bands separated by small gaps, and each
+    band's box spans the changed columns within it.
+
+    Args:
+        previous (numpy.ndarray): The previous frame.
+        current (numpy.ndarray): The new frame.
+
+    Returns:
+        list: (left, top, right, bottom) boxes, right and bottom exclusive. Empty if the frames are equal.
+    """
+
+    changed = previous != current
+    if changed.ndim == 3:
+        changed = changed.any(axis=2)
+
+    changed_rows = np.flatnonzero(changed.any(axis=1))
+    if changed_rows.size == 0:
+        return []
+
+    # split the changed rows into bands wherever the gap between them is too large
+    breaks = np.flatnonzero(np.diff(changed_rows) > REGION_MERGE_GAP) + 1
+    regions = []
+    for band in np.split(changed_rows, breaks):
+        top, bottom = int(band[0]), int(band[-1]) + 1
+        changed_columns = np.flatnonzero(changed[top:bottom].any(axis=0))
+        regions.append((int(changed_columns[0]), top, int(changed_columns[-1]) + 1, bottom))
+
+    if len(regions) > MAX_REGIONS:
+        regions = [(
+            min(region[0] for region in regions),
+            regions[0][1],
+            max(region[2] for region in regions),
+            regions[-1][3]
+        )]
+    return regions
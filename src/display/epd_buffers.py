@@ -0,0 +1,249 @@
+"""
+E-Paper Frame Buffers for InkyPi
+
+Builds the frame buffers sent to Waveshare e-paper panels with numpy, instead of the per-pixel Python
+loops of the vendor drivers' `getbuffer`. Buffers use the drivers' layout: rows in the panel's native
+orientation, padded to whole bytes, with the leftmost pixel in the most significant bit. Landscape images
+are rotated to the panel's portrait orientation the way the drivers rotate them.
+
+Drivers differ in pixel format and polarity. `detect_buffer_format` packs a probe frame with the driver
+and with each of our packers to find out which format a driver uses.
+
+Formats:
+    1bpp          - black and white, bits set for white
+    1bpp_inverted - black and white, bits set for black
+    2bpp_gray     - 4 gray levels, as built by the drivers' getbuffer_4Gray
+    4bpp_7color   - 7 color palette of the ACeP panels
+    4bpp_spectra6 - 6 color palette of the Spectra 6 panels
+
+Usage:
+    from display.epd_buffers import detect_buffer_format, get_buffer
+
+    buffer_format = detect_buffer_format(epd.getbuffer, (epd.width, epd.height))
+    buffer = get_buffer(image, (epd.width, epd.height), buffer_format)
+"""
+
+import numpy as np
+from PIL import Image
+
+# Palette indices of the bi-color panels
+BI_COLOR_BLACK = 0
+BI_COLOR_WHITE = 1
+BI_COLOR_RED = 2
+BI_COLOR_PALETTE = (0, 0, 0, 255, 255, 255, 255, 0, 0)
+
+# Palettes of the color panels, in the order of the color indices sent to the panel
+PALETTE_7COLOR = (0, 0, 0, 255, 255, 255, 0, 255, 0, 0, 0, 255, 255, 0, 0, 255, 255, 0, 255, 128, 0)
+PALETTE_SPECTRA6 = (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0, 0, 0, 0, 0, 0, 255, 0, 255, 0)
+
+ONE_BPP_FORMATS = ("1bpp", "1bpp_inverted")
+
+
+def to_panel_orientation(pixels, panel_size):
+    """
+    Returns the pixel array in the panel's native orientation.
+
+    Landscape arrays are rotated by 90 degrees counter-clockwise, like Image.rotate(90, expand=True)
+    in the drivers.
+
+    Raises:
+        ValueError: If the array fits the panel in neither orientation.
+    """
+    width, height = panel_size
+    if pixels.shape[:2] == (height, width):
+        return pixels
+    if pixels.shape[:2] == (width, height):
+        return np.rot90(pixels)
+    raise ValueError(f"Image size {pixels.shape[1]}x{pixels.shape[0]} does not match the panel size {width}x{height}.")
+
+
+def rotate_to_panel(image, panel_size):
+    """Returns the image in the panel's native orientation, rotating landscape images like the drivers do."""
+    if image.size == tuple(panel_size):
+        return image
+    if image.size == tuple(reversed(panel_size)):
+        return image.transpose(Image.Transpose.ROTATE_90)
+    width, height = panel_size
+    raise ValueError(f"Image size {image.width}x{image.height} does not match the panel size {width}x{height}.")
+
+
+def pack_1bpp(white, invert=False):
+    """
+    Packs a boolean array, True for white pixels, into a 1 bit per pixel buffer.
+
+    Args:
+        white (numpy.ndarray): Boolean array in the panel's native orientation.
+        invert (bool): Sets bits for black instead of white pixels.
+
+    Returns:
+        bytearray: The packed buffer.
+    """
+    packed = np.packbits(white, axis=1)
+    if invert:
+        np.invert(packed, out=packed)
+    return bytearray(packed.tobytes())
+
+
+def quantize_bi_color(image):
+    """Dithers the image to black, white and red, returning the palette index of each pixel."""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    palette_img = Image.new('P', (1, 1))
+    palette_img.putpalette(BI_COLOR_PALETTE)
+    indexed_img = image.quantize(palette=palette_img, dither=Image.Dither.FLOYDSTEINBERG)
+    return np.asarray(indexed_img)
+
+
+def split_bi_color_layers(image):
+    """
+    Convert image into two 1-bit layers for bi-color (black and red) e-paper displays.
+    """
+    indices = quantize_bi_color(image)
+    black_layer = Image.fromarray(indices != BI_COLOR_BLACK)
+    red_layer = Image.fromarray(indices != BI_COLOR_RED)
+    return black_layer, red_layer
+
+
+def split_bi_color_buffers(image, panel_size, invert=False):
+    """
+    Dithers the image to black, white and red and packs the black and red layers in one pass.
+
+    Each layer has its bits cleared where its color is shown and set everywhere else, or the
+    other way around with invert.
+
+    Args:
+        image (PIL.Image): Image of the panel size, in either orientation.
+        panel_size (tuple): Native panel size as (width, height).
+        invert (bool): Whether the driver sets bits for the colored pixels.
+
+    Returns:
+        tuple: The packed black and red layer buffers.
+    """
+    indices = to_panel_orientation(quantize_bi_color(image), panel_size)
+    black_buffer = pack_1bpp(indices != BI_COLOR_BLACK, invert)
+    red_buffer = pack_1bpp(indices != BI_COLOR_RED, invert)
+    return black_buffer, red_buffer
+
+
+def pack_image_1bpp(image, panel_size, invert=False):
+    """Dithers the image to black and white and packs it at 1 bit per pixel."""
+    image = rotate_to_panel(image, panel_size)
+    if image.mode != '1':
+        image = image.convert('1')
+    return pack_1bpp(np.asarray(image), invert)
+
+
+def pack_image_2bpp_gray(image, panel_size):
+    """
+    Packs the image at 2 bits per pixel, four pixels per byte, for 4 gray panels.
+
+    Like the drivers, gray 0xC0 and 0x80 are first moved to 0x80 and 0x40 and each pixel then
+    keeps its top 2 bits, so the levels 0x00, 0x40, 0x80 and 0xFF map to the panel's four grays.
+
+    Raises:
+        ValueError: If the panel width is not a multiple of 4.
+    """
+    width, _ = panel_size
+    if width % 4:
+        raise ValueError(f"Panel width {width} is not a multiple of 4.")
+
+    gray = np.asarray(rotate_to_panel(image, panel_size).convert('L'))
+    gray = np.where(gray == 0xC0, 0x80, np.where(gray == 0x80, 0x40, gray)).astype(np.uint8)
+    levels = gray >> 6
+    packed = (levels[:, 0::4] << 6) | (levels[:, 1::4] << 4) | (levels[:, 2::4] << 2) | levels[:, 3::4]
+    return bytearray(packed.astype(np.uint8).tobytes())
+
+
+def pack_image_4bpp(image, panel_size, palette):
+    """
+    Dithers the image to the palette and packs it at 4 bits per pixel, two pixels per byte.
+
+    Each byte holds the color index of one pixel in its high and of the next pixel in its low nibble.
+    """
+    palette_img = Image.new('P', (1, 1))
+    palette_img.putpalette(palette + (0, 0, 0) * (256 - len(palette) // 3))
+
+    image = rotate_to_panel(image, panel_size).convert('RGB')
+    indices = np.asarray(image.quantize(palette=palette_img)).reshape(-1)
+    packed = (indices[0::2] << 4) + indices[1::2]
+    return bytearray(packed.astype(np.uint8).tobytes())
+
+
+BUFFER_PACKERS = {
+    "1bpp": lambda image, panel_size: pack_image_1bpp(image, panel_size),
+    "1bpp_inverted": lambda image, panel_size: pack_image_1bpp(image, panel_size, invert=True),
+    "2bpp_gray": pack_image_2bpp_gray,
+    "4bpp_7color": lambda image, panel_size: pack_image_4bpp(image, panel_size, PALETTE_7COLOR),
+    "4bpp_spectra6": lambda image, panel_size: pack_image_4bpp(image, panel_size, PALETTE_SPECTRA6),
+}
+
+
+def get_buffer(image, panel_size, buffer_format):
+    """
+    Packs the image into a frame buffer of the given format.
+
+    Args:
+        image (PIL.Image): Image of the panel size, in either orientation.
+        panel_size (tuple): Native panel size as (width, height).
+        buffer_format (str): One of the formats in BUFFER_PACKERS.
+
+    Returns:
+        bytearray: The packed buffer.
+    """
+    return BUFFER_PACKERS[buffer_format](image, panel_size)
+
+
+def detect_buffer_format(getbuffer, panel_size, formats=None):
+    """
+    Finds the format of the driver's frame buffers by packing a probe frame with the driver and our packers.
+
+    Args:
+        getbuffer (callable): The driver's getbuffer method.
+        panel_size (tuple): Native panel size as (width, height).
+        formats (iterable, optional): Formats to consider, all formats by default.
+
+    Returns:
+        str or None: The matching format, None if the driver uses a layout none of the packers produce.
+    """
+    width, height = panel_size
+    probe = _get_probe_image(width, height)
+
+    try:
+        driver_buffer = bytes(bytearray(getbuffer(probe.copy())))
+    except Exception:
+        return None
+
+    for buffer_format in formats or BUFFER_PACKERS:
+        try:
+            buffer = bytes(get_buffer(probe, panel_size, buffer_format))
+        except ValueError:
+            continue
+        if len(buffer) != len(driver_buffer):
+            continue
+        if buffer_format in ONE_BPP_FORMATS:
+            # drivers differ in the value of the padding bits at the end of each row
+            if np.array_equal(_strip_row_padding(driver_buffer, width, height), _strip_row_padding(buffer, width, height)):
+                return buffer_format
+        elif buffer == driver_buffer:
+            return buffer_format
+    return None
+
+
+def _get_probe_image(width, height):
+    """Returns an image whose pixels tell apart bit order, row stride, polarity and palette order."""
+    colors = np.array([
+        (0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255), (255, 0, 0), (255, 255, 0), (255, 128, 0),
+        (64, 64, 64), (128, 128, 128), (192, 192, 192)
+    ], dtype=np.uint8)
+    rows, columns = np.indices((height, width))
+    pattern = (rows * 7 + columns * 3 + rows * columns) % len(colors)
+    return Image.fromarray(colors[pattern])
+
+
+def _strip_row_padding(buffer, width, height):
+    """Returns the packed rows with the padding bits of each row cleared."""
+    bytes_per_row = (width + 7) // 8
+    packed = np.frombuffer(buffer, dtype=np.uint8).reshape(height, bytes_per_row).copy()
+    if width % 8:
+        packed[:, -1] &= (0xFF << (8 - width % 8)) & 0xFF
+    return packed
@@ -61,4 +61,7 @@ class InkyDisplay(AbstractDisplay):
         inky_saturation = self.device_config.get_config('image_settings').get("inky_saturation", 0.5)
         logger.info(f"Inky Saturation: {inky_saturation}")
         self.inky_display.set_image(image, saturation=inky_saturation)
-        self.inky_display.show()
\ No newline at end of file
+        self.inky_display.show()
+
+    def get_conversion_settings(self):
+        return {"inky_saturation": self.device_config.get_config('image_settings').get("inky_saturation", 0.5)}
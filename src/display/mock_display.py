@@ -26,4 +26,11 @@ class MockDisplay(AbstractDisplay):
         image.save(filepath, "PNG")
         
         # Also save as latest.png for convenience
-        image.save(os.path.join(self.output_dir, 'latest.png'), "PNG")
\ No newline at end of file
+        image.save(os.path.join(self.output_dir, 'latest.png'), "PNG")
+
+    def supports_partial_refresh(self):
+        return True
+
+    def display_partial(self, image, regions, image_settings=[]):
+        logger.info(f"Mock display partial refresh. | regions: {regions}")
+        self.display_image(image, image_settings)
@@ -0,0 +1,113 @@
+"""
+Panel Power State for InkyPi
+
+Keeps an e-paper controller awake while updates follow each other closely and puts it to sleep once no
+update came for `panel_idle_sleep_seconds` (0 sleeps right after every update, as the drivers suggest).
+The controller is only initialized again when it was asleep or has to change between the full and the
+partial refresh mode, instead of around every frame.
+
+Controller inits and sleeps are timed as the `panel_init` and `panel_sleep` metric stages, which also
+count them.
+
+Usage:
+    power = PanelPower(device_config, {PanelPower.FULL: epd.init, PanelPower.PARTIAL: epd.init_part}, epd.sleep)
+
+    with power.awake(PanelPower.FULL):
+        epd.display(buffer)
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_SLEEP_SECONDS = 60
+
+
+class PanelPower:
+    """Power state machine of a panel controller: asleep, or awake in the full or partial refresh mode."""
+
+    ASLEEP = "asleep"
+    FULL = "full"
+    PARTIAL = "partial"
+
+    def __init__(self, device_config, init_functions, sleep_function, state=ASLEEP):
+        self.device_config = device_config
+        self.init_functions = init_functions
+        self.sleep_function = sleep_function
+        self.state = state
+        self.lock = threading.RLock()
+        self.sleep_timer = None
+
+    def get_idle_timeout(self):
+        return self.device_config.get_config("panel_idle_sleep_seconds", default=DEFAULT_IDLE_SLEEP_SECONDS)
+
+    @contextmanager
+    def awake(self, mode):
+        """Keeps the controller awake in the given mode while the context runs, scheduling its sleep afterwards."""
+        with self.lock:
+            self._cancel_sleep()
+            self.wake(mode)
+            try:
+                yield
+            except BaseException:
+                # the controller state is unknown after a failed update, so it is initialized again for the next one
+                try:
+                    self.sleep()
+                except Exception:
+                    logger.exception("Failed to put panel controller into sleep mode")
+                raise
+            self.schedule_sleep()
+
+    def wake(self, mode):
+        """Initializes the controller in the given mode, unless it is already awake in that mode."""
+        with self.lock:
+            if self.state == mode:
+                return
+            logger.debug(f"Initializing panel controller. | from: {self.state} | to: {mode}")
+            with metrics.span("panel_init"):
+                self.init_functions[mode]()
+            self.state = mode
+
+    def sleep(self):
+        """Puts the controller to sleep now, if it is awake."""
+        with self.lock:
+            self._cancel_sleep()
+            if self.state == PanelPower.ASLEEP:
+                return
+            logger.info("Putting panel controller into sleep mode for power saving.")
+            # the controller has to be initialized again after a failed sleep as well
+            self.state = PanelPower.ASLEEP
+            with metrics.span("panel_sleep"):
+                self.sleep_function()
+
+    def schedule_sleep(self):
+        """Puts the controller to sleep once it has been idle for the configured timeout."""
+        with self.lock:
+            self._cancel_sleep()
+            timeout = self.get_idle_timeout()
+            if not timeout:
+                self.sleep()
+                return
+            self.sleep_timer = threading.Timer(timeout, self._sleep_when_idle)
+            self.sleep_timer.daemon = True
+            self.sleep_timer.start()
+
+    def _sleep_when_idle(self):
+        with self.lock:
+            # an update started after the timer fired, it schedules its own sleep
+            if self.sleep_timer is not threading.current_thread():
+                return
+            self.sleep_timer = None
+            try:
+                self.sleep()
+            except Exception:
+                logger.exception("Failed to put panel controller into sleep mode")
+
+    def _cancel_sleep(self):
+        if self.sleep_timer is not None:
+            self.sleep_timer.cancel()
+            self.sleep_timer = None
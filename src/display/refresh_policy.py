@@ -0,0 +1,91 @@
+"""
+E-Paper Clear Policy for InkyPi
+
+Decides when an e-paper panel is fully cleared before an update. Clearing removes the ghosting left by
+previous images, but it doubles the time and wear of an update, so the panel is only cleared every
+`clear_every` updates, or when the new image differs from the shown one in more than `change_threshold`
+of its area. The number of updates since the last clear is kept in the device config, so it survives
+restarts.
+
+The policy is set per display type with the `clear_policy` device config, for example:
+
+    "clear_policy": {
+        "default": {"clear_every": 10, "change_threshold": 0.5},
+        "epd7in3e": {"clear_every": 5}
+    }
+
+A `clear_every` of 1 clears before every update, 0 never clears because of the number of updates.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLEAR_POLICY = {
+    "clear_every": 10,
+    "change_threshold": 0.5
+}
+# Frames are compared at a reduced size, the factor each side is reduced by
+THUMBNAIL_REDUCTION = 8
+# Gray level difference above which a pixel of the reduced frame counts as changed
+PIXEL_CHANGE_THRESHOLD = 32
+
+
+class ClearPolicy:
+    """Tracks the updates since the last full clear and decides whether the next update clears the panel."""
+
+    def __init__(self, device_config, display_type):
+        self.device_config = device_config
+        self.display_type = display_type
+        self.last_thumbnail = None
+
+    def get_policy(self):
+        """Returns the policy for the display type, the defaults overridden by the configured values."""
+        configured = self.device_config.get_config("clear_policy", default={})
+        policy = dict(DEFAULT_CLEAR_POLICY)
+        policy.update(configured.get("default", {}))
+        policy.update(configured.get(self.display_type, {}))
+        return policy
+
+    def get_refreshes_since_clear(self):
+        return self.device_config.get_config("refreshes_since_clear", default=0)
+
+    def should_clear(self, image):
+        """Returns whether the panel should be cleared before showing the image, and why."""
+        policy = self.get_policy()
+        clear_every = policy["clear_every"]
+        refreshes = self.get_refreshes_since_clear()
+
+        if clear_every and refreshes + 1 >= clear_every:
+            return True, f"{refreshes} updates since last clear"
+
+        change = self.get_change_ratio(image)
+        if change is not None and change > policy["change_threshold"]:
+            return True, f"{change:.0%} of the image changed"
+
+        return False, None
+
+    def get_change_ratio(self, image):
+        """Returns the share of the image that differs from the last shown image, None if there is none."""
+        if self.last_thumbnail is None:
+            return None
+        thumbnail = _get_thumbnail(image)
+        if thumbnail.shape != self.last_thumbnail.shape:
+            return None
+        difference = np.abs(thumbnail - self.last_thumbnail)
+        return float(np.mean(difference > PIXEL_CHANGE_THRESHOLD))
+
+    def record_update(self, image, cleared):
+        """Records an update of the panel, resetting the count if the panel was cleared before it."""
+        self.last_thumbnail = _get_thumbnail(image)
+        refreshes = 0 if cleared else self.get_refreshes_since_clear() + 1
+        # persisted with the next config write
+        self.device_config.update_value("refreshes_since_clear", refreshes)
+
+
+def _get_thumbnail(image):
+    """Returns a reduced grayscale copy of the image as a signed array, for comparing frames."""
+    thumbnail = image.convert('L').reduce(THUMBNAIL_REDUCTION)
+    return np.asarray(thumbnail, dtype=np.int16)
@@ -4,29 +4,17 @@ import logging
 import sys
 
 from display.abstract_display import AbstractDisplay
-from PIL import Image
+from display.panel_power import PanelPower
+from display.refresh_policy import ClearPolicy
+from display.epd_buffers import ONE_BPP_FORMATS, detect_buffer_format, get_buffer, split_bi_color_buffers, split_bi_color_layers
 from pathlib import Path
 from plugins.plugin_registry import get_plugin_instance
 
 logger = logging.getLogger(__name__)
 
-
-def split_image_for_bi_color_epd(image):
-    """
-    Convert image into two 1-bit layers for bi-color (black and red) e-paper displays.
-    """
-    black = (0, 0, 0)
-    white = (255, 255, 255)
-    red = (255, 0, 0)
-
-    palette_data = [*black, *white, *red]
-    palette_img = Image.new('P', (1, 1))
-    palette_img.putpalette(palette_data)
-
-    indexed_img = image.quantize(palette=palette_img, dither=Image.Dither.FLOYDSTEINBERG)
-    black_layer = indexed_img.point(lambda p: 0 if p == 0 else 1, mode='1')
-    red_layer = indexed_img.point(lambda p: 0 if p == 2 else 1, mode='1')
-    return black_layer, red_layer
+# Partial refresh methods, their casing differs between Waveshare drivers
+PARTIAL_DISPLAY_METHODS = ("display_Partial", "displayPartial", "display_partial")
+PARTIAL_INIT_METHODS = ("init_part", "init_Partial", "init_partial")
 
 
 class WaveshareDisplay(AbstractDisplay):
@@ -90,6 +78,34 @@ class WaveshareDisplay(AbstractDisplay):
 
         self.bi_color_display = len(display_args_spec.args) > 2
 
+        # Frame buffers are packed with numpy if the driver's buffer format is recognized
+        self.buffer_format = self.get_buffer_format(display_type)
+        self.clear_policy = ClearPolicy(self.device_config, display_type)
+
+        # Partial refresh takes either a full frame buffer, or a region buffer with its coordinates
+        self.epd_display_partial = None
+        self.partial_region_args = False
+        if not self.bi_color_display:
+            for method_name in PARTIAL_DISPLAY_METHODS:
+                method = getattr(self.epd_display, method_name, None)
+                if callable(method):
+                    self.epd_display_partial = method
+                    self.partial_region_args = len(inspect.getfullargspec(method).args) >= 6
+                    break
+        self.epd_display_init_partial = next(
+            (getattr(self.epd_display, name) for name in PARTIAL_INIT_METHODS
+             if callable(getattr(self.epd_display, name, None))),
+            None
+        )
+
+        # The controller stays awake between updates that follow each other closely
+        init_functions = {PanelPower.FULL: self.epd_display_init}
+        if self.epd_display_init_partial:
+            init_functions[PanelPower.PARTIAL] = self.epd_display_init_partial
+        self.partial_power_mode = PanelPower.PARTIAL if self.epd_display_init_partial else PanelPower.FULL
+        self.power = PanelPower(self.device_config, init_functions, self.epd_display.sleep, state=PanelPower.FULL)
+        self.power.schedule_sleep()
+
         # update the resolution directly from the loaded device context
         if not self.device_config.get_config("resolution"):
             w, h = int(self.epd_display.width), int(self.epd_display.height)
@@ -120,23 +136,115 @@ class WaveshareDisplay(AbstractDisplay):
         if not image:
             raise ValueError(f"No image provided.")
 
-        # Assume device was in sleep mode.
-        self.epd_display_init()
+        # Wakes the device if it is in sleep mode, it is put into low power mode once updates stop
+        # (EPD displays maintain image when powered off)
+        with self.power.awake(PanelPower.FULL):
+            # Clear residual pixels before updating the image, when the policy calls for it.
+            clear, reason = self.clear_policy.should_clear(image)
+            if clear:
+                logger.info(f"Clearing Waveshare display. | reason: {reason}")
+                self.epd_display.Clear()
+
+            # Display the image on the WS display.
+            if not self.bi_color_display:
+                self.epd_display.display(self.get_buffer(image))
+            elif self.buffer_format in ONE_BPP_FORMATS:
+                invert = self.buffer_format == "1bpp_inverted"
+                self.epd_display.display(*split_bi_color_buffers(image, self.get_panel_size(), invert))
+            else:
+                black_layer, red_layer = split_bi_color_layers(image)
+
+                self.epd_display.display(
+                    self.epd_display.getbuffer(black_layer),
+                    self.epd_display.getbuffer(red_layer),
+                )
+            self.clear_policy.record_update(image, cleared=clear)
+
+    def get_panel_size(self):
+        """Returns the panel size in its native orientation, as used by the driver's buffers."""
+        return int(self.epd_display.width), int(self.epd_display.height)
+
+    def get_buffer_format(self, display_type):
+        """
+        Returns the format of the driver's frame buffers, None if it is not one InkyPi can pack.
 
-        # Clear residual pixels before updating the image.
-        self.epd_display.Clear()
+        Detecting the format runs the driver's getbuffer once, which is slow for some drivers,
+        so the result is stored in the device config for the display type.
+        """
+        stored = self.device_config.get_config("epd_buffer_format", default={})
+        if stored.get("display_type") == display_type:
+            return stored.get("format")
+
+        formats = ONE_BPP_FORMATS if self.bi_color_display else None
+        buffer_format = detect_buffer_format(self.epd_display.getbuffer, self.get_panel_size(), formats)
+        logger.info(f"Detected Waveshare buffer format. | display_type: {display_type} | format: {buffer_format}")
+        self.device_config.update_value(
+            "epd_buffer_format",
+            {"display_type": display_type, "format": buffer_format},
+            write=True)
+        return buffer_format
+
+    def get_buffer(self, image):
+        """Packs the image into the driver's frame buffer, with numpy if the format is known."""
+        if self.buffer_format is None:
+            return self.epd_display.getbuffer(image)
+        return get_buffer(image, self.get_panel_size(), self.buffer_format)
+
+    def supports_partial_refresh(self):
+        # region buffers are sliced from the frame buffer assuming one bit per pixel
+        if self.partial_region_args and self.buffer_format not in ONE_BPP_FORMATS:
+            return False
+        return self.epd_display_partial is not None
+
+    def needs_full_refresh(self, image):
+        # partial refreshes cannot clear the panel, so a due clear takes a full refresh
+        clear, reason = self.clear_policy.should_clear(image)
+        if clear:
+            logger.info(f"Panel is due to be cleared, using full refresh. | reason: {reason}")
+        return clear
+
+    def display_partial(self, image, regions, image_settings=[]):
 
-        # Display the image on the WS display.
-        if not self.bi_color_display:
-            self.epd_display.display(self.epd_display.getbuffer(image))
-        else:
-            black_layer, red_layer = split_image_for_bi_color_epd(image)
-
-            self.epd_display.display(
-                self.epd_display.getbuffer(black_layer),
-                self.epd_display.getbuffer(red_layer),
-            )
-
-        # Put device into low power mode (EPD displays maintain image when powered off)
-        logger.info("Putting Waveshare display into sleep mode for power saving.")
-        self.epd_display.sleep()
+        """
+        Updates only the changed regions of the Waveshare display using the driver's partial refresh.
+
+        Drivers whose partial refresh takes a full frame buffer are sent the whole image and the
+        controller refreshes the changed pixels. Drivers that take a region are sent each region,
+        sliced from the full frame buffer so the driver's bit order and polarity are kept. Slicing
+        needs a 1bpp frame buffer, other formats do not support partial refresh with regions.
+
+        Args:
+            image (PIL.Image): The full image to be displayed.
+            regions (list): Changed regions as (left, top, right, bottom) boxes in image coordinates.
+            image_settings (list, optional): Additional settings to modify image rendering.
+        """
+
+        logger.info(f"Partially refreshing Waveshare display. | regions: {regions}")
+        if not image:
+            raise ValueError(f"No image provided.")
+
+        buffer = self.get_buffer(image)
+        with self.power.awake(self.partial_power_mode):
+            if not self.partial_region_args:
+                self.epd_display_partial(buffer)
+            else:
+                panel_width = int(self.epd_display.width)
+                bytes_per_row = (panel_width + 7) // 8
+                for left, top, right, bottom in regions:
+                    # getbuffer rotates landscape images to the panel's portrait orientation
+                    if image.size != (panel_width, int(self.epd_display.height)):
+                        left, top, right, bottom = top, image.width - right, bottom, image.width - left
+                    # regions start and end on byte boundaries
+                    left = left // 8 * 8
+                    right = min(-(-right // 8) * 8, bytes_per_row * 8)
+                    region_buffer = bytearray()
+                    for row in range(top, bottom):
+                        row_start = row * bytes_per_row
+                        region_buffer += bytes(buffer[row_start + left // 8:row_start + right // 8])
+                    self.epd_display_partial(region_buffer, left, top, right, bottom)
+            # partial refreshes leave ghosting as well, so they count towards the next clear
+            self.clear_policy.record_update(image, cleared=False)
+
+    def shutdown(self):
+        """Puts the controller to sleep right away."""
+        self.power.sleep()
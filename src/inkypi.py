@@ -26,6 +26,12 @@ from werkzeug.serving import is_running_from_reloader
 from config import Config
 from display.display_manager import DisplayManager
 from refresh_task import RefreshTask
+from background_refresher import BackgroundRefresher
+from system_stats import SystemStatsSampler
+from render_workers import start_render_pool, stop_render_pool
+from utils.browser_service import start_browser_service, stop_browser_service
+from utils.render_cache import get_render_cache
+from utils.scratch_space import get_scratch_space
 from blueprints.main import main_bp
 from blueprints.settings import settings_bp
 from blueprints.plugin import plugin_bp
@@ -65,6 +71,8 @@ app.jinja_loader = ChoiceLoader([FileSystemLoader(directory) for directory in te
 device_config = Config()
 display_manager = DisplayManager(device_config)
 refresh_task = RefreshTask(device_config, display_manager)
+background_refresher = BackgroundRefresher(device_config)
+system_stats_sampler = SystemStatsSampler(device_config)
 
 load_plugins(device_config.get_plugins())
 
@@ -72,6 +80,7 @@ load_plugins(device_config.get_plugins())
 app.config['DEVICE_CONFIG'] = device_config
 app.config['DISPLAY_MANAGER'] = display_manager
 app.config['REFRESH_TASK'] = refresh_task
+app.config['SYSTEM_STATS'] = system_stats_sampler
 
 # Set additional parameters
 app.config['MAX_FORM_PARTS'] = 10_000
@@ -89,14 +98,29 @@ register_heif_opener()
 
 if __name__ == '__main__':
 
+    # remove scratch files left behind by earlier runs, before any render creates new ones
+    get_scratch_space(device_config).cleanup_orphans()
+
+    # apply the configured render cache size, the render workers share the cache directory
+    get_render_cache(device_config)
+
+    # fork the render workers before any other threads are started
+    start_render_pool(device_config)
+    start_browser_service(device_config)
+
+    # start the display worker before anything submits frames
+    display_manager.start()
+
     # start the background refresh task
     refresh_task.start()
+    background_refresher.start()
+    system_stats_sampler.start()
 
     # display default inkypi image on startup
     if device_config.get_config("startup") is True:
         logger.info("Startup flag is set, displaying startup image")
         img = generate_startup_image(device_config.get_resolution())
-        display_manager.display_image(img)
+        display_manager.submit_image(img)
         device_config.update_value("startup", False, write=True)
 
     try:
@@ -134,4 +158,9 @@ if __name__ == '__main__':
 
         serve(app, host=host, port=final_port, threads=4)
     finally:
+        system_stats_sampler.stop()
+        background_refresher.stop()
         refresh_task.stop()
+        display_manager.stop()
+        stop_browser_service()
+        stop_render_pool()
@@ -10,7 +10,7 @@ class RefreshInfo:
 
     Attributes:
         refresh_time (str): ISO-formatted time string of the refresh.
-        image_hash (int): SHA-256 hash of the image.
+        image_hash (str): Hash of the image pixels, mode and size.
         refresh_type (str): Refresh type ['Manual Update', 'Playlist'].
         plugin_id (str): Plugin id of the refresh.
         playlist (str): Playlist name if refresh_type is 'Playlist'.
@@ -238,13 +238,20 @@ class Playlist:
 
     def get_next_plugin(self):
         """Returns the next plugin instance in the playlist and update the current_plugin_index."""
-        if self.current_plugin_index is None:
-            self.current_plugin_index = 0
-        else:
-            self.current_plugin_index = (self.current_plugin_index + 1) % len(self.plugins)
-        
+        self.current_plugin_index = self._get_next_plugin_index()
         return self.plugins[self.current_plugin_index]
 
+    def peek_next_plugin(self):
+        """Returns the plugin instance that get_next_plugin would return, without advancing the playlist."""
+        if not self.plugins:
+            return None
+        return self.plugins[self._get_next_plugin_index()]
+
+    def _get_next_plugin_index(self):
+        if self.current_plugin_index is None:
+            return 0
+        return (self.current_plugin_index + 1) % len(self.plugins)
+
     def get_priority(self):
         """Determine priority of a playlist, based on the time range"""
         return self.get_time_range_minutes()
@@ -293,14 +300,16 @@ class PluginInstance:
         settings (dict): Settings associated with the plugin.
         refresh (dict): Refresh settings, such as interval and scheduled time.
         latest_refresh (str): ISO-formatted string representing the last refresh time.
+        input_fingerprint (str): Fingerprint of the plugin inputs the latest image was rendered from.
     """
 
-    def __init__(self, plugin_id, name, settings, refresh, latest_refresh_time=None):
+    def __init__(self, plugin_id, name, settings, refresh, latest_refresh_time=None, input_fingerprint=None):
         self.plugin_id = plugin_id
         self.name = name
         self.settings = settings
         self.refresh = refresh
         self.latest_refresh_time = latest_refresh_time
+        self.input_fingerprint = input_fingerprint
 
     def update(self, updated_data):
         """Update attributes of the class with the dictionary values."""
@@ -309,38 +318,45 @@ class PluginInstance:
 
     def should_refresh(self, current_time):
         """Checks whether the plugin should be refreshed based on its refresh settings and the current time."""
+        next_refresh_dt = self.get_next_refresh_dt(current_time)
+        return next_refresh_dt is not None and current_time >= next_refresh_dt
+
+    def get_next_refresh_dt(self, current_time):
+        """Returns when the plugin is next due for a refresh based on its refresh settings.
+
+        Returns the current time if the plugin was never refreshed, or None if it has no refresh settings.
+        """
         latest_refresh_dt = self.get_latest_refresh_dt()
         if not latest_refresh_dt:
-            return True
+            return current_time
 
-        # Check for interval-based refresh
-        if "interval" in self.refresh:
-            interval = self.refresh.get("interval")
-            if interval and (current_time - latest_refresh_dt) >= timedelta(seconds=interval):
-                return True
+        due_times = []
 
-        # Check for scheduled refresh (HH:MM format)
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
-            latest_refresh_str = latest_refresh_dt.strftime("%H:%M")
+        # Interval-based refresh
+        interval = self.refresh.get("interval")
+        if interval:
+            due_times.append(latest_refresh_dt + timedelta(seconds=interval))
 
-            # If the latest refresh is before the scheduled time today
-            if latest_refresh_str < scheduled_time_str:
-                return True
-        
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
+        # Scheduled refresh (HH:MM format), due at the first scheduled time after the latest refresh
+        scheduled_time_str = self.refresh.get("scheduled")
+        if scheduled_time_str:
+            if latest_refresh_dt.tzinfo and current_time.tzinfo:
+                latest_refresh_dt = latest_refresh_dt.astimezone(current_time.tzinfo)
             scheduled_time = datetime.strptime(scheduled_time_str, "%H:%M").time()
-            
-            latest_refresh_date = latest_refresh_dt.date()
-            current_date = current_time.date()
-
-            # Determine if a refresh is needed based on scheduled time and last refresh
-            if (latest_refresh_date < current_date and current_time.time() >= scheduled_time) or \
-            (latest_refresh_date == current_date and latest_refresh_dt.time() < scheduled_time <= current_time.time()):
-                return True
-
-        return False
+            local_latest_dt = latest_refresh_dt.replace(tzinfo=None)
+            scheduled_dt = local_latest_dt.replace(
+                hour=scheduled_time.hour, minute=scheduled_time.minute, second=0, microsecond=0)
+            if scheduled_dt <= local_latest_dt:
+                scheduled_dt += timedelta(days=1)
+            # pytz timezones need localize to pick the UTC offset in effect at the scheduled time
+            tz = latest_refresh_dt.tzinfo
+            if hasattr(tz, "localize"):
+                scheduled_dt = tz.localize(scheduled_dt)
+            else:
+                scheduled_dt = scheduled_dt.replace(tzinfo=tz)
+            due_times.append(scheduled_dt)
+
+        return min(due_times) if due_times else None
 
     def get_image_path(self):
         """Formats the image path for this plugin instance."""
@@ -360,6 +376,7 @@ class PluginInstance:
             "plugin_settings": self.settings,
             "refresh": self.refresh,
             "latest_refresh_time": self.latest_refresh_time,
+            "input_fingerprint": self.input_fingerprint,
         }
 
     @classmethod
@@ -370,4 +387,5 @@ class PluginInstance:
             settings=data["plugin_settings"],
             refresh=data["refresh"],
             latest_refresh_time=data.get("latest_refresh_time"),
+            input_fingerprint=data.get("input_fingerprint"),
         )
\ No newline at end of file
@@ -1,8 +1,12 @@
 import logging
 import os
-from utils.app_utils import resolve_path, get_fonts
+from utils.app_utils import resolve_path
 from utils.image_utils import take_screenshot_html
 from utils.image_loader import AdaptiveImageLoader
+from utils.render_cache import get_render_cache
+from utils.asset_bundler import get_asset_bundler
+from utils.layout import render_layout
+from utils import metrics
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
 import asyncio
@@ -14,6 +18,8 @@ STATIC_DIR = resolve_path("static")
 PLUGINS_DIR = resolve_path("plugins")
 BASE_PLUGIN_DIR =  os.path.join(PLUGINS_DIR, "base_plugin")
 BASE_PLUGIN_RENDER_DIR = os.path.join(BASE_PLUGIN_DIR, "render")
+# Settings key holding the input fingerprint while the image is generated from it
+INPUT_FINGERPRINT_KEY = "_input_fingerprint"
 
 FRAME_STYLES = [
     {
@@ -54,6 +60,24 @@ class BasePlugin:
     def generate_image(self, settings, device_config):
         raise NotImplementedError("generate_image must be implemented by subclasses")
 
+    def get_input_fingerprint(self, settings, device_config):
+        """Optional method that plugins can override to skip rendering when their inputs have not changed.
+
+        Returns a cheap, JSON-serializable fingerprint of the data the next image would be rendered from,
+        such as a feed entry id or the current date. When the fingerprint, settings and resolution match the
+        ones of the latest image, that image is reused instead of generating a new one. Otherwise the
+        fingerprint is passed to generate_image in `settings[INPUT_FINGERPRINT_KEY]`, so data fetched for it
+        can be rendered without fetching it again. It must therefore cover everything the image shows.
+
+        Args:
+            settings: The plugin instance's settings dict
+            device_config: The device configuration
+
+        Returns:
+            The fingerprint, or None to always render (default).
+        """
+        return None
+
     def cleanup(self, settings):
         """Optional cleanup method that plugins can override to delete associated resources.
 
@@ -91,14 +115,36 @@ class BasePlugin:
             plugin_css = os.path.join(self.render_dir, css_file)
             css_files.append(plugin_css)
 
-        template_params["style_sheets"] = css_files
+        # the style sheets are inlined and only the fonts the page uses are added, subset to its text
+        asset_bundler = get_asset_bundler()
+        template_params["style_sheet"] = asset_bundler.get_style_sheet(css_files)
         template_params["width"] = dimensions[0]
         template_params["height"] = dimensions[1]
-        template_params["font_faces"] = get_fonts()
         template_params["static_dir"] = STATIC_DIR
 
         # load and render the given html template
-        template = self.env.get_template(html_file)
-        rendered_html = template.render(template_params)
-
-        return take_screenshot_html(rendered_html, dimensions)
+        with metrics.span("template"):
+            template = self.env.get_template(html_file)
+            rendered_html = template.render(template_params)
+            rendered_html = asset_bundler.add_font_faces(rendered_html, template_params["style_sheet"])
+
+        # identical pages are served from the render cache without starting the browser
+        render_cache = get_render_cache()
+        cache_key = render_cache.get_key(rendered_html, dimensions)
+        image = render_cache.get(cache_key)
+        if image is not None:
+            return image
+
+        image = take_screenshot_html(rendered_html, dimensions)
+        if image is not None:
+            render_cache.put(cache_key, image)
+        return image
+
+    def use_native_renderer(self, settings):
+        """Whether a plugin with a native layout draws it with Pillow, the default, or renders its HTML template."""
+        return settings.get("renderer", "native") != "html"
+
+    def render_layout(self, dimensions, layout, settings):
+        """Draws a layout of utils.layout nodes with the plugin style settings, without the browser."""
+        with metrics.span("layout"):
+            return render_layout(dimensions, layout, settings)
@@ -1,5 +1,6 @@
 import os
 from utils.app_utils import resolve_path, get_font
+from utils.refresh_budget import get_timeout
 from plugins.base_plugin.base_plugin import BasePlugin
 from plugins.calendar.constants import LOCALE_MAP, FONT_SIZES
 from PIL import Image, ImageColor, ImageDraw, ImageFont
@@ -142,7 +143,7 @@ class Calendar(BasePlugin):
         if calendar_url.startswith("webcal://"):
             calendar_url = calendar_url.replace("webcal://", "https://")
         try:
-            response = requests.get(calendar_url, timeout=30)
+            response = requests.get(calendar_url, timeout=get_timeout(30))
             response.raise_for_status()
             return icalendar.Calendar.from_ical(response.text)
         except Exception as e:
@@ -1,4 +1,4 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, INPUT_FINGERPRINT_KEY
 from PIL import Image, ImageDraw, ImageFont
 import logging
 
@@ -29,7 +29,8 @@ class Comic(BasePlugin):
         logger.debug(f"Settings: show_caption={is_caption}, font_size={caption_font_size}")
 
         logger.debug("Parsing comic panel...")
-        comic_panel = get_panel(comic)
+        # the panel fetched for the input fingerprint, if it was taken before this render
+        comic_panel = settings.get(INPUT_FINGERPRINT_KEY) or get_panel(comic)
         logger.info(f"Comic panel URL: {comic_panel.get('image_url', 'Unknown')}")
 
         if comic_panel.get("title"):
@@ -50,6 +51,13 @@ class Comic(BasePlugin):
         logger.info("=== Comic Plugin: Image generation complete ===")
         return image
 
+    def get_input_fingerprint(self, settings, device_config):
+        comic = settings.get("comic")
+        if not comic or comic not in COMICS:
+            return None
+
+        return get_panel(comic)
+
     def _compose_image(self, comic_panel, is_caption, caption_font_size, width, height):
         # Use adaptive loader for memory-efficient processing
         # Note: Comic images are usually reasonable size, but still benefit from optimization
@@ -1,4 +1,5 @@
 from plugins.base_plugin.base_plugin import BasePlugin
+from utils.layout import Column, Text
 from PIL import Image
 from datetime import datetime, timezone
 import logging
@@ -9,8 +10,14 @@ class Countdown(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
+        template_params['native_renderer'] = True
         return template_params
 
+    def get_input_fingerprint(self, settings, device_config):
+        # the day count only changes with the date
+        timezone = device_config.get_config("timezone", default="America/New_York")
+        return datetime.now(pytz.timezone(timezone)).date().isoformat()
+
     def generate_image(self, settings, device_config):
         title = settings.get('title')
         countdown_date_str = settings.get('date')
@@ -40,5 +47,24 @@ class Countdown(BasePlugin):
             "plugin_settings": settings
         }
 
+        if self.use_native_renderer(settings):
+            return self.render_layout(dimensions, self.get_layout(dimensions, template_params), settings)
+
         image = self.render_image(dimensions, "countdown.html", "countdown.css", template_params)
-        return image
\ No newline at end of file
+        return image
+
+    def get_layout(self, dimensions, template_params):
+        """Native layout of countdown.html and countdown.css."""
+        vw, vh = dimensions[0] / 100, dimensions[1] / 100
+        label_size = min(8 * vh, 8 * vw)
+
+        children = []
+        if template_params["title"]:
+            children.append(Text(template_params["title"], min(11 * vw, 11 * vh), bold=True, align="center",
+                                 line_height=1, letter_spacing=0.3))
+        children += [
+            Text(template_params["date"], min(5 * vw, 5 * vh), align="center", margin_bottom=4 * vh),
+            Text(template_params["day_count"], min(32 * vh, 32 * vw), align="center", line_height=1),
+            Text(template_params["label"].upper(), label_size, align="center", letter_spacing=0.1 * label_size)
+        ]
+        return Column(children, width=0.9, justify="center")
\ No newline at end of file
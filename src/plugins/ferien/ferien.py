@@ -1,4 +1,5 @@
 from plugins.base_plugin.base_plugin import BasePlugin
+from utils.layout import Box, Column, Row, Text
 from datetime import datetime
 import logging
 import pytz
@@ -9,6 +10,7 @@ class Ferien(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
+        template_params['native_renderer'] = True
         return template_params
 
     def generate_image(self, settings, device_config):
@@ -56,5 +58,25 @@ class Ferien(BasePlugin):
             "holidays": holidays,
             "plugin_settings": settings
         }
-        
+
+        if self.use_native_renderer(settings):
+            return self.render_layout(dimensions, self.get_layout(dimensions, holidays), settings)
+
         return self.render_image(dimensions, "ferien.html", "ferien.css", template_params)
+
+    def get_layout(self, dimensions, holidays):
+        """Native layout of ferien.html and ferien.css."""
+        vw, vh = dimensions[0] / 100, dimensions[1] / 100
+        if not holidays:
+            return Column([Text("Keine anstehenden Ferien", min(10 * vh, 8 * vw), align="center")], justify="center")
+
+        font_size = min(8 * vh, 6 * vw)
+        rows = []
+        for holiday in holidays:
+            days = Row([
+                Text(holiday['days_left'], font_size),
+                Text("Tage", font_size * 0.6, margin_left=5)
+            ])
+            name = Text(holiday['name'], font_size, bold=True, wrap=False, ellipsis=True, grow=2, margin_right=20)
+            rows.append(Box(Row([name, days], justify="space-between"), border=(0, 0, 2, 0), padding=(0, 0, 5, 0)))
+        return Column(rows, justify="center", gap=15)
@@ -1,6 +1,7 @@
 import requests
 import logging
 from datetime import datetime, date, timedelta
+from utils.refresh_budget import get_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +64,7 @@ def fetch_contributions(username, api_key):
     url = "https://api.github.com/graphql"
     headers = {"Authorization": f"Bearer {api_key}"}
     variables = {"username": username}
-    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers, timeout=30)
+    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers, timeout=get_timeout(30))
     resp.raise_for_status()
     return resp.json()
 
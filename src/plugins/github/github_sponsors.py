@@ -1,5 +1,6 @@
 import requests
 import logging
+from utils.refresh_budget import get_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -69,7 +70,7 @@ def fetch_sponsorships(username, api_key):
     headers = {"Authorization": f"Bearer {api_key}"}
     variables = {"username": username}
 
-    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers, timeout=30)
+    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers, timeout=get_timeout(30))
     resp.raise_for_status()
     data = resp.json()
 
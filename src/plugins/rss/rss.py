@@ -1,4 +1,5 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, INPUT_FINGERPRINT_KEY
+from utils.refresh_budget import get_timeout
 from PIL import Image
 from io import BytesIO
 import feedparser
@@ -16,6 +17,9 @@ FONT_SIZES = {
     "x-large": 1.3
 }
 
+# Number of feed items shown
+MAX_ITEMS = 10
+
 class Rss(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -28,7 +32,8 @@ class Rss(BasePlugin):
         if not feed_url:
             raise RuntimeError("RSS Feed Url is required.")
         
-        items = self.parse_rss_feed(feed_url)
+        # the items fetched for the input fingerprint, if it was taken before this render
+        items = settings.get(INPUT_FINGERPRINT_KEY) or self.parse_rss_feed(feed_url)[:MAX_ITEMS]
 
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
@@ -37,7 +42,7 @@ class Rss(BasePlugin):
         template_params = {
             "title": title,
             "include_images": settings.get("includeImages") == "true",
-            "items": items[:10],
+            "items": items,
             "font_scale": FONT_SIZES.get(settings.get('fontSize', 'normal'), 1),
             "plugin_settings": settings
         }
@@ -45,8 +50,16 @@ class Rss(BasePlugin):
         image = self.render_image(dimensions, "rss.html", "rss.css", template_params)
         return image
     
+    def get_input_fingerprint(self, settings, device_config):
+        feed_url = settings.get("feedUrl")
+        if not feed_url:
+            return None
+
+        # the shown items with all their fields, the render uses them as they are
+        return self.parse_rss_feed(feed_url)[:MAX_ITEMS]
+
     def parse_rss_feed(self, url, timeout=10):
-        resp = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
+        resp = requests.get(url, timeout=get_timeout(timeout), headers={"User-Agent": "Mozilla/5.0"})
         resp.raise_for_status()
         
         # Parse the feed content
@@ -1,4 +1,5 @@
 from plugins.base_plugin.base_plugin import BasePlugin
+from utils.layout import Column, ProgressBar, Row, Text
 from PIL import Image
 from datetime import datetime, timezone, timedelta
 import logging
@@ -9,6 +10,7 @@ class Schuljahr(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
+        template_params['native_renderer'] = True
         return template_params
 
     def generate_image(self, settings, device_config):
@@ -58,6 +60,24 @@ class Schuljahr(BasePlugin):
             "days_left": days_left_display,
             "plugin_settings": settings
         }
-        
+
+        if self.use_native_renderer(settings):
+            return self.render_layout(dimensions, self.get_layout(dimensions, template_params), settings)
+
         image = self.render_image(dimensions, "schuljahr.html", "schuljahr.css", template_params)
-        return image
\ No newline at end of file
+        return image
+
+    def get_layout(self, dimensions, template_params):
+        """Native layout of schuljahr.html and schuljahr.css."""
+        vw, vh = dimensions[0] / 100, dimensions[1] / 100
+        label_size = min(5 * vh, 4 * vw)
+
+        return Column([
+            Text(f"SCHULJAHR {template_params['year']}", min(18 * vh, 14 * vw), bold=True, align="center",
+                 line_height=1.1, margin_bottom=5 * vh),
+            ProgressBar(template_params["year_percent"], 10 * vh),
+            Row([
+                Text(f"{template_params['year_percent']}% DONE", label_size),
+                Text(f"{template_params['days_left']} DAYS LEFT", label_size)
+            ], justify="space-between", margin_top=8)
+        ], width=0.9, justify="center")
\ No newline at end of file
@@ -1,4 +1,5 @@
 from plugins.base_plugin.base_plugin import BasePlugin
+from utils.layout import Box, Column, Marker, Row, Text, get_content_box
 from PIL import Image
 from io import BytesIO
 import requests
@@ -14,10 +15,24 @@ FONT_SIZES = {
     "x-large": 1.3
 }
 
+# List styles drawn as bullets, the others are counters
+LIST_MARKERS = {
+    "disc": "disc",
+    "square": "square",
+    "'\\25C6  '": "diamond"
+}
+ROMAN_NUMERALS = [(100, "c"), (90, "xc"), (50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i")]
+
+# Sizes of todo_list.css in pixels
+REM = 16
+LIST_BORDER = 1.5
+LIST_RADIUS = 10
+
 class TodoList(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
+        template_params['native_renderer'] = True
         return template_params
 
     def generate_image(self, settings, device_config):
@@ -40,6 +55,95 @@ class TodoList(BasePlugin):
             "lists": lists,
             "plugin_settings": settings
         }
-        
+
+        if self.use_native_renderer(settings):
+            return self.render_layout(dimensions, self.get_layout(dimensions, settings, template_params), settings)
+
         image = self.render_image(dimensions, "todo_list.html", "todo_list.css", template_params)
-        return image
\ No newline at end of file
+        return image
+
+    def get_layout(self, dimensions, settings, template_params):
+        """Native layout of todo_list.html and todo_list.css, lists are side by side unless the display is tall."""
+        vw, vh = dimensions[0] / 100, dimensions[1] / 100
+        font_scale = template_params["font_scale"]
+        _, _, width, height = get_content_box(dimensions, settings)
+
+        children = []
+        if template_params["title"]:
+            title = Text(template_params["title"], min(7.5 * vw, 7.5 * vh) * font_scale, bold=True, align="center",
+                         margin_bottom=0.5 * REM)
+            children.append(title)
+            height -= title.measure(width)[1] + title.get_vertical_margin()
+
+        lists = template_params["lists"]
+        if lists:
+            gap = REM
+            horizontal = dimensions[0] / dimensions[1] >= 4 / 5
+            if horizontal:
+                list_size = ((width - gap * (len(lists) - 1)) / len(lists), height)
+            else:
+                list_size = (width, (height - gap * (len(lists) - 1)) / len(lists))
+
+            boxes = [self.get_list_layout(todo_list, list_size, template_params["list_style"], font_scale)
+                     for todo_list in lists]
+            children.append(Row(boxes, gap=gap, align="start") if horizontal else Column(boxes, gap=gap))
+        return Column(children)
+
+    def get_list_layout(self, todo_list, size, list_style, font_scale):
+        """Returns the box of a list, showing the items that fit and the number of the others."""
+        box = Box(width=size[0], height=size[1], border=LIST_BORDER, radius=LIST_RADIUS,
+                  padding=(REM, REM, 0.5 * REM, REM))
+        inset_x, inset_y = box.get_inset()
+        # font sizes relative to the list and the item area, like the container query units of the style sheet
+        width, height = size[0] - inset_x, size[1] - inset_y
+
+        title = Text(todo_list['title'], min(10 * height / 100, 8.5 * width / 100) * font_scale, bold=True,
+                     line_height=1.2, margin_bottom=0.4 * REM)
+        items_height = height - title.measure(width)[1] - title.get_vertical_margin()
+        font_size = min(8 * items_height / 100, 7 * width / 100) * font_scale
+        item_padding = 2 * items_height / 100
+
+        items = [self.get_item_layout(element, index, list_style, font_size, item_padding)
+                 for index, element in enumerate(todo_list['elements'])]
+
+        # as the template's script, items are shown while their heights without the border fit
+        visible, used = 0, 0
+        for item in items:
+            item_height = item.measure(width)[1] - item.border[0]
+            if used + item_height > items_height:
+                break
+            used += item_height
+            visible += 1
+        if visible < len(items):
+            visible = max(0, visible - 1)
+            more = Text(f"And {len(items) - visible} more...", font_size, align="center", line_height=1.2)
+            items = items[:visible] + [Box(more, border=(1, 0, 0, 0), padding=(0.5 * REM, 0, item_padding, 0))]
+
+        box.child = Column([title] + items)
+        return box
+
+    def get_item_layout(self, element, index, list_style, font_size, padding):
+        shape = LIST_MARKERS.get(list_style)
+        if shape is not None:
+            content = Row([Marker(shape, font_size, line_height=1.2), Text(element, font_size, line_height=1.2, grow=1)])
+        else:
+            content = Text(f"{get_counter(list_style, index + 1)}. {element}", font_size, line_height=1.2)
+        return Box(content, border=(1, 0, 0, 0), padding=(padding, 0, padding, 0))
+
+
+def get_counter(list_style, number):
+    """Returns the list item counter for the list style."""
+    if list_style == "lower-roman":
+        counter = ""
+        for value, numeral in ROMAN_NUMERALS:
+            while number >= value:
+                counter += numeral
+                number -= value
+        return counter
+    if list_style == "lower-alpha":
+        counter = ""
+        while number > 0:
+            number, remainder = divmod(number - 1, 26)
+            counter = chr(ord("a") + remainder) + counter
+        return counter
+    return str(number)
\ No newline at end of file
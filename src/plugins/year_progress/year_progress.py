@@ -1,4 +1,5 @@
 from plugins.base_plugin.base_plugin import BasePlugin
+from utils.layout import Column, ProgressBar, Row, Text
 from PIL import Image
 from datetime import datetime, timezone
 import logging
@@ -9,13 +10,44 @@ class YearProgress(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
+        template_params['native_renderer'] = True
         return template_params
 
+    def get_input_fingerprint(self, settings, device_config):
+        return self.get_progress(device_config)
+
     def generate_image(self, settings, device_config):
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
             dimensions = dimensions[::-1]
-        
+
+        template_params = {
+            **self.get_progress(device_config),
+            "plugin_settings": settings
+        }
+
+        if self.use_native_renderer(settings):
+            return self.render_layout(dimensions, self.get_layout(dimensions, template_params), settings)
+
+        image = self.render_image(dimensions, "year_progress.html", "year_progress.css", template_params)
+        return image
+
+    def get_layout(self, dimensions, template_params):
+        """Native layout of year_progress.html and year_progress.css."""
+        vw, vh = dimensions[0] / 100, dimensions[1] / 100
+        label_size = min(5 * vh, 4 * vw)
+
+        return Column([
+            Text(template_params["year"], min(20 * vh, 16 * vw), bold=True, align="center", line_height=1),
+            Text("PROGRESS", min(10 * vh, 8 * vw), align="center", line_height=1, margin_bottom=10 * vh),
+            ProgressBar(template_params["year_percent"], 10 * vh),
+            Row([
+                Text(f"{template_params['year_percent']}% DONE", label_size),
+                Text(f"{template_params['days_left']} DAYS LEFT", label_size)
+            ], justify="space-between", margin_top=8)
+        ], width=0.9, justify="center")
+
+    def get_progress(self, device_config):
         timezone = device_config.get_config("timezone", default="America/New_York")
         tz = pytz.timezone(timezone)
         current_time = datetime.now(tz)
@@ -27,12 +59,8 @@ class YearProgress(BasePlugin):
         days_left = (start_of_next_year - current_time).total_seconds() / (24 * 3600)
         elapsed_days = (current_time - start_of_year).total_seconds() / (24 * 3600)
 
-        template_params = {
+        return {
             "year": current_time.year,
             "year_percent": round((elapsed_days / total_days) * 100),
-            "days_left": round(days_left),
-            "plugin_settings": settings
+            "days_left": round(days_left)
         }
-        
-        image = self.render_image(dimensions, "year_progress.html", "year_progress.css", template_params)
-        return image
\ No newline at end of file
@@ -0,0 +1,108 @@
+import heapq
+import itertools
+import logging
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+class RefreshScheduler:
+    """Computes the next deadline at which the refresh task has work to do.
+
+    Deadlines from all refresh triggers are kept in a priority queue, so the refresh task can sleep exactly until
+    the earliest one instead of polling on the plugin cycle interval. The queue is rebuilt by `schedule()` whenever
+    the refresh task wakes up, which includes config changes signalled through `signal_config_change`.
+
+    Triggers:
+        CYCLE: The plugin cycle interval expiring since the latest refresh.
+        PLAYLIST_WINDOW: A playlist start_time or end_time, where the active playlist may change.
+        INSTANCE_REFRESH: The displayed plugin instance's interval or scheduled refresh becoming due.
+        LOOKAHEAD: Starting a look-ahead render, added by the refresh task.
+    """
+    CYCLE = "plugin cycle"
+    PLAYLIST_WINDOW = "playlist window"
+    INSTANCE_REFRESH = "plugin instance refresh"
+    LOOKAHEAD = "look-ahead render"
+
+    def __init__(self):
+        self.deadlines = []
+        self.counter = itertools.count()
+
+    def clear(self):
+        self.deadlines = []
+
+    def add(self, deadline_dt, trigger, description=""):
+        """Adds a deadline to the queue."""
+        heapq.heappush(self.deadlines, (deadline_dt, next(self.counter), trigger, description))
+
+    def next_deadline(self):
+        """Returns the earliest deadline as a (deadline_dt, trigger, description) tuple, or None if there is none."""
+        if not self.deadlines:
+            return None
+        deadline_dt, _, trigger, description = self.deadlines[0]
+        return deadline_dt, trigger, description
+
+    def get_sleep_time(self, current_dt, max_sleep_time):
+        """Returns the number of seconds until the earliest deadline, at most max_sleep_time."""
+        deadline = self.next_deadline()
+        if not deadline:
+            return max_sleep_time
+
+        deadline_dt, trigger, description = deadline
+        sleep_time = min(max_sleep_time, max(0, (deadline_dt - current_dt).total_seconds()))
+        logger.debug(f"Next refresh deadline. | trigger: {trigger} | {description} | deadline: {deadline_dt.strftime('%Y-%m-%d %H:%M:%S')} | sleep_time: {sleep_time:.1f}")
+        return sleep_time
+
+    def schedule(self, device_config, current_dt, last_cycle_check_dt=None, last_instance_check_dt=None):
+        """Rebuilds the queue with the cycle, playlist window and displayed plugin instance deadlines.
+
+        Deadlines that are already due but were handled by a check since are pushed back by the plugin cycle
+        interval, so a refresh that has nothing to display or keeps failing is not retried in a busy loop.
+        """
+        self.clear()
+
+        playlist_manager = device_config.get_playlist_manager()
+        latest_refresh = device_config.get_refresh_info()
+        plugin_cycle_interval = device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+        retry_delay = timedelta(seconds=plugin_cycle_interval)
+
+        # plugin cycle interval
+        latest_refresh_dt = latest_refresh.get_refresh_datetime()
+        # without a previous refresh the check is due right away, unless it already ran
+        cycle_dt = latest_refresh_dt + retry_delay if latest_refresh_dt else (last_cycle_check_dt or current_dt)
+        self.add(_defer_if_checked(cycle_dt, last_cycle_check_dt, retry_delay), RefreshScheduler.CYCLE)
+
+        # playlist windows
+        for playlist in playlist_manager.playlists:
+            for boundary in (playlist.start_time, playlist.end_time):
+                self.add(get_next_time_of_day(boundary, current_dt), RefreshScheduler.PLAYLIST_WINDOW,
+                         f"playlist: {playlist.name} | time: {boundary}")
+
+        # displayed plugin instance
+        if latest_refresh.playlist and latest_refresh.plugin_instance:
+            playlist = playlist_manager.get_playlist(latest_refresh.playlist)
+            plugin_instance = playlist.find_plugin(latest_refresh.plugin_id, latest_refresh.plugin_instance) if playlist else None
+            instance_dt = plugin_instance.get_next_refresh_dt(current_dt) if plugin_instance else None
+            if instance_dt:
+                self.add(_defer_if_checked(instance_dt, last_instance_check_dt, retry_delay), RefreshScheduler.INSTANCE_REFRESH,
+                         f"plugin_instance: {plugin_instance.name}")
+
+def get_next_time_of_day(time_str, current_dt):
+    """Returns the first datetime after current_dt at the given 'HH:MM' time, where '24:00' means midnight."""
+    if time_str == "24:00":
+        time_str = "00:00"
+    hour, minute = (int(part) for part in time_str.split(":"))
+    local_dt = current_dt.replace(tzinfo=None)
+    next_dt = local_dt.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_dt <= local_dt:
+        next_dt += timedelta(days=1)
+
+    # pytz timezones need localize to pick the UTC offset in effect at the new time
+    tz = current_dt.tzinfo
+    if hasattr(tz, "localize"):
+        return tz.localize(next_dt)
+    return next_dt.replace(tzinfo=tz)
+
+def _defer_if_checked(deadline_dt, last_check_dt, retry_delay):
+    if last_check_dt and deadline_dt <= last_check_dt:
+        return last_check_dt + retry_delay
+    return deadline_dt
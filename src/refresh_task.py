@@ -1,17 +1,37 @@
+import copy
+import hashlib
+import json
 import threading
 import time
 import os
 import logging
-import psutil
 import pytz
-from datetime import datetime, timezone
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone, timedelta
 from plugins.plugin_registry import get_plugin_instance
+from plugins.base_plugin.base_plugin import INPUT_FINGERPRINT_KEY
 from utils.image_utils import compute_image_hash
+from utils.refresh_budget import RefreshBudget
+from utils.image_cache import get_image_cache
+from utils import metrics
 from model import RefreshInfo, PlaylistManager
-from PIL import Image
+from refresh_scheduler import RefreshScheduler
+from render_workers import render_plugin_image
 
 logger = logging.getLogger(__name__)
 
+# Render time assumed for plugin instances that have not been rendered yet
+DEFAULT_RENDER_SECONDS = 60
+# Look-ahead renders start this many times the measured render time before the cycle boundary
+LOOKAHEAD_MARGIN_FACTOR = 1.5
+# Number of finished manual refresh jobs kept for status requests
+MAX_JOB_HISTORY = 20
+
+# Serializes refreshes of the same plugin instance between the refresh task and background workers
+_instance_locks = defaultdict(threading.Lock)
+_instance_locks_guard = threading.Lock()
+
 class RefreshTask:
     """Handles the logic for refreshing the display using a background thread."""
 
@@ -23,11 +43,20 @@ class RefreshTask:
         self.lock = threading.Lock()
         self.condition = threading.Condition(self.lock)
         self.running = False
-        self.manual_update_request = ()
 
-        self.refresh_event = threading.Event()
-        self.refresh_event.set()
-        self.refresh_result = {}
+        # manual refresh jobs, the pending job is replaced by newer requests
+        self.pending_job = None
+        self.current_job = None
+        self.jobs = OrderedDict()
+
+        # computes the deadline of the next refresh, checks that found nothing to do are not repeated until then
+        self.scheduler = RefreshScheduler()
+        self.last_cycle_check_dt = None
+        self.last_instance_check_dt = None
+
+        # measured render time in seconds per plugin instance, used to schedule look-ahead renders
+        self.render_durations = {}
+        self.lookahead = None
 
     def start(self):
         """Starts the background thread for refreshing the display."""
@@ -41,6 +70,9 @@ class RefreshTask:
         """Stops the refresh task by notifying the background thread to exit."""
         with self.condition:
             self.running = False
+            if self.pending_job:
+                self.pending_job.update(RefreshJob.FAILED, "Refresh task stopped")
+                self.pending_job = None
             self.condition.notify_all()  # Wake the thread to let it exit
         if self.thread:
             logger.info("Stopping refresh task")
@@ -49,36 +81,40 @@ class RefreshTask:
     def _run(self):
         """Background task that manages the periodic refresh of the display.
 
-        This function runs in a loop, sleeping for a configured duration (`plugin_cycle_interval_seconds`) or until
-        manually triggered via `manual_update()`. Determines the next plugin to refresh based on active playlists and
-        updates the display accordingly.
+        This function runs in a loop, sleeping until the next deadline computed by the RefreshScheduler or until
+        a manual refresh job is submitted via `submit_manual_update()`. Determines the next plugin to refresh based on
+        active playlists and updates the display accordingly.
 
         Workflow:
-        1. Waits for the configured sleep duration or until notified of a manual update.
-        2. Checks if a manual update has been requested:
+        1. Waits until the next refresh deadline or until notified of a manual refresh job or config change.
+        2. Checks if a manual refresh job is pending:
         - If so, refreshes the specified plugin immediately.
-        3. Otherwise, determines the next plugin to refresh based on the active playlist and generates an image.
-        4. Compares the image hash with the last displayed image hash.
+        3. If look-ahead rendering is enabled and the next plugin is due to be pre-rendered, starts rendering it
+           in the background and goes back to waiting until the cycle boundary.
+        4. Otherwise, determines the next plugin to refresh based on the active playlist and generates an image,
+           reusing the look-ahead render when it matches. The playlist advances when the plugin cycle interval
+           expired or the active playlist changed. If neither happened, the displayed plugin instance is refreshed
+           in place when its own refresh interval or scheduled time is due.
+        5. Compares the image hash with the last displayed image hash.
         - If the image has changed, updates the display.
         - If the image is the same, skips the refresh.
-        5. Updates the refresh metadata in the device configuration.
-        6. Repeats the process until `stop()` is called.
+        6. Updates the refresh metadata in the device configuration.
+        7. Repeats the process until `stop()` is called.
 
-        Handles any exceptions that occur during the refresh process and ensures the refresh event is set 
-        to indicate completion.
+        Only the scheduling decisions are made while holding `self.condition`. Rendering and updating the display
+        happen outside of it, so manual refresh jobs can be submitted at any time.
 
         Exceptions:
         - Captures and logs any unexpected errors during execution to prevent the thread from exiting.
+        - Errors during a manual refresh are reported through its RefreshJob.
         """
         while True:
+            job = None
             try:
                 with self.condition:
-                    sleep_time = self.device_config.get_config("plugin_cycle_interval_seconds", default=60*60)
-
-                    # Wait for sleep_time or until notified
-                    self.condition.wait(timeout=sleep_time)
-                    self.refresh_result = {}
-                    self.refresh_event.clear()
+                    # Wait for sleep_time or until notified, unless a job was submitted while refreshing
+                    if not self.pending_job:
+                        self.condition.wait(timeout=self._get_sleep_time())
 
                     # Exit if `stop()` is called
                     if not self.running:
@@ -89,79 +125,247 @@ class RefreshTask:
                     current_dt = self._get_current_datetime()
 
                     refresh_action = None
-                    if self.manual_update_request:
-                        # handle immediate update request
-                        logger.info("Manual update requested")
-                        refresh_action = self.manual_update_request
-                        self.manual_update_request = ()
+                    keep_refresh_time = False
+                    if self.pending_job:
+                        # handle manual refresh job
+                        job, self.pending_job = self.pending_job, None
+                        self.current_job = job
+                        logger.info(f"Manual update requested. | job_id: {job.job_id}")
+                        refresh_action = job.refresh_action
+                    elif self._start_lookahead_if_due(current_dt):
+                        # the refresh itself happens once the cycle boundary is reached
+                        continue
                     else:
-
-                        if self.device_config.get_config("log_system_stats"):
-                            self.log_system_stats()
-
                         # handle refresh based on playlists
                         logger.info(f"Running interval refresh check. | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
                         playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
                         if plugin_instance:
-                            refresh_action = PlaylistRefresh(playlist, plugin_instance)
-
-                    if refresh_action:
-                        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
-                        if plugin_config is None:
-                            logger.error(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
-                            continue
-                        plugin = get_plugin_instance(plugin_config)
-                        image = refresh_action.execute(plugin, self.device_config, current_dt)
-                        image_hash = compute_image_hash(image)
-
-                        refresh_info = refresh_action.get_refresh_info()
-                        refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
-                        # check if image is the same as current image
-                        if image_hash != latest_refresh.image_hash:
-                            logger.info(f"Updating display. | refresh_info: {refresh_info}")
-                            self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
+                            prerendered_image = self._take_lookahead_image(playlist, plugin_instance)
+                            refresh_action = PlaylistRefresh(playlist, plugin_instance, prerendered_image=prerendered_image)
                         else:
-                            logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
-
-                        # update latest refresh data in the device config
-                        self.device_config.refresh_info = RefreshInfo(**refresh_info)
-                        self.device_config.write_config()
+                            playlist, plugin_instance = self._determine_due_displayed_instance(playlist_manager, latest_refresh, current_dt)
+                            if plugin_instance:
+                                # refresh the displayed plugin in place without restarting the plugin cycle
+                                refresh_action = PlaylistRefresh(playlist, plugin_instance)
+                                keep_refresh_time = True
+
+                display_future = None
+                if refresh_action:
+                    display_future = self._refresh(refresh_action, latest_refresh, current_dt, job, keep_refresh_time)
+                if job:
+                    if display_future is None:
+                        job.update(RefreshJob.DONE, "Display updated")
+                    else:
+                        # the display worker finishes the job once the panel is updated
+                        display_future.add_done_callback(lambda future, job=job: _finish_display_job(job, future))
 
             except Exception as e:
                 logger.exception('Exception during refresh')
-                self.refresh_result["exception"] = e  # Capture exception
+                if job:
+                    job.update(RefreshJob.FAILED, str(e))
             finally:
-                self.refresh_event.set()
-
-    def manual_update(self, refresh_action):
-        """Manually triggers an update for the specified plugin id and plugin settings by notifying the background process."""
-        if self.running:
-            with self.condition:
-                self.manual_update_request = refresh_action
-                self.refresh_result = {}
-                self.refresh_event.clear()
+                if job:
+                    with self.condition:
+                        self.current_job = None
 
-                self.condition.notify_all()  # Wake the thread to process manual update
+    def _refresh(self, refresh_action, latest_refresh, current_dt, job=None, keep_refresh_time=False):
+        """Generates the image for the refresh action and queues it for the display.
 
-            self.refresh_event.wait()
-            if self.refresh_result.get("exception"):
-                raise self.refresh_result.get("exception")
-        else:
+        With keep_refresh_time, the latest refresh time is left unchanged so the plugin cycle is not restarted.
+        Returns the future of the display update, or None if the image was not queued.
+        """
+        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
+        if plugin_config is None:
+            raise ValueError(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
+        plugin = get_plugin_instance(plugin_config)
+
+        refresh_info = refresh_action.get_refresh_info()
+        with metrics.labels(plugin_id=refresh_info.get("plugin_id"), instance=refresh_info.get("plugin_instance", "")):
+            budget = RefreshBudget.from_config(self.device_config)
+            if job:
+                job.update(RefreshJob.RENDERING, "Generating image")
+            image = budget.run_stage(RefreshBudget.GENERATE, refresh_action.execute, plugin, self.device_config, current_dt)
+            if refresh_action.render_duration is not None:
+                self._record_render_duration(refresh_action.get_instance_key(), refresh_action.render_duration)
+            if job and job.is_finished():
+                logger.info(f"Manual update was superseded, skipping display. | job_id: {job.job_id}")
+                return
+            # the displayed image was rendered from the same inputs, so it does not need to be hashed again
+            if refresh_action.inputs_unchanged and _is_displayed(refresh_info, latest_refresh):
+                image_hash = latest_refresh.image_hash
+            else:
+                with budget.stage(RefreshBudget.PROCESS), metrics.span("hash"):
+                    image_hash = compute_image_hash(image)
+
+            refresh_time = latest_refresh.refresh_time if keep_refresh_time else current_dt.isoformat()
+            refresh_info.update({"refresh_time": refresh_time, "image_hash": image_hash})
+
+            image_settings = plugin.config.get("image_settings", [])
+            if image_hash == latest_refresh.image_hash and _is_displayed(refresh_info, latest_refresh) \
+                    and self.display_manager.shows_image(image_hash, image_settings):
+                logger.info(f"Image already displayed, skipping display update. | refresh_info: {refresh_info}")
+                display_future = None
+            else:
+                # the display manager skips the panel write if the panel already shows the final frame
+                logger.info(f"Updating display. | refresh_info: {refresh_info}")
+                if job:
+                    job.update(RefreshJob.DISPLAYING, "Updating display")
+                with budget.stage(RefreshBudget.DISPLAY):
+                    display_future = self.display_manager.submit_image(image, image_settings=image_settings)
+            logger.info(f"Refresh finished. | {budget.summary()}")
+
+            # update latest refresh data in the device config
+            self.device_config.refresh_info = RefreshInfo(**refresh_info)
+            self.device_config.write_config()
+            return display_future
+
+    def submit_manual_update(self, refresh_action):
+        """Queues a manual refresh and returns its RefreshJob without waiting for the refresh to happen.
+
+        A request for the same refresh as a queued or running job is coalesced into that job. Otherwise the new
+        job supersedes the queued job and a job that is still rendering, whose image is then discarded.
+        Returns None if the background refresh task is not running.
+        """
+        if not self.running:
             logger.warning("Background refresh task is not running, unable to do a manual update")
+            return None
+
+        job = RefreshJob(refresh_action)
+        with self.condition:
+            for existing in (self.pending_job, self.current_job):
+                if existing and existing.key == job.key and not existing.is_finished():
+                    logger.info(f"Coalescing manual update into existing job. | job_id: {existing.job_id}")
+                    return existing
+
+            if self.pending_job:
+                self.pending_job.update(RefreshJob.SUPERSEDED, "Superseded by a newer request")
+            if self.current_job and self.current_job.status in (RefreshJob.QUEUED, RefreshJob.RENDERING):
+                self.current_job.update(RefreshJob.SUPERSEDED, "Superseded by a newer request")
+
+            self.pending_job = job
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > MAX_JOB_HISTORY:
+                self.jobs.popitem(last=False)
+
+            self.condition.notify_all()  # Wake the thread to process manual update
+        return job
+
+    def get_job(self, job_id):
+        """Returns the manual refresh job with the given id, or None if it is unknown or expired."""
+        with self.condition:
+            return self.jobs.get(job_id)
 
     def signal_config_change(self):
-        """Notify the background thread that config has changed (e.g., interval updated)."""
+        """Notify the background thread that config has changed (e.g., interval updated), so it recomputes its next deadline."""
         if self.running:
             with self.condition:
                 self.condition.notify_all()
 
+    def _get_sleep_time(self):
+        """Returns how long the background thread should wait before its next check.
+
+        Sleeps until the earliest deadline of the refresh triggers, and at most the plugin cycle interval. With
+        look-ahead rendering enabled, the thread also wakes up early to start pre-rendering the next plugin.
+        """
+        current_dt = self._get_current_datetime()
+        self.scheduler.schedule(self.device_config, current_dt, self.last_cycle_check_dt, self.last_instance_check_dt)
+
+        if self.device_config.get_config("lookahead_rendering", default=False):
+            prediction = self._predict_next_refresh(current_dt)
+            if not prediction:
+                self.lookahead = None
+            elif not prediction.matches(self.lookahead):
+                logger.info(f"Scheduled look-ahead render. | {prediction}")
+                self.lookahead = prediction
+
+            if self.lookahead and not self.lookahead.started():
+                self.scheduler.add(self.lookahead.start_dt, RefreshScheduler.LOOKAHEAD, str(self.lookahead))
+        else:
+            self.lookahead = None
+
+        max_sleep_time = self.device_config.get_config("plugin_cycle_interval_seconds", default=60*60)
+        return self.scheduler.get_sleep_time(current_dt, max_sleep_time)
+
+    def _predict_next_refresh(self, current_dt):
+        """Predicts the plugin instance that will be refreshed at the next cycle boundary.
+
+        Mirrors `_determine_next_plugin` without advancing any playlist. The active playlist is determined at the
+        boundary time, so playlist window changes are taken into account. Returns a LookaheadRender, or None if
+        there is nothing worth pre-rendering.
+        """
+        latest_refresh_dt = self.device_config.get_refresh_info().get_refresh_datetime()
+        if not latest_refresh_dt:
+            # no previous refresh, the next check refreshes immediately
+            return None
+
+        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+        boundary_dt = (latest_refresh_dt + timedelta(seconds=plugin_cycle_interval)).astimezone(current_dt.tzinfo)
+
+        playlist = self.device_config.get_playlist_manager().determine_active_playlist(boundary_dt)
+        if not playlist:
+            return None
+        plugin_instance = playlist.peek_next_plugin()
+        if not plugin_instance or not plugin_instance.should_refresh(boundary_dt):
+            # the latest image will be reused, rendering ahead of time gains nothing
+            return None
+
+        render_seconds = self.render_durations.get(_get_instance_key(plugin_instance), DEFAULT_RENDER_SECONDS)
+        start_dt = boundary_dt - timedelta(seconds=render_seconds * LOOKAHEAD_MARGIN_FACTOR)
+        return LookaheadRender(playlist.name, plugin_instance, boundary_dt, start_dt)
+
+    def _start_lookahead_if_due(self, current_dt):
+        """Starts the scheduled look-ahead render in the background if its start time has been reached.
+
+        Returns True if a render was started, meaning the thread woke up early and the cycle boundary is still ahead.
+        """
+        lookahead = self.lookahead
+        if not lookahead or lookahead.started():
+            return False
+        if current_dt < lookahead.start_dt or current_dt >= lookahead.boundary_dt:
+            return False
+
+        logger.info(f"Starting look-ahead render. | {lookahead}")
+        lookahead.start(self.device_config, self._record_render_duration)
+        return True
+
+    def _take_lookahead_image(self, playlist, plugin_instance):
+        """Returns the look-ahead render for the given plugin instance, or None if there is no usable one.
+
+        Waits for a render that is still in progress, since starting a second render would only take longer.
+        """
+        lookahead, self.lookahead = self.lookahead, None
+        if not lookahead or not lookahead.started():
+            return None
+        if lookahead.playlist_name != playlist.name or _get_instance_key(lookahead.plugin_instance) != _get_instance_key(plugin_instance):
+            logger.info(f"Discarding look-ahead render, a different plugin instance is due. | {lookahead}")
+            return None
+        if lookahead.settings != plugin_instance.settings:
+            logger.info(f"Discarding look-ahead render, plugin settings changed. | {lookahead}")
+            return None
+
+        image = lookahead.get_image()
+        if image is not None:
+            logger.info(f"Using look-ahead render. | {lookahead}")
+        return image
+
+    def _record_render_duration(self, instance_key, duration):
+        """Stores the render time of a plugin instance, smoothed with the previous measurement."""
+        previous = self.render_durations.get(instance_key)
+        self.render_durations[instance_key] = duration if previous is None else (previous + duration) / 2
+
     def _get_current_datetime(self):
         """Retrieves the current datetime based on the device's configured timezone."""
         tz_str = self.device_config.get_config("timezone", default="UTC")
         return datetime.now(pytz.timezone(tz_str))
 
     def _determine_next_plugin(self, playlist_manager, latest_refresh_info, current_dt):
-        """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time."""
+        """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time.
+
+        The playlist advances when the plugin cycle interval expired or when the active playlist changed.
+        """
+        self.last_cycle_check_dt = current_dt
+        previous_playlist = playlist_manager.active_playlist
+
         playlist = playlist_manager.determine_active_playlist(current_dt)
         if not playlist:
             playlist_manager.active_playlist = None
@@ -177,6 +381,10 @@ class RefreshTask:
         plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
         should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
 
+        if not should_refresh and playlist.name != previous_playlist:
+            logger.info(f"Active playlist changed. | previous_playlist: {previous_playlist} | active_playlist: {playlist.name}")
+            should_refresh = True
+
         if not should_refresh:
             latest_refresh_str = latest_refresh_dt.strftime('%Y-%m-%d %H:%M:%S') if latest_refresh_dt else "None"
             logger.info(f"Not time to update display. | latest_update: {latest_refresh_str} | plugin_cycle_interval: {plugin_cycle_interval}")
@@ -186,24 +394,182 @@ class RefreshTask:
         logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
 
         return playlist, plugin
+
+    def _determine_due_displayed_instance(self, playlist_manager, latest_refresh_info, current_dt):
+        """Returns the displayed playlist plugin instance if its own refresh interval or scheduled time is due."""
+        self.last_instance_check_dt = current_dt
+        if not latest_refresh_info.playlist or latest_refresh_info.playlist != playlist_manager.active_playlist:
+            return None, None
+
+        playlist = playlist_manager.get_playlist(latest_refresh_info.playlist)
+        plugin_instance = playlist.find_plugin(latest_refresh_info.plugin_id, latest_refresh_info.plugin_instance) if playlist else None
+        if not plugin_instance or not plugin_instance.should_refresh(current_dt):
+            return None, None
+
+        logger.info(f"Displayed plugin instance is due for a refresh. | active_playlist: {playlist.name} | plugin_instance: {plugin_instance.name}")
+        return playlist, plugin_instance
     
-    def log_system_stats(self):
-        metrics = {
-            'cpu_percent': psutil.cpu_percent(interval=1),
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_percent': psutil.disk_usage('/').percent,
-            'load_avg_1_5_15': os.getloadavg(),
-            'swap_percent': psutil.swap_memory().percent,
-            'net_io': {
-                'bytes_sent': psutil.net_io_counters().bytes_sent,
-                'bytes_recv': psutil.net_io_counters().bytes_recv
-            }
-        }
+def _is_displayed(refresh_info, latest_refresh):
+    """Returns whether the latest refresh displayed the same playlist plugin instance as the refresh info."""
+    return refresh_info.get("plugin_instance") is not None and \
+        refresh_info.get("playlist") == latest_refresh.playlist and \
+        refresh_info.get("plugin_id") == latest_refresh.plugin_id and \
+        refresh_info.get("plugin_instance") == latest_refresh.plugin_instance
+
+def _finish_display_job(job, display_future):
+    """Moves a manual refresh job to its final state once the display worker is done with its image."""
+    if display_future.cancelled():
+        job.update(RefreshJob.SUPERSEDED, "A newer image was displayed instead")
+    elif display_future.exception() is not None:
+        job.update(RefreshJob.FAILED, str(display_future.exception()))
+    else:
+        job.update(RefreshJob.DONE, "Display updated")
+
+def _get_instance_key(plugin_instance):
+    """Returns the identifier of a plugin instance, used to track its render time."""
+    return f"{plugin_instance.plugin_id}:{plugin_instance.name}"
+
+def _get_instance_lock(plugin_instance):
+    """Returns the lock held while a plugin instance is being refreshed."""
+    with _instance_locks_guard:
+        return _instance_locks[_get_instance_key(plugin_instance)]
+
+class LookaheadRender:
+    """Renders a plugin instance in the background ahead of the cycle boundary it is due at.
+
+    Attributes:
+        playlist_name (str): Name of the playlist expected to be active at the boundary.
+        plugin_instance: The plugin instance expected to be refreshed at the boundary.
+        boundary_dt (datetime): Time of the cycle boundary.
+        start_dt (datetime): Time at which the render should start.
+        settings (dict): Snapshot of the plugin instance settings used for the render.
+    """
+
+    def __init__(self, playlist_name, plugin_instance, boundary_dt, start_dt):
+        self.playlist_name = playlist_name
+        self.plugin_instance = plugin_instance
+        self.boundary_dt = boundary_dt
+        self.start_dt = start_dt
+        self.settings = copy.deepcopy(plugin_instance.settings)
+
+        self.thread = None
+        self.budget = None
+        self.image = None
+
+    def matches(self, other):
+        """Returns True if the other look-ahead targets the same plugin instance and boundary."""
+        return other is not None and \
+            self.playlist_name == other.playlist_name and \
+            _get_instance_key(self.plugin_instance) == _get_instance_key(other.plugin_instance) and \
+            self.boundary_dt == other.boundary_dt
+
+    def started(self):
+        return self.thread is not None
+
+    def start(self, device_config, record_render_duration):
+        """Starts rendering the plugin instance on a background thread."""
+        def render():
+            # never renders alongside another refresh of the same instance, the look-ahead is skipped instead
+            instance_lock = _get_instance_lock(self.plugin_instance)
+            if not instance_lock.acquire(blocking=False):
+                logger.info(f"Skipping look-ahead render, the plugin instance is being refreshed. | {self}")
+                return
+            try:
+                plugin_config = device_config.get_plugin(self.plugin_instance.plugin_id)
+                if plugin_config is None:
+                    logger.error(f"Plugin config not found for '{self.plugin_instance.plugin_id}'.")
+                    return
+                plugin = get_plugin_instance(plugin_config)
+
+                start_time = time.monotonic()
+                with self.budget.stage(RefreshBudget.GENERATE), \
+                        metrics.labels(plugin_id=self.plugin_instance.plugin_id, instance=self.plugin_instance.name):
+                    self.image = render_plugin_image(plugin, self.settings, device_config)
+                    compute_image_hash(self.image)
+                record_render_duration(_get_instance_key(self.plugin_instance), time.monotonic() - start_time)
+            except Exception:
+                logger.exception(f"Look-ahead render failed. | {self}")
+            finally:
+                instance_lock.release()
+
+        self.budget = RefreshBudget.from_config(device_config)
+        self.thread = threading.Thread(target=render, daemon=True)
+        self.thread.start()
 
-        logger.info(f"System Stats: {metrics}")
+    def get_image(self):
+        """Waits for the render to finish and returns the image, or None if the render failed or ran out of time."""
+        self.thread.join(self.budget.stage_time_limit(RefreshBudget.GENERATE))
+        if self.thread.is_alive():
+            logger.warning(f"Look-ahead render ran out of time, abandoning it. | {self}")
+            return None
+        return self.image
+
+    def __str__(self):
+        return f"playlist: {self.playlist_name} | plugin_instance: {self.plugin_instance.name} | " \
+            f"start: {self.start_dt.strftime('%H:%M:%S')} | boundary: {self.boundary_dt.strftime('%H:%M:%S')}"
+
+class RefreshJob:
+    """Tracks a manual refresh submitted to the background refresh task.
+
+    Attributes:
+        job_id (str): Unique identifier of the job.
+        refresh_action (RefreshAction): The refresh to perform.
+        key (str): Identifies duplicate requests, which are coalesced into one job.
+        status (str): Current state of the job, one of the status constants below.
+        message (str): Human readable progress or error message.
+    """
+    QUEUED = "queued"
+    RENDERING = "rendering"
+    DISPLAYING = "displaying"
+    DONE = "done"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
+    FINAL_STATES = (DONE, FAILED, SUPERSEDED)
+
+    def __init__(self, refresh_action):
+        self.job_id = uuid.uuid4().hex
+        self.refresh_action = refresh_action
+        self.key = refresh_action.get_job_key()
+        self.status = RefreshJob.QUEUED
+        self.message = "Waiting for the refresh task"
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def update(self, status, message):
+        """Moves the job to a new status. Jobs that already reached a final state are not changed."""
+        with self.condition:
+            if self.is_finished():
+                return
+            self.status = status
+            self.message = message
+            self.version += 1
+            self.condition.notify_all()
+
+    def is_finished(self):
+        return self.status in RefreshJob.FINAL_STATES
+
+    def wait_for_update(self, version, timeout=None):
+        """Waits until the job changes from the given version and returns the current version."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "message": self.message,
+            "plugin_id": self.refresh_action.get_plugin_id(),
+            "finished": self.is_finished()
+        }
 
 class RefreshAction:
     """Base class for a refresh action. Subclasses should override the methods below."""
+
+    # Seconds spent generating a plugin instance image, set by refreshes that track render times
+    render_duration = None
+    # Set when the plugin inputs were unchanged and the latest image was reused without rendering
+    inputs_unchanged = False
     
     def refresh(self, plugin, device_config, current_dt):
         """Perform a refresh operation and return the updated image."""
@@ -217,6 +583,10 @@ class RefreshAction:
         """Return the plugin ID associated with this refresh."""
         raise NotImplementedError("Subclasses must implement the get_plugin_id method.")
 
+    def get_job_key(self):
+        """Return a key identifying duplicate refresh requests."""
+        raise NotImplementedError("Subclasses must implement the get_job_key method.")
+
 class ManualRefresh(RefreshAction):
     """Performs a manual refresh based on a plugin's ID and its associated settings.
     
@@ -231,7 +601,7 @@ class ManualRefresh(RefreshAction):
 
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a manual refresh using the stored plugin ID and settings."""
-        return plugin.generate_image(self.plugin_settings, device_config)
+        return render_plugin_image(plugin, self.plugin_settings, device_config)
 
     def get_refresh_info(self):
         """Return refresh metadata as a dictionary."""
@@ -241,18 +611,25 @@ class ManualRefresh(RefreshAction):
         """Return the plugin ID associated with this refresh."""
         return self.plugin_id
 
+    def get_job_key(self):
+        """Return a key identifying duplicate refresh requests."""
+        return f"manual:{self.plugin_id}:{json.dumps(self.plugin_settings, sort_keys=True, default=str)}"
+
 class PlaylistRefresh(RefreshAction):
     """Performs a refresh using a plugin instance within a playlist context.
 
     Attributes:
         playlist: The playlist object associated with the refresh.
         plugin_instance: The plugin instance to refresh.
+        force (bool): Refresh the plugin instance even if it is not due.
+        prerendered_image (PIL.Image): Image rendered ahead of time, used instead of generating a new one.
     """
 
-    def __init__(self, playlist, plugin_instance, force=False):
+    def __init__(self, playlist, plugin_instance, force=False, prerendered_image=None):
         self.playlist = playlist
         self.plugin_instance = plugin_instance
         self.force = force
+        self.prerendered_image = prerendered_image
 
     def get_refresh_info(self):
         """Return refresh metadata as a dictionary."""
@@ -267,22 +644,96 @@ class PlaylistRefresh(RefreshAction):
         """Return the plugin ID associated with this refresh."""
         return self.plugin_instance.plugin_id
 
+    def get_instance_key(self):
+        """Return the identifier used to track the render time of this refresh."""
+        return _get_instance_key(self.plugin_instance)
+
+    def get_job_key(self):
+        """Return a key identifying duplicate refresh requests."""
+        return f"playlist:{self.playlist.name}:{self.get_instance_key()}"
+
+    def _get_input_fingerprint(self, plugin, device_config):
+        """
+        Returns a hash of the plugin inputs, settings and resolution together with the plugin's fingerprint,
+        or (None, None) if the plugin has none.
+        """
+        try:
+            fingerprint = plugin.get_input_fingerprint(self.plugin_instance.settings, device_config)
+        except Exception:
+            logger.exception(f"Failed to get plugin input fingerprint, rendering. | plugin_instance: '{self.plugin_instance.name}'")
+            return None, None
+        if fingerprint is None:
+            return None, None
+
+        inputs = {
+            "fingerprint": fingerprint,
+            "settings": self.plugin_instance.settings,
+            "resolution": device_config.get_resolution(),
+            "orientation": device_config.get_config("orientation")
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest(), fingerprint
+
+    def _render(self, plugin, device_config, fingerprint):
+        """
+        Generates the image, handing the plugin the fingerprint its inputs were fetched for.
+
+        The plugin renders with a copy of the settings, so the fingerprint is never saved with them. Only the
+        settings the plugin changed are copied back.
+        """
+        settings = self.plugin_instance.settings
+        original_settings = dict(settings)
+        render_settings = dict(settings)
+        if fingerprint is not None:
+            render_settings[INPUT_FINGERPRINT_KEY] = fingerprint
+        try:
+            return render_plugin_image(plugin, render_settings, device_config)
+        finally:
+            render_settings.pop(INPUT_FINGERPRINT_KEY, None)
+            for key, value in render_settings.items():
+                if key not in original_settings or original_settings[key] != value:
+                    settings[key] = value
+            for key in original_settings.keys() - render_settings.keys():
+                settings.pop(key, None)
+
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a refresh for the specified plugin instance within its playlist context."""
-        # Determine the file path for the plugin's image
-        plugin_image_path = os.path.join(device_config.plugin_image_dir, self.plugin_instance.get_image_path())
-
-        # Check if a refresh is needed based on the plugin instance's criteria
-        if self.plugin_instance.should_refresh(current_dt) or self.force:
-            logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'") 
-            # Generate a new image
-            image = plugin.generate_image(self.plugin_instance.settings, device_config)
-            image.save(plugin_image_path)
-            self.plugin_instance.latest_refresh_time = current_dt.isoformat()
-        else:
-            logger.info(f"Not time to refresh plugin instance, using latest image. | plugin_instance: {self.plugin_instance.name}.")
-            # Load the existing image from disk
-            with Image.open(plugin_image_path) as img:
-                image = img.copy()
-
-        return image
\ No newline at end of file
+        # Wait for a background refresh of the same instance, the image it saves is then reused
+        with _get_instance_lock(self.plugin_instance):
+            # Determine the file path for the plugin's image
+            plugin_image_path = os.path.join(device_config.plugin_image_dir, self.plugin_instance.get_image_path())
+
+            # Check if a refresh is needed based on the plugin instance's criteria
+            if self.plugin_instance.should_refresh(current_dt) or self.force:
+                input_fingerprint = None
+                if self.prerendered_image is not None:
+                    logger.info(f"Refreshing plugin instance with look-ahead render. | plugin_instance: '{self.plugin_instance.name}'")
+                    image = self.prerendered_image
+                else:
+                    input_fingerprint, fingerprint = self._get_input_fingerprint(plugin, device_config)
+                    if input_fingerprint and input_fingerprint == self.plugin_instance.input_fingerprint \
+                            and os.path.exists(plugin_image_path):
+                        logger.info(f"Plugin inputs unchanged, reusing latest image. | plugin_instance: '{self.plugin_instance.name}'")
+                        self.inputs_unchanged = True
+                        image = get_image_cache(device_config).get_image(plugin_image_path)
+                    else:
+                        logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'")
+                        # Generate a new image
+                        start_time = time.monotonic()
+                        image = self._render(plugin, device_config, fingerprint)
+                        self.render_duration = time.monotonic() - start_time
+                        # hashed here, so background refreshes hash off the display path and the cache keeps the hash
+                        with metrics.span("hash"):
+                            compute_image_hash(image)
+
+                if not self.inputs_unchanged:
+                    with metrics.span("save"):
+                        image.save(plugin_image_path)
+                    get_image_cache(device_config).put_image(plugin_image_path, image)
+                self.plugin_instance.input_fingerprint = input_fingerprint
+                self.plugin_instance.latest_refresh_time = current_dt.isoformat()
+            else:
+                logger.info(f"Not time to refresh plugin instance, using latest image. | plugin_instance: {self.plugin_instance.name}.")
+                # Load the existing image, from memory if it is cached
+                image = get_image_cache(device_config).get_image(plugin_image_path)
+
+            return image
\ No newline at end of file
@@ -0,0 +1,370 @@
+"""
+Out-of-Process Render Workers for InkyPi
+
+Optionally runs plugin `generate_image` calls in a pool of worker processes, so CPU-heavy image work does not
+compete with the web server for the GIL and memory from large image decodes is returned to the system when a
+worker is recycled.
+
+Workers inherit the already imported Pillow, numpy and plugin modules. They are forked by a spawner process,
+which is itself forked when the pool starts, before the server starts any threads, so replacement workers are
+never forked from the threaded server. Each worker renders into a shared memory slot sized for a full frame.
+Finished images are written into the slot as raw pixels and rebuilt in the server process, instead of being
+pickled or re-encoded. Workers are replaced after a number of renders or once their memory use passes a
+threshold, the replacement takes over the slot.
+
+Enabled with the `render_workers` device config (number of worker processes, 0 keeps rendering in-process).
+
+Usage:
+    from render_workers import render_plugin_image
+
+    image = render_plugin_image(plugin, settings, device_config)
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from multiprocessing import reduction, shared_memory
+from multiprocessing.connection import Connection
+
+import psutil
+from PIL import Image
+
+from plugins.plugin_registry import get_plugin_instance
+from utils import metrics
+from utils.refresh_budget import RefreshBudget, get_current_budget, track_process
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RENDERS = 50
+DEFAULT_MEMORY_LIMIT_MB = 200
+# Bytes per pixel reserved in each worker's frame slot, enough for RGBA frames
+FRAME_SLOT_BYTES_PER_PIXEL = 4
+# Seconds a worker is given to exit before it is terminated
+STOP_TIMEOUT_SECONDS = 5
+
+# Global pool instance, created by start_render_pool
+_RENDER_POOL = None
+
+
+class RenderWorker:
+    """A worker process together with its pipe and shared memory frame slot."""
+
+    def __init__(self, pid, conn, slot_index, frame_slot):
+        # the worker is a child of the spawner, so it is watched through psutil instead of multiprocessing
+        self.process = psutil.Process(pid)
+        self.conn = conn
+        self.slot_index = slot_index
+        self.frame_slot = frame_slot
+        self.render_count = 0
+
+    def render(self, plugin_id, settings, device_config, timeout):
+        """Sends a render request to the worker and returns its response."""
+        self.conn.send({
+            "plugin_id": plugin_id,
+            "settings": settings,
+            "config": device_config.get_config(),
+            "timeout": timeout
+        })
+        if not self.conn.poll(timeout):
+            raise RuntimeError(f"Render worker did not respond within {timeout:.0f} seconds.")
+        response = self.conn.recv()
+        self.render_count += 1
+        return response
+
+    def read_frame(self, response):
+        """Rebuilds the rendered image from the frame slot, must be called before the worker renders again."""
+        if "data" in response:
+            image = Image.frombytes(response["mode"], response["size"], response["data"])
+        else:
+            view = self.frame_slot.buf[:response["length"]]
+            try:
+                image = Image.frombytes(response["mode"], response["size"], view)
+            finally:
+                view.release()
+        if response.get("palette"):
+            image.putpalette(response["palette"], response["palette_mode"])
+        return image
+
+    def get_memory_mb(self):
+        try:
+            return psutil.Process(self.process.pid).memory_info().rss / 1024 / 1024
+        except psutil.Error:
+            return 0
+
+    def is_alive(self):
+        try:
+            return self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    def stop(self, graceful=True):
+        """Stops the worker process, its frame slot stays with the pool."""
+        if graceful and self.is_alive():
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self._wait(STOP_TIMEOUT_SECONDS)
+        if self.is_alive():
+            try:
+                self.process.kill()
+            except psutil.Error:
+                pass
+            self._wait(STOP_TIMEOUT_SECONDS)
+        self.conn.close()
+
+    def _wait(self, timeout):
+        try:
+            self.process.wait(timeout)
+        except (psutil.TimeoutExpired, psutil.Error):
+            pass
+
+
+class RenderWorkerPool:
+    """Pool of pre-forked render worker processes, recycled after a number of renders or above a memory limit."""
+
+    def __init__(self, device_config, workers):
+        self.device_config = device_config
+        self.workers = workers
+        self.context = multiprocessing.get_context("fork")
+        self.idle_workers = queue.Queue()
+        self.lock = threading.Lock()
+        self.spawner_lock = threading.Lock()
+        self.all_workers = []
+        self.frame_slots = []
+        self.spawner = None
+        self.spawner_conn = None
+        self.running = False
+
+        width, height = device_config.get_resolution()
+        self.slot_size = width * height * FRAME_SLOT_BYTES_PER_PIXEL
+
+    def start(self):
+        """Forks the spawner and the workers, must be called before the process starts other threads."""
+        logger.info(f"Starting render worker pool. | workers: {self.workers}")
+        self.running = True
+        self.frame_slots = [shared_memory.SharedMemory(create=True, size=self.slot_size) for _ in range(self.workers)]
+
+        self.spawner_conn, child_conn = self.context.Pipe()
+        self.spawner = self.context.Process(
+            target=_spawner_main,
+            args=(child_conn, self.spawner_conn, self.frame_slots, self.device_config),
+            name="render-worker-spawner",
+            daemon=True
+        )
+        self.spawner.start()
+        child_conn.close()
+
+        for slot_index in range(self.workers):
+            self.idle_workers.put(self._start_worker(slot_index))
+
+    def stop(self):
+        logger.info("Stopping render worker pool")
+        self.running = False
+        with self.lock:
+            workers, self.all_workers = self.all_workers, []
+        for worker in workers:
+            worker.stop()
+
+        if self.spawner is not None:
+            # the spawner exits once its pipe is closed
+            self.spawner_conn.close()
+            self.spawner.join(STOP_TIMEOUT_SECONDS)
+            if self.spawner.is_alive():
+                self.spawner.kill()
+                self.spawner.join()
+            self.spawner = None
+        for frame_slot in self.frame_slots:
+            frame_slot.close()
+            frame_slot.unlink()
+        self.frame_slots = []
+
+    def render(self, plugin, settings, device_config):
+        """Renders the plugin image on the next idle worker, waiting for one if all are busy."""
+        budget = get_current_budget() or RefreshBudget.from_config(device_config)
+        timeout = budget.remaining()
+
+        worker = self.idle_workers.get()
+        healthy = False
+        try:
+            # the refresh watchdog kills the worker, and its browser, if the render runs out of time
+            with track_process(worker.process.pid):
+                response = worker.render(plugin.config.get("id"), settings, device_config, timeout)
+            healthy = True
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            image = worker.read_frame(response)
+        finally:
+            self._release(worker, healthy)
+
+        # spans recorded in the worker, e.g. the screenshot, are attributed to the current refresh
+        metrics.record_spans(response.get("spans", []))
+        # plugins may store state in their settings, e.g. the index of the last shown image
+        settings.update(response["settings"])
+        return image
+
+    def _release(self, worker, healthy):
+        """Returns the worker to the pool, replacing it if it failed or is due for recycling."""
+        max_renders = self.device_config.get_config("render_worker_max_renders", default=DEFAULT_MAX_RENDERS)
+        memory_limit_mb = self.device_config.get_config("render_worker_memory_limit_mb", default=DEFAULT_MEMORY_LIMIT_MB)
+
+        reason = None
+        if not healthy or not worker.is_alive():
+            reason = "worker not responding"
+        elif worker.render_count >= max_renders:
+            reason = f"{worker.render_count} renders"
+        else:
+            memory_mb = worker.get_memory_mb()
+            if memory_mb > memory_limit_mb:
+                reason = f"memory {memory_mb:.0f}MB > {memory_limit_mb}MB"
+
+        if reason is None:
+            self.idle_workers.put(worker)
+            return
+
+        logger.info(f"Recycling render worker. | pid: {worker.process.pid} | reason: {reason}")
+        with self.lock:
+            if worker in self.all_workers:
+                self.all_workers.remove(worker)
+        # a failed worker may still be rendering, so it is not asked to exit
+        worker.stop(graceful=healthy)
+        if self.running:
+            self.idle_workers.put(self._start_worker(worker.slot_index))
+
+    def _start_worker(self, slot_index):
+        """Asks the spawner to fork a worker rendering into the given frame slot."""
+        with self.spawner_lock:
+            self.spawner_conn.send(slot_index)
+            pid = self.spawner_conn.recv()
+            fd = reduction.recv_handle(self.spawner_conn)
+        os.set_inheritable(fd, False)
+
+        worker = RenderWorker(pid, Connection(fd), slot_index, self.frame_slots[slot_index])
+        with self.lock:
+            self.all_workers.append(worker)
+        logger.debug(f"Started render worker. | pid: {pid}")
+        return worker
+
+
+def start_render_pool(device_config):
+    """
+    Starts the render worker pool if enabled in the device config.
+    Should be called on application startup, before other threads are started.
+    """
+    global _RENDER_POOL
+
+    workers = int(device_config.get_config("render_workers", default=0) or 0)
+    if workers > 0 and _RENDER_POOL is None:
+        _RENDER_POOL = RenderWorkerPool(device_config, workers)
+        _RENDER_POOL.start()
+    return _RENDER_POOL
+
+
+def stop_render_pool():
+    """
+    Stops the render worker pool.
+    Should be called on application shutdown.
+    """
+    global _RENDER_POOL
+
+    if _RENDER_POOL is not None:
+        _RENDER_POOL.stop()
+        _RENDER_POOL = None
+
+
+def render_plugin_image(plugin, settings, device_config):
+    """Generates the plugin image, on a render worker if the pool is running or in-process otherwise."""
+    with metrics.span("generate"):
+        if _RENDER_POOL is None:
+            return plugin.generate_image(settings, device_config)
+        return _RENDER_POOL.render(plugin, settings, device_config)
+
+
+def _spawner_main(conn, server_conn, frame_slots, device_config):
+    """Entry point of the spawner, forks a worker for each frame slot index it receives until its pipe closes."""
+    # the copy of the server's end is closed, so the pipe closes when the server exits
+    server_conn.close()
+    # finished workers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        try:
+            slot_index = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                conn.close()
+                parent_conn.close()
+                # the worker waits for its own children, e.g. the screenshot browser
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _worker_main(child_conn, frame_slots[slot_index], device_config)
+            except BaseException:
+                logger.exception("Render worker exited with an error")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        child_conn.close()
+        try:
+            conn.send(pid)
+            reduction.send_handle(conn, parent_conn.fileno(), os.getppid())
+        except (OSError, ValueError):
+            break
+        finally:
+            parent_conn.close()
+
+
+def _worker_main(conn, frame_slot, device_config):
+    """Entry point of a render worker, renders plugin images until it is asked to exit."""
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+
+        try:
+            # the worker's copy of the device config is refreshed with the server's current config
+            device_config.config = request["config"]
+            plugin = get_plugin_instance({"id": request["plugin_id"]})
+            settings = request["settings"]
+
+            # the budget left in the server bounds the plugin's HTTP and browser timeouts
+            with RefreshBudget(request["timeout"]).stage(RefreshBudget.GENERATE), metrics.capture_spans() as spans:
+                image = plugin.generate_image(settings, device_config)
+
+            response = _write_frame(frame_slot, image)
+            response["settings"] = settings
+            response["spans"] = spans
+        except Exception as e:
+            logger.exception(f"Render worker failed to generate image. | plugin_id: {request.get('plugin_id')}")
+            response = {"error": str(e)}
+
+        try:
+            conn.send(response)
+        except (OSError, ValueError):
+            break
+
+
+def _write_frame(frame_slot, image):
+    """Writes the image pixels to the frame slot, falling back to sending them through the pipe if too large."""
+    data = image.tobytes()
+    response = {"mode": image.mode, "size": image.size}
+    if image.mode in ("P", "PA"):
+        response["palette"] = image.getpalette(None)
+        response["palette_mode"] = image.palette.mode
+
+    if len(data) <= frame_slot.size:
+        frame_slot.buf[:len(data)] = data
+        response["length"] = len(data)
+    else:
+        response["data"] = data
+    return response
@@ -0,0 +1,27 @@
+// Polls a queued refresh job until it finishes and returns its final status
+async function waitForRefreshJob(statusUrl, pollIntervalMs = 1000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || 'Failed to get the refresh status');
+        }
+        if (job.finished) {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, pollIntervalMs));
+    }
+}
+
+// Waits for the refresh job in a queued response and shows the outcome in the response modal
+async function showRefreshJobResult(result) {
+    const job = await waitForRefreshJob(result.status_url);
+    if (job.status === 'done') {
+        showResponseModal('success', `Success! ${job.message}`);
+    } else if (job.status === 'superseded') {
+        showResponseModal('success', job.message);
+    } else {
+        showResponseModal('failure', `Error!  ${job.message}`);
+    }
+    return job;
+}
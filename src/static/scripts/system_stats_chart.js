@@ -0,0 +1,69 @@
+// Draws the recent system stats samples as a line chart of CPU, memory and swap usage.
+const SYSTEM_STATS_SERIES = [
+    { key: 'cpu_percent', label: 'CPU', color: '#2c66b1' },
+    { key: 'memory_percent', label: 'Memory', color: '#43a047' },
+    { key: 'swap_percent', label: 'Swap', color: '#e53935' },
+];
+
+async function loadSystemStatsChart(canvas, statsUrl) {
+    try {
+        const response = await fetch(statsUrl);
+        const result = await response.json();
+        drawSystemStatsChart(canvas, result.samples);
+    } catch (error) {
+        console.error('Error loading system stats:', error);
+    }
+}
+
+function drawSystemStatsChart(canvas, samples) {
+    const ctx = canvas.getContext('2d');
+    const width = canvas.width = canvas.clientWidth;
+    const height = canvas.height;
+    const padding = { top: 10, right: 10, bottom: 20, left: 35 };
+    const plotWidth = width - padding.left - padding.right;
+    const plotHeight = height - padding.top - padding.bottom;
+    const textColor = getComputedStyle(document.body).color;
+
+    ctx.clearRect(0, 0, width, height);
+    ctx.font = '11px sans-serif';
+    ctx.fillStyle = textColor;
+
+    if (!samples || samples.length < 2) {
+        ctx.fillText('Not enough samples yet.', padding.left, padding.top + plotHeight / 2);
+        return;
+    }
+
+    // percentage grid lines
+    ctx.strokeStyle = 'rgba(128, 128, 128, 0.3)';
+    for (const percent of [0, 25, 50, 75, 100]) {
+        const y = padding.top + plotHeight * (1 - percent / 100);
+        ctx.beginPath();
+        ctx.moveTo(padding.left, y);
+        ctx.lineTo(width - padding.right, y);
+        ctx.stroke();
+        ctx.fillText(`${percent}%`, 2, y + 4);
+    }
+
+    const start = samples[0].timestamp;
+    const span = Math.max(samples[samples.length - 1].timestamp - start, 1);
+    const xFor = sample => padding.left + plotWidth * (sample.timestamp - start) / span;
+
+    let legendX = padding.left;
+    for (const series of SYSTEM_STATS_SERIES) {
+        ctx.strokeStyle = series.color;
+        ctx.lineWidth = 1.5;
+        ctx.beginPath();
+        samples.forEach((sample, index) => {
+            const y = padding.top + plotHeight * (1 - sample[series.key] / 100);
+            index === 0 ? ctx.moveTo(xFor(sample), y) : ctx.lineTo(xFor(sample), y);
+        });
+        ctx.stroke();
+
+        const latest = samples[samples.length - 1][series.key];
+        const legend = `${series.label} ${latest.toFixed(0)}%`;
+        ctx.fillStyle = series.color;
+        ctx.fillText(legend, legendX, height - 5);
+        legendX += ctx.measureText(legend).width + 15;
+    }
+    ctx.lineWidth = 1;
+}
@@ -0,0 +1,113 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Seconds between samples
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 30
+# Number of samples kept, two hours at the default interval
+MAX_SAMPLES = 240
+# Niceness of the sampler thread, so sampling never competes with refreshes or the web server
+SAMPLER_NICENESS = 19
+
+class SystemStatsSampler:
+    """Samples system stats on a low-priority background thread into a fixed-size ring of recent samples.
+
+    Each sample holds CPU, memory, swap, load, disk and network figures. Counters such as network bytes are
+    also reported as rates since the previous sample. When the `log_system_stats` device config is enabled,
+    every sample is logged as well.
+    """
+
+    def __init__(self, device_config):
+        self.device_config = device_config
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.previous_counters = None
+
+    def start(self):
+        """Starts the background thread sampling system stats."""
+        if not self.thread or not self.thread.is_alive():
+            logger.info("Starting system stats sampler")
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="system-stats", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stops sampling."""
+        self.stop_event.set()
+        if self.thread:
+            logger.info("Stopping system stats sampler")
+            self.thread.join()
+
+    def get_samples(self, since=None):
+        """Returns the recorded samples, oldest first, optionally only those taken after the given timestamp."""
+        with self.lock:
+            samples = list(self.samples)
+        if since is not None:
+            samples = [sample for sample in samples if sample["timestamp"] > since]
+        return samples
+
+    def get_interval(self):
+        return self.device_config.get_config("system_stats_interval_seconds", default=DEFAULT_SAMPLE_INTERVAL_SECONDS)
+
+    def _run(self):
+        _lower_thread_priority()
+        # primes the cpu counters, the first non-blocking reading is always 0
+        psutil.cpu_percent(interval=None)
+        while not self.stop_event.wait(self.get_interval()):
+            try:
+                sample = self.sample()
+                with self.lock:
+                    self.samples.append(sample)
+                if self.device_config.get_config("log_system_stats"):
+                    logger.info(f"System Stats: {sample}")
+            except Exception:
+                logger.exception("Exception while sampling system stats")
+
+    def sample(self):
+        """Takes a sample of the system stats without blocking."""
+        timestamp = time.time()
+        net_io = psutil.net_io_counters()
+        disk_io = psutil.disk_io_counters()
+        counters = {
+            "net_bytes_sent": net_io.bytes_sent if net_io else 0,
+            "net_bytes_recv": net_io.bytes_recv if net_io else 0,
+            "disk_read_bytes": disk_io.read_bytes if disk_io else 0,
+            "disk_write_bytes": disk_io.write_bytes if disk_io else 0
+        }
+
+        sample = {
+            "timestamp": timestamp,
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "swap_percent": psutil.swap_memory().percent,
+            "disk_percent": psutil.disk_usage('/').percent,
+            "load_avg_1_5_15": os.getloadavg(),
+            "process_rss_mb": round(psutil.Process().memory_info().rss / 1024 / 1024, 1),
+            **counters
+        }
+
+        # rates since the previous sample, in bytes per second
+        if self.previous_counters:
+            previous_timestamp, previous = self.previous_counters
+            elapsed = max(timestamp - previous_timestamp, 1e-6)
+            for key, value in counters.items():
+                sample[f"{key}_per_second"] = round(max(0, value - previous[key]) / elapsed, 1)
+        self.previous_counters = (timestamp, counters)
+
+        return sample
+
+def _lower_thread_priority():
+    """Lowers the scheduling priority of the calling thread, on Linux niceness applies per thread."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SAMPLER_NICENESS)
+    except (AttributeError, OSError):
+        logger.debug("Could not lower the priority of the system stats sampler")
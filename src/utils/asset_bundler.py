@@ -0,0 +1,232 @@
+"""
+Asset Bundler for InkyPi
+
+Bundles the style sheets and fonts of a plugin page into the rendered HTML, so the browser does not load
+and parse every font and style sheet file on each render.
+
+Style sheets are read once per plugin and inlined into the page, with their relative url() references made
+absolute. Only the font families named in the page's styles get an @font-face rule, and when fontTools is
+installed each font is subset to the characters of the page's text and embedded as a data URI. Subsets are
+cached in memory by font file and character set. Pages with scripts can add text the bundler does not see,
+so they get the full font files of the families they use.
+
+Usage:
+    from utils.asset_bundler import get_asset_bundler
+
+    bundler = get_asset_bundler()
+    style_sheet = bundler.get_style_sheet(css_files)
+    html = bundler.add_font_faces(rendered_html, style_sheet)
+"""
+
+import base64
+import io
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from utils.app_utils import get_fonts
+
+# Try to import fontTools for font subsetting, fonts are embedded whole without it
+try:
+    from fontTools import subset as font_subset
+    FONT_SUBSETTING_AVAILABLE = True
+except ImportError:
+    FONT_SUBSETTING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_SUBSETS = 64
+# Characters the browser draws itself: ellipses of overflowing text, list markers and counters
+BASE_CHARACTERS = " …•.-0123456789ivxlcdm"
+
+_URL_PATTERN = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+_CONTENT_PATTERN = re.compile(r"""content\s*:\s*(["'])(.*?)\1""")
+
+# Global bundler instance (singleton)
+_ASSET_BUNDLER = None
+
+
+class _TextCollector(HTMLParser):
+    """Collects the text of a page, outside of its style and script elements."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip = 0
+        self.has_script = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "script":
+            self.has_script = True
+        if tag in ("script", "style"):
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+
+class AssetBundler:
+    """Inlines style sheets and embeds the used fonts, subset to the page's characters, into rendered pages."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # css files -> (modification times, inlined style sheet)
+        self.style_sheets = {}
+        # (font file, modification time, characters) -> data URI of the subset font
+        self.subsets = OrderedDict()
+
+    def get_style_sheet(self, css_files):
+        """Returns the contents of the style sheets as a single style sheet, read again only when a file changes."""
+        css_files = tuple(css_files)
+        mtimes = tuple(_get_mtime(path) for path in css_files)
+        with self.lock:
+            cached = self.style_sheets.get(css_files)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+
+        parts = []
+        for path in css_files:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    parts.append(_make_urls_absolute(f.read(), os.path.dirname(path)))
+            except OSError as e:
+                logger.warning(f"Failed to read style sheet {path}: {e}")
+        style_sheet = "\n".join(parts)
+
+        with self.lock:
+            self.style_sheets[css_files] = (mtimes, style_sheet)
+        return style_sheet
+
+    def get_font_faces(self, html, style_sheet=""):
+        """
+        Returns the @font-face rules for the font families the page uses.
+
+        Args:
+            html (str): The rendered page, including its inline styles and scripts.
+            style_sheet (str): The style sheet inlined into the page.
+        """
+        styles = f"{style_sheet}\n{html}"
+        fonts = [font for font in get_fonts() if _uses_family(styles, font["font_family"])]
+        if not fonts:
+            return ""
+
+        characters = None
+        if FONT_SUBSETTING_AVAILABLE:
+            characters = self._get_characters(html, styles)
+
+        rules = []
+        for font in fonts:
+            url = self._get_subset(font["url"], characters) if characters is not None else None
+            rules.append(
+                "@font-face {"
+                f" font-family: \"{font['font_family']}\";"
+                f" font-weight: {font['font_weight']};"
+                f" font-style: {font['font_style']};"
+                f" src: url({url or font['url']}) format(\"truetype\");"
+                " }"
+            )
+        return "\n".join(rules)
+
+    def add_font_faces(self, html, style_sheet=""):
+        """Returns the page with the @font-face rules of the fonts it uses added to its head."""
+        font_faces = self.get_font_faces(html, style_sheet)
+        if not font_faces:
+            return html
+        style = f"<style>\n{font_faces}\n</style>"
+        head_end = html.find("</head>")
+        if head_end == -1:
+            return style + html
+        return html[:head_end] + style + html[head_end:]
+
+    def _get_characters(self, html, styles):
+        """Returns the characters the page's text is drawn with, None if scripts can add text."""
+        collector = _TextCollector()
+        collector.feed(html)
+        collector.close()
+        if collector.has_script:
+            return None
+
+        characters = set("".join(collector.parts))
+        characters.update("".join(match.group(2) for match in _CONTENT_PATTERN.finditer(styles)))
+        if "text-transform" in styles:
+            characters.update("".join(characters).upper() + "".join(characters).lower())
+        characters.update(BASE_CHARACTERS)
+        characters.difference_update("\n\r\t")
+        return "".join(sorted(characters))
+
+    def _get_subset(self, path, characters):
+        """Returns a data URI of the font subset to the characters, None if it cannot be subset."""
+        key = (path, _get_mtime(path), characters)
+        with self.lock:
+            if key in self.subsets:
+                self.subsets.move_to_end(key)
+                return self.subsets[key]
+
+        try:
+            options = font_subset.Options()
+            # keep kerning and ligatures, so the text is laid out as with the full font
+            options.layout_features = ["*"]
+            font = font_subset.load_font(path, options)
+            subsetter = font_subset.Subsetter(options)
+            subsetter.populate(text=characters)
+            subsetter.subset(font)
+            buffer = io.BytesIO()
+            font_subset.save_font(font, buffer, options)
+        except Exception as e:
+            logger.warning(f"Failed to subset font {path}: {e}")
+            return None
+
+        data_uri = f"data:font/ttf;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+        logger.debug(f"Subset font. | path: {path} | characters: {len(characters)} | bytes: {buffer.tell()}")
+        with self.lock:
+            self.subsets[key] = data_uri
+            while len(self.subsets) > MAX_CACHED_SUBSETS:
+                self.subsets.popitem(last=False)
+        return data_uri
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _make_urls_absolute(css, base_dir):
+    """Resolves the relative url() references of a style sheet against its directory."""
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(("data:", "http://", "https://", "//", "file:", "#")) or os.path.isabs(url):
+            return match.group(0)
+        return f'url("{os.path.normpath(os.path.join(base_dir, url))}")'
+    return _URL_PATTERN.sub(replace, css)
+
+
+def _uses_family(styles, font_family):
+    """Whether a font-family declaration, or a script's font family option, names the family."""
+    pattern = rf"""family\s*:[^;}}]*?["']?{re.escape(font_family)}\b"""
+    return re.search(pattern, styles, re.IGNORECASE) is not None
+
+
+def get_asset_bundler() -> AssetBundler:
+    """
+    Get the shared asset bundler instance.
+    Creates it on first call.
+
+    Returns:
+        AssetBundler: Shared asset bundler
+    """
+    global _ASSET_BUNDLER
+
+    if _ASSET_BUNDLER is None:
+        _ASSET_BUNDLER = AssetBundler()
+
+    return _ASSET_BUNDLER
@@ -0,0 +1,473 @@
+"""
+Persistent Headless Browser for InkyPi
+
+Keeps one headless Chromium running and controls it over the DevTools protocol on a pipe
+(`--remote-debugging-pipe`), so screenshots no longer pay for starting a browser process each time. Pages
+are rendered in a small pool of reusable tabs and screenshots are decoded in memory instead of going
+through a temporary PNG file.
+
+The browser is started on the first screenshot and restarted after `browser_max_renders` screenshots, once
+it uses more than `browser_memory_limit_mb` of memory, or after an error. When the service is disabled with
+the `persistent_browser` device config, or a screenshot fails, `take_screenshot` falls back to starting a
+browser process for the screenshot. Processes forked from the app, such as render workers, do not inherit
+the service and always use that fallback.
+
+Usage:
+    from utils.browser_service import get_browser_service
+
+    browser_service = get_browser_service()
+    if browser_service:
+        image = browser_service.screenshot("https://example.com", (800, 480))
+"""
+
+import base64
+import fcntl
+import itertools
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import psutil
+from PIL import Image
+
+from utils import metrics
+from utils.refresh_budget import get_timeout
+
+logger = logging.getLogger(__name__)
+
+# Flags keeping Chromium lean on small devices, shared with the one-off screenshot processes
+CHROMIUM_FLAGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--use-gl=swiftshader",
+    "--hide-scrollbars",
+    "--in-process-gpu",
+    "--js-flags=--jitless",
+    "--disable-zero-copy",
+    "--disable-gpu-memory-buffer-compositor-resources",
+    "--disable-extensions",
+    "--disable-plugins",
+    "--mute-audio",
+    "--renderer-process-limit=1",
+    "--no-zygote",
+    "--no-sandbox"
+]
+
+DEFAULT_TABS = 1
+DEFAULT_MAX_RENDERS = 100
+DEFAULT_MEMORY_LIMIT_MB = 300
+# Seconds a screenshot may take when it does not run within a refresh budget
+DEFAULT_RENDER_TIMEOUT_SECONDS = 60
+# Seconds given to the browser to start and to exit
+START_TIMEOUT_SECONDS = 30
+STOP_TIMEOUT_SECONDS = 5
+# The browser reads commands from fd 3 and writes responses to fd 4
+PIPE_READ_FD = 3
+PIPE_WRITE_FD = 4
+
+# Global service instance, created by start_browser_service
+_BROWSER_SERVICE = None
+
+
+def _forget_browser_service():
+    # a forked process shares the pipe and lock state of the parent's browser, so it uses one-off browsers
+    global _BROWSER_SERVICE
+    _BROWSER_SERVICE = None
+
+
+os.register_at_fork(after_in_child=_forget_browser_service)
+
+
+class BrowserError(Exception):
+    """Raised when the browser fails or does not answer in time."""
+
+
+def find_chromium_binary():
+    """Find the first available Chromium-based binary in system PATH."""
+    candidates = ["chromium-headless-shell", "chromium", "chrome"]
+    for candidate in candidates:
+        path = shutil.which(candidate)
+        if path:
+            logger.debug(f"Found browser binary: {candidate} at {path}")
+            return candidate
+    return None
+
+
+class _Response:
+    def __init__(self):
+        self.event = threading.Event()
+        self.message = None
+
+
+class _PipeConnection:
+    """DevTools protocol connection over the browser's debugging pipe, messages are JSON separated by null bytes."""
+
+    def __init__(self, read_fd, write_fd):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.responses = {}
+        # (session id, event method) -> events waiting for them
+        self.event_waiters = {}
+        self.alive = True
+        self.reader = threading.Thread(target=self._read_loop, name="browser-pipe", daemon=True)
+        self.reader.start()
+
+    def send(self, method, params=None, session_id=None, timeout=None):
+        """Sends a command and returns its result.
+
+        Raises:
+            BrowserError: If the browser returns an error, closes the pipe or does not answer within the timeout.
+        """
+        message_id = next(self.ids)
+        response = _Response()
+        with self.lock:
+            if not self.alive:
+                raise BrowserError("Browser connection is closed.")
+            self.responses[message_id] = response
+
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        try:
+            with self.write_lock:
+                os.write(self.write_fd, json.dumps(message).encode() + b"\0")
+        except OSError as e:
+            raise BrowserError(f"Failed to send {method} to browser: {e}")
+
+        if not response.event.wait(timeout):
+            with self.lock:
+                self.responses.pop(message_id, None)
+            raise BrowserError(f"Browser did not answer {method} within {timeout:.0f} seconds.")
+        if response.message is None:
+            raise BrowserError("Browser connection was closed.")
+        if "error" in response.message:
+            raise BrowserError(f"{method} failed: {response.message['error'].get('message')}")
+        return response.message.get("result", {})
+
+    def expect_event(self, session_id, method):
+        """Returns a threading.Event that is set when the browser sends the event for the session."""
+        event = threading.Event()
+        with self.lock:
+            self.event_waiters.setdefault((session_id, method), []).append(event)
+        return event
+
+    def discard_event(self, session_id, method, event):
+        """Stops waiting for an event that was expected with expect_event."""
+        with self.lock:
+            waiters = self.event_waiters.get((session_id, method), [])
+            if event in waiters:
+                waiters.remove(event)
+            if not waiters:
+                self.event_waiters.pop((session_id, method), None)
+
+    def close(self):
+        for fd in (self.write_fd, self.read_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _read_loop(self):
+        buffer = b""
+        try:
+            while True:
+                chunk = os.read(self.read_fd, 1 << 16)
+                if not chunk:
+                    break
+                buffer += chunk
+                while b"\0" in buffer:
+                    data, buffer = buffer.split(b"\0", 1)
+                    self._dispatch(json.loads(data))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Browser pipe closed. | error: {e}")
+        finally:
+            with self.lock:
+                self.alive = False
+                responses, self.responses = self.responses, {}
+            for response in responses.values():
+                response.event.set()
+
+    def _dispatch(self, message):
+        if "id" in message:
+            with self.lock:
+                response = self.responses.pop(message["id"], None)
+            if response:
+                response.message = message
+                response.event.set()
+        else:
+            with self.lock:
+                waiters = self.event_waiters.pop((message.get("sessionId"), message.get("method")), [])
+            for event in waiters:
+                event.set()
+
+
+class _Tab:
+    """A browser tab attached with its own DevTools session."""
+
+    def __init__(self, connection, timeout):
+        self.connection = connection
+        target = connection.send("Target.createTarget", {"url": "about:blank"}, timeout=timeout)
+        self.target_id = target["targetId"]
+        session = connection.send("Target.attachToTarget", {"targetId": self.target_id, "flatten": True}, timeout=timeout)
+        self.session_id = session["sessionId"]
+        self.send("Page.enable", timeout=timeout)
+
+    def send(self, method, params=None, timeout=None):
+        return self.connection.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    def screenshot(self, url, dimensions, timeout_ms, deadline):
+        """Loads the url at the given viewport size and returns the screenshot."""
+        remaining = lambda: max(0.1, deadline - time.monotonic())
+
+        self.send("Emulation.setDeviceMetricsOverride", {
+            "width": int(dimensions[0]),
+            "height": int(dimensions[1]),
+            "deviceScaleFactor": 1,
+            "mobile": False
+        }, timeout=remaining())
+
+        loaded = self.connection.expect_event(self.session_id, "Page.loadEventFired")
+        self.send("Page.navigate", {"url": url}, timeout=remaining())
+        # like the --timeout flag, a page that is still loading after timeout_ms is stopped and captured as it is
+        load_timeout = min(timeout_ms / 1000, remaining()) if timeout_ms else remaining()
+        if not loaded.wait(load_timeout):
+            self.connection.discard_event(self.session_id, "Page.loadEventFired", loaded)
+            if not timeout_ms or deadline - time.monotonic() <= 0:
+                raise BrowserError(f"Page did not load in time. | url: {url}")
+            self.send("Page.stopLoading", timeout=remaining())
+
+        # web fonts may still be loading when the load event fires
+        self.send("Runtime.evaluate", {
+            "expression": "document.fonts.ready.then(() => true)",
+            "awaitPromise": True
+        }, timeout=remaining())
+        result = self.send("Page.captureScreenshot", {"format": "png", "optimizeForSpeed": True}, timeout=remaining())
+
+        image = Image.open(BytesIO(base64.b64decode(result["data"])))
+        image.load()
+        return image
+
+    def close(self, timeout):
+        self.connection.send("Target.closeTarget", {"targetId": self.target_id}, timeout=timeout)
+
+
+class BrowserService:
+    """A persistent headless Chromium with a pool of reusable tabs, restarted after a number of renders or above a memory limit."""
+
+    def __init__(self, device_config):
+        self.device_config = device_config
+        self.lock = threading.Lock()
+        self.tab_slots = threading.BoundedSemaphore(self.get_tab_count())
+        self.process = None
+        self.connection = None
+        self.idle_tabs = []
+        self.busy_tabs = 0
+        self.render_count = 0
+        self.restart_reason = None
+
+    def get_tab_count(self):
+        return max(1, int(self.device_config.get_config("browser_tabs", default=DEFAULT_TABS)))
+
+    def screenshot(self, target, dimensions, timeout_ms=None):
+        """
+        Takes a screenshot of a URL or local HTML file.
+
+        Args:
+            target (str): URL or path of a local file.
+            dimensions (tuple): Viewport size as (width, height).
+            timeout_ms (int, optional): Milliseconds after which a page that is still loading is captured as it is.
+
+        Returns:
+            PIL.Image: The screenshot, or None if it failed.
+        """
+        if os.path.exists(target):
+            target = Path(target).resolve().as_uri()
+        timeout = get_timeout(DEFAULT_RENDER_TIMEOUT_SECONDS)
+        deadline = time.monotonic() + timeout
+
+        if not self.tab_slots.acquire(timeout=timeout):
+            logger.error("No browser tab became available for the screenshot")
+            return None
+
+        tab = None
+        healthy = False
+        try:
+            with metrics.span("screenshot"):
+                tab = self._get_tab(deadline)
+                image = tab.screenshot(target, dimensions, timeout_ms, deadline)
+            healthy = True
+            return image
+        except Exception as e:
+            logger.error(f"Failed to take screenshot in persistent browser: {str(e)}")
+            return None
+        finally:
+            self._release_tab(tab, healthy)
+            self.tab_slots.release()
+
+    def stop(self):
+        """Closes the browser."""
+        with self.lock:
+            self._stop_browser()
+
+    def _get_tab(self, deadline):
+        with self.lock:
+            if self.connection is None or not self.connection.alive:
+                self._stop_browser()
+                self._start_browser()
+            self.busy_tabs += 1
+            if self.idle_tabs:
+                return self.idle_tabs.pop()
+            connection = self.connection
+
+        try:
+            return _Tab(connection, max(0.1, deadline - time.monotonic()))
+        except Exception:
+            with self.lock:
+                self.busy_tabs -= 1
+            raise
+
+    def _release_tab(self, tab, healthy):
+        with self.lock:
+            if tab is None:
+                # the browser did not start or no tab could be opened
+                self.restart_reason = self.restart_reason or "failed to open tab"
+            else:
+                self.busy_tabs -= 1
+                self.render_count += 1
+                if healthy and tab.connection is self.connection:
+                    self.idle_tabs.append(tab)
+                elif not healthy:
+                    self.restart_reason = "screenshot failed"
+
+            if self.restart_reason is None:
+                self.restart_reason = self._get_recycle_reason()
+            if self.restart_reason and self.busy_tabs == 0:
+                logger.info(f"Restarting persistent browser. | reason: {self.restart_reason}")
+                self._stop_browser()
+
+    def _get_recycle_reason(self):
+        max_renders = self.device_config.get_config("browser_max_renders", default=DEFAULT_MAX_RENDERS)
+        memory_limit_mb = self.device_config.get_config("browser_memory_limit_mb", default=DEFAULT_MEMORY_LIMIT_MB)
+        if self.render_count >= max_renders:
+            return f"{self.render_count} renders"
+        memory_mb = self._get_memory_mb()
+        if memory_mb > memory_limit_mb:
+            return f"memory {memory_mb:.0f}MB > {memory_limit_mb}MB"
+        return None
+
+    def _get_memory_mb(self):
+        """Returns the memory used by the browser and its child processes."""
+        if self.process is None:
+            return 0
+        try:
+            process = psutil.Process(self.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for p in processes:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 1024 / 1024
+
+    def _start_browser(self):
+        browser = find_chromium_binary()
+        if not browser:
+            raise BrowserError("No Chromium-based browser found. Install chromium, chromium-headless-shell, or chrome.")
+
+        # pipe fds are moved above the fds they are mapped to in the browser, so mapping them cannot overwrite each
+        # other, and are close-on-exec so only the mapped copies are inherited
+        command_read, command_write = os.pipe()
+        response_read, response_write = os.pipe()
+        fds = [fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 10) for fd in (command_read, command_write, response_read, response_write)]
+        for fd in (command_read, command_write, response_read, response_write):
+            os.close(fd)
+        command_read, command_write, response_read, response_write = fds
+
+        # posix_spawn maps the fds without running Python code in the child, which is unsafe in a threaded process
+        file_actions = [
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_DUP2, 1, 2),
+            (os.POSIX_SPAWN_DUP2, command_read, PIPE_READ_FD),
+            (os.POSIX_SPAWN_DUP2, response_write, PIPE_WRITE_FD)
+        ]
+        command = [browser, "--headless", "--remote-debugging-pipe", *CHROMIUM_FLAGS, "about:blank"]
+        try:
+            pid = os.posix_spawn(shutil.which(browser), command, os.environ, file_actions=file_actions)
+            self.process = psutil.Process(pid)
+        except Exception:
+            for fd in fds:
+                os.close(fd)
+            raise
+        os.close(command_read)
+        os.close(response_write)
+
+        self.connection = _PipeConnection(response_read, command_write)
+        self.idle_tabs = []
+        self.render_count = 0
+        self.restart_reason = None
+        start = time.monotonic()
+        with metrics.span("browser_start"):
+            self.connection.send("Browser.getVersion", timeout=START_TIMEOUT_SECONDS)
+        logger.info(f"Started persistent browser. | pid: {self.process.pid} | seconds: {time.monotonic() - start:.1f}")
+
+    def _stop_browser(self):
+        if self.connection is not None:
+            if self.connection.alive:
+                try:
+                    self.connection.send("Browser.close", timeout=STOP_TIMEOUT_SECONDS)
+                except BrowserError:
+                    pass
+            self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            try:
+                self.process.wait(STOP_TIMEOUT_SECONDS)
+            except psutil.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            except psutil.NoSuchProcess:
+                pass
+            self.process = None
+        self.idle_tabs = []
+        self.restart_reason = None
+
+
+def start_browser_service(device_config):
+    """
+    Creates the persistent browser service if enabled in the device config, the browser starts on first use.
+    Should be called on application startup, after the render workers are forked.
+    """
+    global _BROWSER_SERVICE
+
+    if device_config.get_config("persistent_browser", default=True) and _BROWSER_SERVICE is None:
+        _BROWSER_SERVICE = BrowserService(device_config)
+    return _BROWSER_SERVICE
+
+
+def stop_browser_service():
+    """
+    Closes the persistent browser.
+    Should be called on application shutdown.
+    """
+    global _BROWSER_SERVICE
+
+    if _BROWSER_SERVICE is not None:
+        _BROWSER_SERVICE.stop()
+        _BROWSER_SERVICE = None
+
+
+def get_browser_service():
+    """Returns the persistent browser service, None if it is not running in this process."""
+    return _BROWSER_SERVICE
@@ -7,6 +7,7 @@ Benefits:
 - Reduced TCP handshake overhead
 - Automatic keep-alive handling
 - Consistent headers across all requests
+- Timeouts capped to the time left in the current refresh budget
 
 Usage:
     from utils.http_client import get_http_session
@@ -18,6 +19,7 @@ Usage:
 import requests
 import logging
 from typing import Optional
+from utils.refresh_budget import get_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,14 @@ logger = logging.getLogger(__name__)
 _HTTP_SESSION: Optional[requests.Session] = None
 
 
+class BudgetedSession(requests.Session):
+    """Session that caps request timeouts to the time left in the current refresh budget."""
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = get_timeout(kwargs.get("timeout"))
+        return super().request(method, url, **kwargs)
+
+
 def get_http_session() -> requests.Session:
     """
     Get the shared HTTP session instance.
@@ -37,7 +47,7 @@ def get_http_session() -> requests.Session:
 
     if _HTTP_SESSION is None:
         logger.debug("Initializing shared HTTP session with connection pooling")
-        _HTTP_SESSION = requests.Session()
+        _HTTP_SESSION = BudgetedSession()
 
         # Set common headers for all InkyPi requests
         _HTTP_SESSION.headers.update({
@@ -0,0 +1,177 @@
+"""
+In-Memory Image Cache for InkyPi
+
+Keeps recently used plugin images in memory, both decoded and as encoded file bytes, so showing an image that
+has not changed needs neither a disk read nor a PNG decode. Entries are keyed by file path and validated
+against the file's modification time, so an image replaced on disk is never served stale. The least recently
+used entries are evicted once the cache exceeds its byte budget, set with the `image_cache_mb` device config.
+
+Usage:
+    from utils.image_cache import get_image_cache
+
+    image = get_image_cache(device_config).get_image(path)
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from utils.image_utils import compute_image_hash, get_stored_image_hash, store_image_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MB = 32
+
+# Global cache instance (singleton)
+_IMAGE_CACHE = None
+
+
+class _CacheEntry:
+    def __init__(self, mtime_ns, image=None, encoded=None):
+        self.mtime_ns = mtime_ns
+        self.image = image
+        self.encoded = encoded
+        self.image_hash = None
+
+    def get_size(self):
+        size = 0
+        if self.image is not None:
+            size += self.image.width * self.image.height * len(self.image.getbands())
+        if self.encoded is not None:
+            size += len(self.encoded)
+        return size
+
+
+class ImageCache:
+    """LRU cache of decoded images and encoded file bytes, bounded by a byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get_image(self, path):
+        """Returns a copy of the decoded image at path, reading the file only if it is not cached.
+
+        The copy carries the frame hash, so it does not have to be hashed again.
+
+        Raises:
+            FileNotFoundError: If there is no file at path.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self.lock:
+            entry = self._get_entry(path, mtime_ns)
+            if entry is not None and entry.image is not None:
+                return self._copy_image(entry)
+
+        with Image.open(path) as image:
+            image.load()
+        entry = self._update(path, mtime_ns, image=image, image_hash=compute_image_hash(image))
+        return self._copy_image(entry)
+
+    def put_image(self, path, image):
+        """Caches an image that was just saved to path, so it does not have to be decoded again.
+
+        The image is stored as is, so it must not be modified in place afterwards. Readers get copies of it.
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        self._update(path, mtime_ns, image=image, image_hash=get_stored_image_hash(image))
+
+    def get_encoded(self, path):
+        """Returns the file bytes at path and their modification time in nanoseconds.
+
+        Raises:
+            FileNotFoundError: If there is no file at path.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self.lock:
+            entry = self._get_entry(path, mtime_ns)
+            if entry is not None and entry.encoded is not None:
+                return entry.encoded, mtime_ns
+
+        with open(path, "rb") as f:
+            encoded = f.read()
+        self._update(path, mtime_ns, encoded=encoded)
+        return encoded, mtime_ns
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _get_entry(self, path, mtime_ns):
+        """Returns the entry for path if it is still current, marking it as recently used."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        if entry.mtime_ns != mtime_ns:
+            self._remove(path)
+            return None
+        self.entries.move_to_end(path)
+        return entry
+
+    def _copy_image(self, entry):
+        image = entry.image.copy()
+        store_image_hash(image, entry.image_hash)
+        return image
+
+    def _update(self, path, mtime_ns, image=None, encoded=None, image_hash=None):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry.mtime_ns != mtime_ns:
+                if entry is not None:
+                    self._remove(path)
+                entry = _CacheEntry(mtime_ns)
+                self.entries[path] = entry
+            else:
+                self.size -= entry.get_size()
+
+            if image is not None:
+                entry.image = image
+                entry.image_hash = image_hash
+            if encoded is not None:
+                entry.encoded = encoded
+            self.size += entry.get_size()
+            self.entries.move_to_end(path)
+            self._evict()
+            return entry
+
+    def _remove(self, path):
+        entry = self.entries.pop(path)
+        self.size -= entry.get_size()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            path = next(iter(self.entries))
+            self._remove(path)
+            logger.debug(f"Evicted image from cache. | path: {path}")
+
+
+def get_image_cache(device_config=None) -> ImageCache:
+    """
+    Get the shared image cache instance.
+    Creates it on first call, and applies the configured byte budget when a device config is given.
+
+    Returns:
+        ImageCache: Shared image cache
+    """
+    global _IMAGE_CACHE
+
+    if _IMAGE_CACHE is None:
+        _IMAGE_CACHE = ImageCache(DEFAULT_CACHE_MB * 1024 * 1024)
+
+    if device_config is not None:
+        max_bytes = int(device_config.get_config("image_cache_mb", default=DEFAULT_CACHE_MB) * 1024 * 1024)
+        if max_bytes != _IMAGE_CACHE.max_bytes:
+            with _IMAGE_CACHE.lock:
+                _IMAGE_CACHE.max_bytes = max_bytes
+                _IMAGE_CACHE._evict()
+
+    return _IMAGE_CACHE
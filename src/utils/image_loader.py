@@ -9,10 +9,11 @@ and high-performance strategies on capable devices (Pi 3/4).
 from PIL import Image, ImageOps
 from io import BytesIO
 from utils.http_client import get_http_session
+from utils.scratch_space import get_scratch_space
 import logging
 import gc
 import psutil
-import tempfile
+import requests
 import os
 
 logger = logging.getLogger(__name__)
@@ -144,33 +145,29 @@ class AdaptiveImageLoader:
     # ========== LOW-RESOURCE IMPLEMENTATIONS ==========
 
     def _load_from_url_lowmem(self, url, dimensions, timeout_ms, resize, headers=None):
-        """Low-memory URL loading using temp file + draft mode."""
-        tmp_path = None
-
+        """Low-memory URL loading using a scratch file + draft mode."""
         try:
-            logger.debug("Using disk-based streaming (low-resource mode)")
+            logger.debug("Using file-based streaming (low-resource mode)")
 
             # Merge provided headers with defaults
             request_headers = {**self.DEFAULT_HEADERS, **(headers or {})}
 
-            # Create temp file and stream download
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-                tmp_path = tmp.name
-
-                session = get_http_session()
-                response = session.get(url, timeout=timeout_ms / 1000, stream=True, headers=request_headers)
-                response.raise_for_status()
+            session = get_http_session()
+            response = session.get(url, timeout=timeout_ms / 1000, stream=True, headers=request_headers)
+            response.raise_for_status()
 
-                downloaded_bytes = 0
+            # Stream download to a scratch file, kept in RAM while it fits the scratch quota
+            size_hint = int(response.headers.get("Content-Length") or 0)
+            with get_scratch_space().file(suffix='.jpg', size_hint=size_hint) as tmp:
                 for chunk in response.iter_content(chunk_size=8192):
                     if chunk:
                         tmp.write(chunk)
-                        downloaded_bytes += len(chunk)
+                tmp.close()
 
-                logger.debug(f"Downloaded {downloaded_bytes / 1024:.1f}KB to temp file")
+                logger.debug(f"Downloaded {tmp.size / 1024:.1f}KB to scratch file")
 
-            # Load from temp file with draft mode
-            return self._load_from_file_lowmem(tmp_path, dimensions, resize)
+                # Load from scratch file with draft mode
+                return self._load_from_file_lowmem(tmp.path, dimensions, resize)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Error downloading image from {url}: {e}")
@@ -178,14 +175,6 @@ class AdaptiveImageLoader:
         except Exception as e:
             logger.error(f"Error processing image from {url}: {e}")
             return None
-        finally:
-            # Clean up temp file
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.unlink(tmp_path)
-                    logger.debug(f"Cleaned up temp file: {tmp_path}")
-                except Exception as e:
-                    logger.warning(f"Could not delete temp file {tmp_path}: {e}")
 
     def _load_from_file_lowmem(self, path, dimensions, resize):
         """Low-memory file loading using draft mode."""
@@ -4,14 +4,20 @@ from io import BytesIO
 import os
 import logging
 import hashlib
-import tempfile
 import subprocess
-import shutil
+import weakref
+from utils.refresh_budget import get_timeout, track_process
+from utils.browser_service import CHROMIUM_FLAGS, find_chromium_binary, get_browser_service
+from utils.scratch_space import get_scratch_space
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# Hashes of frames that were already hashed, by frame id, kept only as long as the frame itself
+_frame_hashes = {}
+
 def get_image(image_url):
-    response = requests.get(image_url, timeout=30)
+    response = requests.get(image_url, timeout=get_timeout(30))
     img = None
     if 200 <= response.status_code < 300 or response.status_code == 304:
         img = Image.open(BytesIO(response.content))
@@ -19,21 +25,33 @@ def get_image(image_url):
         logger.error(f"Received non-200 response from {image_url}: status_code: {response.status_code}")
     return img
 
-def change_orientation(image, orientation, inverted=False):
-    if orientation == 'horizontal':
-        angle = 0
-    elif orientation == 'vertical':
-        angle = 90
+# Transposes for the supported rotations, lossless and without the resampling of Image.rotate
+_ROTATIONS = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270
+}
 
+def get_orientation_angle(orientation, inverted=False):
+    angle = 90 if orientation == 'vertical' else 0
     if inverted:
         angle = (angle + 180) % 360
+    return angle
 
-    return image.rotate(angle, expand=1)
+def rotate_image(image, angle):
+    """Rotates the image counter-clockwise by a multiple of 90 degrees, returning it unchanged for 0."""
+    angle = angle % 360
+    if angle == 0:
+        return image
+    return image.transpose(_ROTATIONS[angle])
 
-def resize_image(image, desired_size, image_settings=[]):
-    img_width, img_height = image.size
+def change_orientation(image, orientation, inverted=False):
+    return rotate_image(image, get_orientation_angle(orientation, inverted))
+
+def get_crop_box(image_size, desired_size, image_settings=[]):
+    """Returns the box of the image that matches the aspect ratio of the desired size."""
+    img_width, img_height = image_size
     desired_width, desired_height = desired_size
-    desired_width, desired_height = int(desired_width), int(desired_height)
 
     img_ratio = img_width / img_height
     desired_ratio = desired_width / desired_height
@@ -42,8 +60,6 @@ def resize_image(image, desired_size, image_settings=[]):
 
     x_offset, y_offset = 0,0
     new_width, new_height = img_width,img_height
-    # Step 1: Determine crop dimensions
-    desired_ratio = desired_width / desired_height
     if img_ratio > desired_ratio:
         # Image is wider than desired aspect ratio
         new_width = int(img_height * desired_ratio)
@@ -55,123 +71,214 @@ def resize_image(image, desired_size, image_settings=[]):
         if not keep_width:
             y_offset = (img_height - new_height) // 2
 
-    # Step 2: Crop the image
-    image = image.crop((x_offset, y_offset, x_offset + new_width, y_offset + new_height))
+    return (x_offset, y_offset, x_offset + new_width, y_offset + new_height)
 
-    # Step 3: Resize to the exact desired dimensions (if necessary)
-    return image.resize((desired_width, desired_height), Image.LANCZOS)
+def resize_image(image, desired_size, image_settings=[]):
+    desired_width, desired_height = desired_size
+    desired_size = (int(desired_width), int(desired_height))
+
+    # Nothing to crop or scale
+    if image.size == desired_size:
+        return image
+
+    # Crop and resize to the exact desired dimensions in a single resample
+    box = get_crop_box(image.size, desired_size, image_settings)
+    return image.resize(desired_size, Image.LANCZOS, box=box)
+
+def get_tone_lut(brightness=1.0, contrast=1.0, mean=128):
+    """
+    Builds a point table applying brightness and then contrast to a single band.
+
+    Matches ImageEnhance.Brightness followed by ImageEnhance.Contrast, where mean is the
+    grayscale mean of the image after the brightness change.
+    """
+    lut = []
+    for value in range(256):
+        value = min(255, max(0, int(value * brightness)))
+        value = min(255, max(0, int(mean + (value - mean) * contrast)))
+        lut.append(value)
+    return lut
+
+def _get_brightened_mean(img, brightness):
+    """
+    Returns the rounded grayscale mean the image would have after the brightness change.
+
+    Estimated from the grayscale histogram, so it can be off by a few levels where brightness clips.
+    """
+    histogram = img.convert("L").histogram() if img.mode != "L" else img.histogram()
+    total = sum(histogram)
+    if not total:
+        return 0
+    weighted = sum(min(255, int(value * brightness)) * count for value, count in enumerate(histogram))
+    return int(weighted / total + 0.5)
 
 def apply_image_enhancement(img, image_settings={}):
     # Convert image to RGB mode if necessary for enhancement operations
     # ImageEnhance requires RGB mode for operations like blend
     if img.mode not in ('RGB', 'L'):
         img = img.convert('RGB')
-        
 
-    # Apply Brightness
-    img = ImageEnhance.Brightness(img).enhance(image_settings.get("brightness", 1.0))
+    brightness = image_settings.get("brightness", 1.0)
+    contrast = image_settings.get("contrast", 1.0)
+    saturation = image_settings.get("saturation", 1.0)
+    sharpness = image_settings.get("sharpness", 1.0)
 
-    # Apply Contrast
-    img = ImageEnhance.Contrast(img).enhance(image_settings.get("contrast", 1.0))
+    # Apply Brightness and Contrast as one table lookup
+    if brightness != 1.0 or contrast != 1.0:
+        mean = _get_brightened_mean(img, brightness) if contrast != 1.0 else 0
+        img = img.point(get_tone_lut(brightness, contrast, mean) * len(img.getbands()))
 
-    # Apply Saturation (Color)
-    img = ImageEnhance.Color(img).enhance(image_settings.get("saturation", 1.0))
+    # Apply Saturation (Color), grayscale images have none
+    if saturation != 1.0 and img.mode == 'RGB':
+        img = ImageEnhance.Color(img).enhance(saturation)
 
     # Apply Sharpness
-    img = ImageEnhance.Sharpness(img).enhance(image_settings.get("sharpness", 1.0))
+    if sharpness != 1.0:
+        img = ImageEnhance.Sharpness(img).enhance(sharpness)
 
     return img
 
+def prepare_panel_image(image, resolution, orientation, inverted=False, image_settings=[], enhancements={}):
+    """
+    Turns a plugin image into the frame written to the panel in a single planned pass.
+
+    Orientation and inversion are lossless transposes, cropping and scaling are one resample that
+    is skipped when the size already matches, and enhancement steps at their identity value are
+    skipped. The input image is never modified.
+
+    Args:
+        image (PIL.Image): Image in the configured orientation.
+        resolution (tuple): Panel resolution as (width, height).
+        orientation (str): 'horizontal' or 'vertical'.
+        inverted (bool): Whether the panel is mounted upside down.
+        image_settings (list): Plugin image settings, e.g. 'keep-width'.
+        enhancements (dict): Brightness, contrast, saturation and sharpness factors.
+
+    Returns:
+        PIL.Image: The panel frame.
+    """
+    panel_image = rotate_image(image, get_orientation_angle(orientation))
+    panel_image = resize_image(panel_image, resolution, image_settings)
+    if inverted:
+        panel_image = rotate_image(panel_image, 180)
+    return apply_image_enhancement(panel_image, enhancements or {})
+
 def compute_image_hash(image):
-    """Compute SHA-256 hash of an image."""
-    image = image.convert("RGB")
-    img_bytes = image.tobytes()
-    return hashlib.sha256(img_bytes).hexdigest()
+    """Compute a fast hash of an image's pixels, mode and size, reusing the hash stored with the frame.
+
+    The pixel buffer is hashed in its native mode, without converting it to RGB first. Hashed frames become
+    copy-on-write, so modifying one in place gives it a new pixel buffer and it is hashed again.
+    """
+    image_hash = get_stored_image_hash(image)
+    if image_hash is not None:
+        return image_hash
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    if image.mode in ("P", "PA"):
+        digest.update(bytes(image.getpalette() or []))
+    digest.update(image.tobytes())
+    image_hash = digest.hexdigest()
+
+    store_image_hash(image, image_hash)
+    return image_hash
+
+def get_stored_image_hash(image):
+    """Returns the hash stored with the frame, or None if it was not hashed yet or was modified since."""
+    stored = _frame_hashes.get(id(image))
+    if stored is None or stored[0]() is not image:
+        return None
+    if stored[1] is not image.im:
+        # modified in place since it was hashed
+        _frame_hashes.pop(id(image), None)
+        return None
+    return stored[2]
+
+def store_image_hash(image, image_hash):
+    """Stores the hash with the frame, e.g. for an exact copy of an already hashed frame."""
+    if image_hash is not None:
+        key = id(image)
+        # Pillow copies the pixel buffer of a read-only image before modifying it in place, so a changed
+        # buffer shows the frame was modified
+        image.load()
+        image.readonly = 1
+        # images are unhashable, so entries are keyed by id and dropped when the image is freed
+        frame_ref = weakref.ref(image, lambda _, key=key: _frame_hashes.pop(key, None))
+        _frame_hashes[key] = (frame_ref, image.im, image_hash)
 
 def take_screenshot_html(html_str, dimensions, timeout_ms=None):
     image = None
     try:
-        # Create a temporary HTML file
-        with tempfile.NamedTemporaryFile(suffix=".html", delete=False) as html_file:
-            html_file.write(html_str.encode("utf-8"))
-            html_file_path = html_file.name
-
-        image = take_screenshot(html_file_path, dimensions, timeout_ms)
+        # Write the page to a scratch file, kept in RAM within the scratch quota
+        html_bytes = html_str.encode("utf-8")
+        with get_scratch_space().file(suffix=".html", size_hint=len(html_bytes)) as html_file:
+            html_file.write(html_bytes)
+            html_file.close()
 
-        # Remove html file
-        os.remove(html_file_path)
+            image = take_screenshot(html_file.path, dimensions, timeout_ms)
 
     except Exception as e:
         logger.error(f"Failed to take screenshot: {str(e)}")
 
     return image
 
-def _find_chromium_binary():
-    """Find the first available Chromium-based binary in system PATH."""
-    candidates = ["chromium-headless-shell", "chromium", "chrome"]
-    for candidate in candidates:
-        path = shutil.which(candidate)
-        if path:
-            logger.debug(f"Found browser binary: {candidate} at {path}")
-            return candidate
-    return None
-
-
 def take_screenshot(target, dimensions, timeout_ms=None):
+    # Use the persistent browser if it runs in this process, starting a browser only if it fails
+    browser_service = get_browser_service()
+    if browser_service is not None:
+        image = browser_service.screenshot(target, dimensions, timeout_ms)
+        if image is not None:
+            return image
+        logger.warning("Persistent browser failed, taking screenshot with a new browser process")
+
     image = None
     try:
         # Find available browser binary
-        browser = _find_chromium_binary()
+        browser = find_chromium_binary()
         if not browser:
             logger.error("No Chromium-based browser found. Install chromium, chromium-headless-shell, or chrome.")
             return None
 
-        # Create a temporary output file for the screenshot
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as img_file:
-            img_file_path = img_file.name
-
-        command = [
-            browser,
-            target,
-            "--headless",
-            f"--screenshot={img_file_path}",
-            f"--window-size={dimensions[0]},{dimensions[1]}",
-            "--disable-dev-shm-usage",
-            "--disable-gpu",
-            "--use-gl=swiftshader",
-            "--hide-scrollbars",
-            "--in-process-gpu",
-            "--js-flags=--jitless",
-            "--disable-zero-copy",
-            "--disable-gpu-memory-buffer-compositor-resources",
-            "--disable-extensions",
-            "--disable-plugins",
-            "--mute-audio",
-            "--renderer-process-limit=1",
-            "--no-zygote",
-            "--no-sandbox"
-        ]
-        if timeout_ms:
-            command.append(f"--timeout={timeout_ms}")
-        result = subprocess.run(command, capture_output=True, check=False)
-
-        # Check if the process failed or the output file is missing
-        if result.returncode != 0 or not os.path.exists(img_file_path):
-            logger.error(f"Failed to take screenshot (return code: {result.returncode})")
-            return None
-
-        # Load the image using PIL
-        with Image.open(img_file_path) as img:
-            image = img.copy()
-
-        # Remove image files
-        os.remove(img_file_path)
+        # The browser writes the screenshot to a scratch file, at most the size of the raw pixels
+        with get_scratch_space().path(suffix=".png", size_hint=dimensions[0] * dimensions[1] * 4) as img_file_path:
+            image = _run_screenshot_command(browser, target, dimensions, timeout_ms, img_file_path)
 
     except Exception as e:
         logger.error(f"Failed to take screenshot: {str(e)}")
 
     return image
 
+def _run_screenshot_command(browser, target, dimensions, timeout_ms, img_file_path):
+    command = [
+        browser,
+        target,
+        "--headless",
+        f"--screenshot={img_file_path}",
+        f"--window-size={dimensions[0]},{dimensions[1]}",
+        *CHROMIUM_FLAGS
+    ]
+    if timeout_ms:
+        command.append(f"--timeout={timeout_ms}")
+    with metrics.span("screenshot"), \
+            subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process, \
+            track_process(process.pid):
+        try:
+            process.communicate(timeout=get_timeout())
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            logger.error("Screenshot ran out of the refresh time budget, browser was killed")
+            return None
+
+    # Check if the process failed or the output file is missing, it is created empty beforehand
+    if process.returncode != 0 or not os.path.getsize(img_file_path):
+        logger.error(f"Failed to take screenshot (return code: {process.returncode})")
+        return None
+
+    # Load the image using PIL
+    with Image.open(img_file_path) as img:
+        return img.copy()
+
 def pad_image_blur(img: Image, dimensions: tuple[int, int]) -> Image:
     bkg = ImageOps.fit(img, dimensions)
     bkg = bkg.filter(ImageFilter.BoxBlur(8))
@@ -0,0 +1,150 @@
+"""
+Background Image Writer for InkyPi
+
+Writes the current image and its web preview on a background thread, so encoding and SD card writes stay
+off the display path. Only the latest image is kept: an image that is still waiting when a newer one is
+submitted is never written.
+
+Files are written to a temporary file next to the target and moved into place, so the web UI never reads a
+partly written image. The PNG compression level is set with the `current_image_compress_level` device config
+(0-9, default 1). The preview is a copy scaled down to at most `current_image_preview_width` pixels wide,
+stored as lossless WebP when Pillow supports it and as PNG otherwise.
+
+Usage:
+    from utils.image_writer import get_image_writer
+
+    get_image_writer().submit(image, device_config, on_written=callback)
+"""
+
+import contextvars
+import logging
+import os
+import tempfile
+import threading
+
+from PIL import Image, features
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESS_LEVEL = 1
+DEFAULT_PREVIEW_WIDTH = 800
+
+if features.check("webp"):
+    PREVIEW_FORMAT, PREVIEW_EXTENSION = "WEBP", ".webp"
+else:
+    PREVIEW_FORMAT, PREVIEW_EXTENSION = "PNG", ".png"
+
+# Global writer instance (singleton)
+_IMAGE_WRITER = None
+
+
+def get_preview_file(device_config):
+    """Returns the path of the web preview of the current image."""
+    base, _ = os.path.splitext(device_config.current_image_file)
+    return f"{base}_preview{PREVIEW_EXTENSION}"
+
+
+def write_atomic(image, path, image_format, **params):
+    """Writes the image to a temporary file in the target directory and moves it over path."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format=image_format, **params)
+        # mkstemp creates files only readable by the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ImageWriter:
+    """Writes the current image and its preview on a background thread, latest image wins."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+        self.thread = None
+
+    def submit(self, image, device_config, on_written=None):
+        """
+        Queues the image to be written as the current image, replacing an image that is still waiting.
+
+        Args:
+            image (PIL.Image): The image to write, it must not be modified afterwards.
+            device_config (Config): Device config with the target paths and write settings.
+            on_written (callable, optional): Called once the image and its preview are written.
+        """
+        with self.condition:
+            if self.pending is not None:
+                logger.debug("Replacing current image that was not written yet.")
+            # the image is written in the submitter's context, keeping its metric labels
+            self.pending = (image, device_config, on_written, contextvars.copy_context())
+            self.condition.notify_all()
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="image-writer", daemon=True)
+                self.thread.start()
+
+    def flush(self, timeout=None):
+        """Waits until the queued image is written. Returns False if it was not written within the timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending is None and not self.writing, timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                (image, device_config, on_written, context), self.pending = self.pending, None
+                self.writing = True
+
+            try:
+                context.run(self.write, image, device_config)
+                if on_written:
+                    on_written()
+            except Exception:
+                logger.exception("Failed to write current image")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write(self, image, device_config):
+        """Writes the image and its preview."""
+        compress_level = device_config.get_config("current_image_compress_level", default=DEFAULT_COMPRESS_LEVEL)
+        preview_width = device_config.get_config("current_image_preview_width", default=DEFAULT_PREVIEW_WIDTH)
+
+        logger.info(f"Saving image to {device_config.current_image_file}")
+        with metrics.span("save"):
+            write_atomic(image, device_config.current_image_file, "PNG", compress_level=compress_level)
+
+            preview = image
+            if preview_width and image.width > preview_width:
+                preview_height = max(1, round(image.height * preview_width / image.width))
+                preview = image.resize((preview_width, preview_height), Image.LANCZOS)
+            if PREVIEW_FORMAT == "WEBP":
+                write_atomic(preview, get_preview_file(device_config), PREVIEW_FORMAT, lossless=True, method=0)
+            else:
+                write_atomic(preview, get_preview_file(device_config), PREVIEW_FORMAT, compress_level=compress_level)
+
+
+def get_image_writer() -> ImageWriter:
+    """
+    Get the shared image writer instance.
+    Creates it on first call.
+
+    Returns:
+        ImageWriter: Shared image writer
+    """
+    global _IMAGE_WRITER
+
+    if _IMAGE_WRITER is None:
+        _IMAGE_WRITER = ImageWriter()
+
+    return _IMAGE_WRITER
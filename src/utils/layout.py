@@ -0,0 +1,599 @@
+"""
+Native Layout Engine for InkyPi
+
+Draws simple plugin layouts directly with Pillow instead of rendering an HTML template in Chromium. A layout
+is a tree of nodes: text with word wrapping, vertical columns, horizontal rows, bordered boxes, list markers
+and progress bars. Sizes are in pixels, plugins convert the viewport units of their style sheets themselves.
+
+The page follows `plugin.html`: the plugin style settings (background color or image, text color, margins
+and the frames of `FRAME_STYLES`) are applied, and the layout is drawn inside the body padding of 1.5vw.
+Rendering a page takes a few milliseconds and does not need the browser.
+
+Usage:
+    from utils.layout import Column, Text, render_layout
+
+    layout = Column([Text("Hello", 40, bold=True, align="center")], width=0.9, justify="center")
+    image = render_layout(dimensions, layout, settings)
+"""
+
+import logging
+from functools import lru_cache
+
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageOps
+
+from utils.app_utils import get_font
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FONT_FAMILY = "Jost"
+DEFAULT_MARGIN = 5
+DEFAULT_BACKGROUND_COLOR = "#ffffff"
+DEFAULT_TEXT_COLOR = "#000000"
+# Body padding and frame sizes of plugin.html and plugin.css, in percent of the viewport width
+BODY_PADDING_VW = 1.5
+FRAME_WIDTH_VW = 0.7
+CORNER_SIZE_VW = 10
+CORNER_END_WIDTH_VW = 0.5
+ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=64)
+def _get_font(font_family, font_size, bold):
+    return get_font(font_family, font_size, "bold" if bold else "normal")
+
+
+def _border_px(width):
+    """Border widths are drawn in whole pixels, like the browser does, but never thinner than one pixel."""
+    return max(1, int(width)) if width > 0 else 0
+
+
+def _get_sides(value):
+    """Returns (top, right, bottom, left) from a single value or a tuple of four."""
+    if isinstance(value, (tuple, list)):
+        return tuple(value)
+    return (value, value, value, value)
+
+
+class LayoutContext:
+    """The image a layout is drawn on and the color its text and lines are drawn in."""
+
+    def __init__(self, image, color):
+        self.image = image
+        self.draw = ImageDraw.Draw(image)
+        self.color = color
+
+
+class Node:
+    """
+    Base class of the layout nodes.
+
+    Nodes are measured for a given width and drawn into a box. Margins are outside of the measured size and
+    are applied by the parent. In a row, nodes with a `grow` factor share the width left by the other nodes.
+    """
+
+    def __init__(self, margin_top=0, margin_right=0, margin_bottom=0, margin_left=0, grow=0):
+        self.margin_top = margin_top
+        self.margin_right = margin_right
+        self.margin_bottom = margin_bottom
+        self.margin_left = margin_left
+        self.grow = grow
+
+    def measure(self, width):
+        """Returns the (width, height) of the node. A width of None measures it without wrapping."""
+        raise NotImplementedError("measure must be implemented by subclasses")
+
+    def get_baseline(self, width):
+        """Returns the offset of the node's first baseline from its top, used to align the nodes of a row."""
+        return self.measure(width)[1]
+
+    def draw(self, ctx, x, y, width, height):
+        """Draws the node into the box at (x, y) of the given size."""
+        raise NotImplementedError("draw must be implemented by subclasses")
+
+    def get_horizontal_margin(self):
+        return self.margin_left + self.margin_right
+
+    def get_vertical_margin(self):
+        return self.margin_top + self.margin_bottom
+
+
+class Text(Node):
+    """
+    Text in a single font size, wrapped at spaces to the available width.
+
+    A line height of None uses the font's own line spacing, like the CSS value `normal`, otherwise it is a
+    factor of the font size. Text that is not wrapped can be shortened with an ellipsis instead.
+    """
+
+    def __init__(self, text, font_size, bold=False, align="left", line_height=None, letter_spacing=0,
+                 wrap=True, ellipsis=False, font_family=DEFAULT_FONT_FAMILY, **kwargs):
+        super().__init__(**kwargs)
+        self.text = str(text)
+        self.font_size = font_size
+        self.bold = bold
+        self.align = align
+        self.line_height = line_height
+        self.letter_spacing = letter_spacing
+        self.wrap = wrap
+        self.ellipsis = ellipsis
+        self.font = _get_font(font_family, font_size, bold)
+        self.ascent, self.descent = self.font.getmetrics()
+        # width -> lines and size, the parents measure a node several times while placing it
+        self.lines = {}
+        self.sizes = {}
+
+    def get_line_height(self):
+        if self.line_height is None:
+            return self.ascent + self.descent
+        return self.font_size * self.line_height
+
+    def get_text_width(self, text):
+        return self.font.getlength(text) + self.letter_spacing * len(text)
+
+    def get_lines(self, width):
+        """Returns the lines the text is broken into for the width."""
+        if width not in self.lines:
+            self.lines[width] = self._break_lines(width)
+        return self.lines[width]
+
+    def _break_lines(self, width):
+        if width is None:
+            return [self.text]
+        if not self.wrap:
+            if self.ellipsis and self.get_text_width(self.text) > width:
+                return [self._shorten(width)]
+            return [self.text]
+
+        lines = []
+        for paragraph in self.text.split("\n"):
+            line = ""
+            for word in paragraph.split():
+                candidate = f"{line} {word}" if line else word
+                # a word wider than the line overflows it, as in the browser
+                if line and self.get_text_width(candidate) > width:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+            lines.append(line)
+        return lines
+
+    def _shorten(self, width):
+        """Returns the longest start of the text that fits the width with an ellipsis."""
+        low, high = 0, len(self.text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.get_text_width(self.text[:middle].rstrip() + ELLIPSIS) <= width:
+                low = middle
+            else:
+                high = middle - 1
+        return self.text[:low].rstrip() + ELLIPSIS
+
+    def measure(self, width):
+        if width not in self.sizes:
+            lines = self.get_lines(width)
+            text_width = max(self.get_text_width(line) for line in lines)
+            self.sizes[width] = (text_width if width is None else width, self.get_line_height() * len(lines))
+        return self.sizes[width]
+
+    def get_baseline(self, width):
+        # the glyphs are centered in the line box, as in the browser
+        return (self.get_line_height() - self.ascent - self.descent) / 2 + self.ascent
+
+    def draw(self, ctx, x, y, width, height):
+        line_height = self.get_line_height()
+        baseline = y + self.get_baseline(width)
+        for line in self.get_lines(width):
+            line_width = self.get_text_width(line)
+            if self.align == "center":
+                line_x = x + (width - line_width) / 2
+            elif self.align == "right":
+                line_x = x + width - line_width
+            else:
+                line_x = x
+
+            if self.letter_spacing:
+                for char in line:
+                    ctx.draw.text((line_x, baseline), char, font=self.font, fill=ctx.color, anchor="ls")
+                    line_x += self.font.getlength(char) + self.letter_spacing
+            else:
+                ctx.draw.text((line_x, baseline), line, font=self.font, fill=ctx.color, anchor="ls")
+            baseline += line_height
+
+
+class Column(Node):
+    """
+    Nodes stacked from top to bottom, each given the full width of the column.
+
+    The column takes the given fraction of the available width and is centered in it. With justify set to
+    "center" its content is centered vertically in the available height.
+    """
+
+    def __init__(self, children, width=None, justify="start", gap=0, **kwargs):
+        super().__init__(**kwargs)
+        self.children = children
+        self.width = width
+        self.justify = justify
+        self.gap = gap
+
+    def get_own_width(self, width):
+        if width is None or self.width is None:
+            return width
+        return width * self.width
+
+    def _measure_children(self, width):
+        sizes = []
+        for child in self.children:
+            child_width = None if width is None else width - child.get_horizontal_margin()
+            sizes.append(child.measure(child_width))
+        return sizes
+
+    def measure(self, width):
+        own_width = self.get_own_width(width)
+        sizes = self._measure_children(own_width)
+        height = sum(h + child.get_vertical_margin() for child, (_, h) in zip(self.children, sizes))
+        height += self.gap * max(0, len(self.children) - 1)
+        if own_width is None:
+            own_width = max((w + child.get_horizontal_margin() for child, (w, _) in zip(self.children, sizes)),
+                            default=0)
+        return own_width, height
+
+    def get_baseline(self, width):
+        if not self.children:
+            return 0
+        child = self.children[0]
+        own_width = self.get_own_width(width)
+        child_width = None if own_width is None else own_width - child.get_horizontal_margin()
+        return child.margin_top + child.get_baseline(child_width)
+
+    def draw(self, ctx, x, y, width, height):
+        own_width, content_height = self.measure(width)
+        x += (width - own_width) / 2
+        if self.justify == "center":
+            y += (height - content_height) / 2
+
+        for child in self.children:
+            child_width = own_width - child.get_horizontal_margin()
+            _, child_height = child.measure(child_width)
+            y += child.margin_top
+            child.draw(ctx, x + child.margin_left, y, child_width, child_height)
+            y += child_height + child.margin_bottom + self.gap
+
+
+class Row(Node):
+    """
+    Nodes placed from left to right, taking the full available width.
+
+    Nodes are as wide as their content, unless they have a grow factor, then they share the remaining width.
+    Justify places the nodes ("start", "center" or "space-between"), align places them vertically
+    ("baseline", "start", "center" or "stretch").
+    """
+
+    def __init__(self, children, justify="start", align="baseline", gap=0, **kwargs):
+        super().__init__(**kwargs)
+        self.children = children
+        self.justify = justify
+        self.align = align
+        self.gap = gap
+
+    def _layout(self, width):
+        """Returns the (x offset, width, height, baseline) of each child."""
+        widths = [child.measure(None)[0] if not child.grow else 0 for child in self.children]
+        used = sum(widths) + sum(child.get_horizontal_margin() for child in self.children)
+        used += self.gap * max(0, len(self.children) - 1)
+        total_grow = sum(child.grow for child in self.children)
+
+        free = 0 if width is None else width - used
+        if total_grow and free > 0:
+            widths = [w + free * child.grow / total_grow if child.grow else w
+                      for child, w in zip(self.children, widths)]
+            free = 0
+
+        gap = self.gap
+        offset = 0
+        if self.justify == "space-between" and len(self.children) > 1 and free > 0:
+            gap += free / (len(self.children) - 1)
+        elif self.justify == "center" and free > 0:
+            offset = free / 2
+
+        placements = []
+        for child, child_width in zip(self.children, widths):
+            offset += child.margin_left
+            child_height = child.measure(child_width)[1]
+            placements.append((offset, child_width, child_height, child.get_baseline(child_width)))
+            offset += child_width + child.margin_right + gap
+        return placements
+
+    def measure(self, width):
+        placements = self._layout(width)
+        if not placements:
+            return (width or 0, 0)
+        if width is None:
+            last_child, (offset, child_width, _, _) = self.children[-1], placements[-1]
+            width = offset + child_width + last_child.margin_right
+
+        if self.align == "baseline":
+            above = max(child.margin_top + b for child, (_, _, _, b) in zip(self.children, placements))
+            below = max(h - b + child.margin_bottom for child, (_, _, h, b) in zip(self.children, placements))
+            return width, above + below
+        return width, max(h + child.get_vertical_margin() for child, (_, _, h, _) in zip(self.children, placements))
+
+    def get_baseline(self, width):
+        placements = self._layout(width)
+        if not placements:
+            return 0
+        if self.align == "baseline":
+            return max(child.margin_top + b for child, (_, _, _, b) in zip(self.children, placements))
+        child, (_, _, _, baseline) = self.children[0], placements[0]
+        return child.margin_top + baseline
+
+    def draw(self, ctx, x, y, width, height):
+        placements = self._layout(width)
+        baseline = self.get_baseline(width)
+        for child, (offset, child_width, child_height, child_baseline) in zip(self.children, placements):
+            if self.align == "baseline":
+                child_y = y + baseline - child_baseline
+            elif self.align == "center":
+                child_y = y + (height - child_height - child.get_vertical_margin()) / 2 + child.margin_top
+            else:
+                child_y = y + child.margin_top
+            if self.align == "stretch":
+                child_height = height - child.get_vertical_margin()
+            child.draw(ctx, x + offset, child_y, child_width, child_height)
+
+
+class Box(Node):
+    """
+    A node with padding and a border around it, optionally of a fixed size.
+
+    Border and padding are a single width or (top, right, bottom, left). The border is drawn in the text
+    color, with rounded corners if a radius is given and all sides have the same width.
+    """
+
+    def __init__(self, child=None, width=None, height=None, border=0, padding=0, radius=0, **kwargs):
+        super().__init__(**kwargs)
+        self.child = child
+        self.width = width
+        self.height = height
+        self.border = tuple(_border_px(w) for w in _get_sides(border))
+        self.padding = _get_sides(padding)
+        self.radius = radius
+
+    def get_inset(self):
+        """Returns the total (horizontal, vertical) size of the border and padding."""
+        top, right, bottom, left = (b + p for b, p in zip(self.border, self.padding))
+        return left + right, top + bottom
+
+    def get_inner_width(self, width):
+        width = self.width if self.width is not None else width
+        if width is None:
+            return None
+        return width - self.get_inset()[0] - (self.child.get_horizontal_margin() if self.child else 0)
+
+    def measure(self, width):
+        inset_x, inset_y = self.get_inset()
+        inner_width = self.get_inner_width(width)
+        child_width, child_height = 0, 0
+        if self.child:
+            child_width, child_height = self.child.measure(inner_width)
+            child_width += self.child.get_horizontal_margin()
+            child_height += self.child.get_vertical_margin()
+
+        if self.width is not None:
+            width = self.width
+        elif width is None:
+            width = child_width + inset_x
+        height = self.height if self.height is not None else child_height + inset_y
+        return width, height
+
+    def get_baseline(self, width):
+        if not self.child:
+            return self.measure(width)[1]
+        return self.border[0] + self.padding[0] + self.child.margin_top + self.child.get_baseline(
+            self.get_inner_width(width))
+
+    def draw(self, ctx, x, y, width, height):
+        width, height = self.measure(width)
+        self._draw_border(ctx, x, y, width, height)
+        if self.child:
+            inset_x, inset_y = self.get_inset()
+            inner_width = self.get_inner_width(width)
+            inner_height = height - inset_y - self.child.get_vertical_margin()
+            self.child.draw(ctx, x + self.border[3] + self.padding[3] + self.child.margin_left,
+                            y + self.border[0] + self.padding[0] + self.child.margin_top,
+                            inner_width, inner_height)
+
+    def _draw_border(self, ctx, x, y, width, height):
+        top, right, bottom, left = self.border
+        if not any(self.border):
+            return
+        x0, y0, x1, y1 = round(x), round(y), round(x + width) - 1, round(y + height) - 1
+        if len(set(self.border)) == 1:
+            ctx.draw.rounded_rectangle((x0, y0, x1, y1), radius=self.radius, outline=ctx.color, width=top)
+            return
+        if top:
+            ctx.draw.rectangle((x0, y0, x1, y0 + top - 1), fill=ctx.color)
+        if bottom:
+            ctx.draw.rectangle((x0, y1 - bottom + 1, x1, y1), fill=ctx.color)
+        if left:
+            ctx.draw.rectangle((x0, y0, x0 + left - 1, y1), fill=ctx.color)
+        if right:
+            ctx.draw.rectangle((x1 - right + 1, y0, x1, y1), fill=ctx.color)
+
+
+class Marker(Node):
+    """A list bullet ("disc", "square" or "diamond") sized and aligned for text of the given font size."""
+
+    SIZE = 0.35
+    ADVANCE = 0.75
+
+    def __init__(self, shape, font_size, line_height=None, font_family=DEFAULT_FONT_FAMILY, **kwargs):
+        super().__init__(**kwargs)
+        self.shape = shape
+        # the marker takes the line box of the text it belongs to
+        self.text = Text("", font_size, line_height=line_height, font_family=font_family)
+
+    def measure(self, width):
+        return self.text.font_size * Marker.ADVANCE, self.text.get_line_height()
+
+    def get_baseline(self, width):
+        return self.text.get_baseline(width)
+
+    def draw(self, ctx, x, y, width, height):
+        size = self.text.font_size * Marker.SIZE
+        # centered on the lower case letters
+        center_y = y + self.get_baseline(width) - self.text.font_size * 0.25
+        box = (x, center_y - size / 2, x + size, center_y + size / 2)
+        if self.shape == "square":
+            ctx.draw.rectangle(box, fill=ctx.color)
+        elif self.shape == "diamond":
+            left, top, right, bottom = box
+            middle_x, middle_y = (left + right) / 2, (top + bottom) / 2
+            ctx.draw.polygon([(middle_x, top), (right, middle_y), (middle_x, bottom), (left, middle_y)],
+                             fill=ctx.color)
+        else:
+            ctx.draw.ellipse(box, fill=ctx.color)
+
+
+class ProgressBar(Node):
+    """
+    A bar with rounded corners, filled to the given percentage in the text color, the remainder dotted.
+
+    The dots are one pixel in radius, centered in cells of `dot_spacing` pixels starting at the end of the fill.
+    """
+
+    def __init__(self, percent, height, radius=5, dot_spacing=5, **kwargs):
+        super().__init__(**kwargs)
+        self.percent = max(0, min(100, percent))
+        self.height = height
+        self.radius = radius
+        self.dot_spacing = dot_spacing
+
+    def measure(self, width):
+        return width or 0, self.height
+
+    def draw(self, ctx, x, y, width, height):
+        left, top = round(x), round(y)
+        size = (max(1, round(x + width) - left), max(1, round(y + self.height) - top))
+
+        bar = Image.new("L", size, 0)
+        draw = ImageDraw.Draw(bar)
+        fill_width = size[0] * self.percent / 100
+        if fill_width > 0:
+            draw.rectangle((0, 0, fill_width - 1, size[1]), fill=255)
+
+        spacing = self.dot_spacing
+        dot_x = fill_width + spacing / 2
+        while dot_x < size[0]:
+            dot_y = spacing / 2
+            while dot_y < size[1]:
+                draw.ellipse((dot_x - 1, dot_y - 1, dot_x + 1, dot_y + 1), fill=255)
+                dot_y += spacing
+            dot_x += spacing
+
+        shape = Image.new("L", size, 0)
+        ImageDraw.Draw(shape).rounded_rectangle((0, 0, size[0] - 1, size[1] - 1), radius=self.radius, fill=255)
+        ctx.image.paste(ctx.color, (left, top, left + size[0], top + size[1]), ImageChops.multiply(bar, shape))
+
+
+def get_style(settings):
+    """Returns the text color, margins (top, right, bottom, left) and frame of the plugin style settings."""
+    color = _get_color(settings.get("textColor"), DEFAULT_TEXT_COLOR)
+    margin = settings.get("margin")
+    margins = tuple(_get_number(settings.get(f"{side}Margin") or margin, DEFAULT_MARGIN)
+                    for side in ("top", "right", "bottom", "left"))
+    return color, margins, settings.get("selectedFrame")
+
+
+def get_content_box(dimensions, settings):
+    """Returns the (x, y, width, height) box the layout is drawn in, inside the margins, frame and padding."""
+    width, height = dimensions
+    vw = width / 100
+    _, (top, right, bottom, left), frame = get_style(settings)
+
+    frame_width = _border_px(vw * FRAME_WIDTH_VW)
+    border_top = border_bottom = border_side = 0
+    if frame == "Rectangle":
+        border_top = border_bottom = border_side = frame_width
+    elif frame == "Top and Bottom":
+        border_top = border_bottom = frame_width
+
+    padding = vw * BODY_PADDING_VW
+    x = left + border_side + padding
+    y = top + border_top + padding
+    return (x, y,
+            width - x - right - border_side - padding,
+            height - y - bottom - border_bottom - padding)
+
+
+def render_layout(dimensions, layout, settings):
+    """
+    Draws the layout on a page with the plugin style settings applied.
+
+    Args:
+        dimensions (tuple): Image size as (width, height).
+        layout (Node): The root node, drawn into the content box of the page.
+        settings (dict): Plugin settings with the style settings.
+
+    Returns:
+        PIL.Image: The rendered image.
+    """
+    width, height = dimensions
+    color, margins, frame = get_style(settings)
+
+    background = DEFAULT_BACKGROUND_COLOR
+    if settings.get("backgroundOption") == "color":
+        background = _get_color(settings.get("backgroundColor"), DEFAULT_BACKGROUND_COLOR)
+    image = Image.new("RGB", (width, height), background)
+    if settings.get("backgroundOption") == "image" and settings.get("backgroundImageFile"):
+        _draw_background_image(image, settings["backgroundImageFile"])
+
+    ctx = LayoutContext(image, color)
+    _draw_frame(ctx, dimensions, margins, frame)
+    layout.draw(ctx, *get_content_box(dimensions, settings))
+    return image
+
+
+def _draw_background_image(image, path):
+    """Covers the image with the background image, centered and cropped to fit."""
+    try:
+        with Image.open(path) as background:
+            background = ImageOps.fit(background.convert("RGB"), image.size, Image.LANCZOS)
+        image.paste(background)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to load background image: {e}")
+
+
+def _draw_frame(ctx, dimensions, margins, frame):
+    width, height = dimensions
+    top, right, bottom, left = margins
+    vw = width / 100
+    x0, y0, x1, y1 = round(left), round(top), round(width - right) - 1, round(height - bottom) - 1
+    frame_width = _border_px(vw * FRAME_WIDTH_VW)
+
+    if frame == "Rectangle":
+        ctx.draw.rectangle((x0, y0, x1, y1), outline=ctx.color, width=frame_width)
+    elif frame == "Top and Bottom":
+        ctx.draw.rectangle((x0, y0, x1, y0 + frame_width - 1), fill=ctx.color)
+        ctx.draw.rectangle((x0, y1 - frame_width + 1, x1, y1), fill=ctx.color)
+    elif frame == "Corner":
+        size = round(vw * CORNER_SIZE_VW)
+        ctx.draw.rectangle((x0, y0, x0 + size - 1, y0 + frame_width - 1), fill=ctx.color)
+        ctx.draw.rectangle((x0, y0, x0 + frame_width - 1, y0 + size - 1), fill=ctx.color)
+        end_width = _border_px(vw * CORNER_END_WIDTH_VW)
+        ctx.draw.rectangle((x1 - size + 1, y1 - end_width + 1, x1, y1), fill=ctx.color)
+        ctx.draw.rectangle((x1 - end_width + 1, y1 - size + 1, x1, y1), fill=ctx.color)
+
+
+def _get_color(value, default):
+    try:
+        return ImageColor.getrgb(value or default)
+    except ValueError:
+        return ImageColor.getrgb(default)
+
+
+def _get_number(value, default):
+    try:
+        return float(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
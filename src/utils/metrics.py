@@ -0,0 +1,188 @@
+"""
+Refresh Stage Metrics for InkyPi
+
+Times the stages of a refresh as spans labelled with the plugin id and instance name. Finished spans are kept in
+a ring buffer of recent spans and aggregated into histograms and counters, which are exported in the Prometheus
+text format at /api/metrics.
+
+Stages:
+    generate    - the whole plugin `generate_image` call
+    fetch       - time in `generate_image` outside of template rendering, layouts and screenshots, mostly data fetching
+    template    - rendering the plugin's HTML template
+    screenshot  - taking the Chromium screenshot
+    layout      - drawing a plugin's native layout with Pillow
+    browser_start - starting the persistent browser
+    hash        - hashing the generated image
+    save        - writing images to disk
+    postprocess - resizing, orientation and enhancements before the panel write
+    display     - writing the image to the panel
+    panel_init  - initializing the panel controller, which is skipped while it is kept awake
+    panel_sleep - putting the panel controller to sleep
+
+Usage:
+    from utils import metrics
+
+    with metrics.labels(plugin_id="weather", instance="Home"):
+        with metrics.span("hash"):
+            image_hash = compute_image_hash(image)
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+# Number of recent spans kept in the ring buffer
+MAX_SPANS = 1000
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Span = namedtuple("Span", ["stage", "plugin_id", "instance", "duration", "end_time", "error"])
+
+_current_labels = contextvars.ContextVar("metric_labels", default={})
+_current_span = contextvars.ContextVar("metric_span", default=None)
+_span_captures = contextvars.ContextVar("metric_span_captures", default=None)
+
+_lock = threading.Lock()
+_spans = deque(maxlen=MAX_SPANS)
+# (stage, plugin_id, instance) -> [bucket counts, sum, count, errors]
+_histograms = {}
+
+
+class _ActiveSpan:
+    def __init__(self, stage):
+        self.stage = stage
+        self.child_seconds = 0
+
+
+@contextmanager
+def labels(plugin_id=None, instance=None):
+    """Labels the spans recorded in this context with the plugin id and instance name."""
+    current = dict(_current_labels.get())
+    if plugin_id is not None:
+        current["plugin_id"] = plugin_id
+    if instance is not None:
+        current["instance"] = instance
+    token = _current_labels.set(current)
+    try:
+        yield
+    finally:
+        _current_labels.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Times the code in this context as the given stage."""
+    parent = _current_span.get()
+    active = _ActiveSpan(stage)
+    token = _current_span.set(active)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield active
+    except BaseException:
+        error = True
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        if parent is not None:
+            parent.child_seconds += duration
+
+        current_labels = _current_labels.get()
+        plugin_id = current_labels.get("plugin_id", "")
+        instance = current_labels.get("instance", "")
+        record_span(Span(stage, plugin_id, instance, duration, time.time(), error))
+        if stage == "generate":
+            # whatever the plugin spent outside of rendering is attributed to fetching its data
+            fetch = max(0, duration - active.child_seconds)
+            record_span(Span("fetch", plugin_id, instance, fetch, time.time(), error))
+
+
+@contextmanager
+def capture_spans():
+    """Collects the spans recorded in this context, used to pass spans from render workers to the server."""
+    captured = []
+    token = _span_captures.set(captured)
+    try:
+        yield captured
+    finally:
+        _span_captures.reset(token)
+
+
+def record_span(span_record):
+    """Adds a finished span to the ring buffer and the aggregated metrics."""
+    captured = _span_captures.get()
+    if captured is not None:
+        captured.append(tuple(span_record))
+
+    with _lock:
+        _spans.append(span_record)
+        key = (span_record.stage, span_record.plugin_id, span_record.instance)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(HISTOGRAM_BUCKETS), 0.0, 0, 0]
+        bucket = bisect.bisect_left(HISTOGRAM_BUCKETS, span_record.duration)
+        if bucket < len(HISTOGRAM_BUCKETS):
+            histogram[0][bucket] += 1
+        histogram[1] += span_record.duration
+        histogram[2] += 1
+        if span_record.error:
+            histogram[3] += 1
+
+
+def record_spans(span_records):
+    """Records spans captured elsewhere with the current labels, counting them as child time of the current span."""
+    parent = _current_span.get()
+    current_labels = _current_labels.get()
+    for span_record in span_records:
+        span_record = Span(*span_record)._replace(
+            plugin_id=current_labels.get("plugin_id", ""),
+            instance=current_labels.get("instance", "")
+        )
+        if parent is not None and span_record.stage != "fetch":
+            parent.child_seconds += span_record.duration
+        record_span(span_record)
+
+
+def get_recent_spans(limit=None):
+    """Returns the most recent spans, newest last."""
+    with _lock:
+        spans = list(_spans)
+    return spans[-limit:] if limit else spans
+
+
+def export_prometheus():
+    """Returns the aggregated metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: (list(h[0]), h[1], h[2], h[3]) for key, h in _histograms.items()}
+
+    lines = [
+        "# HELP inkypi_stage_duration_seconds Duration of refresh stages.",
+        "# TYPE inkypi_stage_duration_seconds histogram",
+    ]
+    for (stage, plugin_id, instance), (buckets, total, count, _) in sorted(histograms.items()):
+        label_str = _format_labels(stage, plugin_id, instance)
+        cumulative = 0
+        for bound, bucket_count in zip(HISTOGRAM_BUCKETS, buckets):
+            cumulative += bucket_count
+            lines.append(f'inkypi_stage_duration_seconds_bucket{{{label_str},le="{bound}"}} {cumulative}')
+        lines.append(f'inkypi_stage_duration_seconds_bucket{{{label_str},le="+Inf"}} {count}')
+        lines.append(f"inkypi_stage_duration_seconds_sum{{{label_str}}} {total:.6f}")
+        lines.append(f"inkypi_stage_duration_seconds_count{{{label_str}}} {count}")
+
+    lines.append("# HELP inkypi_stage_errors_total Refresh stages that raised an error.")
+    lines.append("# TYPE inkypi_stage_errors_total counter")
+    for (stage, plugin_id, instance), (_, _, _, errors) in sorted(histograms.items()):
+        lines.append(f"inkypi_stage_errors_total{{{_format_labels(stage, plugin_id, instance)}}} {errors}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(stage, plugin_id, instance):
+    return f'stage="{_escape(stage)}",plugin_id="{_escape(plugin_id)}",instance="{_escape(instance)}"'
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,214 @@
+"""
+Refresh Time Budget for InkyPi
+
+Bounds the total time of a single refresh. The budget is split across the refresh stages, and the time that is
+left is available to plugins for their HTTP and browser timeouts. Stages run through `run_stage` are watched:
+once their time limit is reached, the processes the stage registered with `track_process` (e.g. a hung Chromium
+or the render worker it waits on) are killed with their children, and the stage is abandoned with a
+RefreshTimeoutError. Processes of other refreshes and long-lived ones such as the persistent browser are left
+running.
+
+Usage:
+    from utils.refresh_budget import get_timeout
+
+    response = requests.get(url, timeout=get_timeout(30))
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_TIMEOUT_SECONDS = 300
+# Smallest timeout handed out, so an exhausted budget fails fast instead of passing an invalid timeout
+MIN_TIMEOUT_SECONDS = 1
+
+_current_budget = contextvars.ContextVar("refresh_budget", default=None)
+# PIDs of the processes working for the watched stage running in the current context
+_stage_processes = contextvars.ContextVar("refresh_stage_processes", default=None)
+
+
+class RefreshTimeoutError(RuntimeError):
+    """Raised when a refresh stage does not finish within its time limit."""
+
+    def __init__(self, stage, time_limit):
+        super().__init__(f"Refresh stage '{stage}' did not finish within {time_limit:.0f} seconds")
+        self.stage = stage
+        self.time_limit = time_limit
+
+
+class RefreshBudget:
+    """
+    Time budget for a single refresh, split across its stages.
+
+    Each stage is given a share of the total budget. Time left over by earlier stages carries over to later
+    ones, while the shares of later stages stay reserved for them.
+
+    Attributes:
+        total_seconds: Total time allowed for the refresh
+        stage_durations: Measured duration in seconds of each finished stage
+        overruns: Names of the stages that exceeded their time limit
+    """
+
+    GENERATE = "generate"
+    PROCESS = "process"
+    DISPLAY = "display"
+
+    STAGE_SHARES = {
+        GENERATE: 0.7,
+        PROCESS: 0.05,
+        DISPLAY: 0.25,
+    }
+
+    def __init__(self, total_seconds=DEFAULT_REFRESH_TIMEOUT_SECONDS):
+        self.total_seconds = total_seconds
+        self.deadline = time.monotonic() + total_seconds
+        self.stage_durations = {}
+        self.overruns = []
+
+    @classmethod
+    def from_config(cls, device_config):
+        """Creates a budget using the `refresh_timeout_seconds` device config."""
+        return cls(device_config.get_config("refresh_timeout_seconds", default=DEFAULT_REFRESH_TIMEOUT_SECONDS))
+
+    def remaining(self):
+        """Returns the number of seconds left in the budget."""
+        return max(0, self.deadline - time.monotonic())
+
+    def stage_time_limit(self, stage):
+        """Returns the time a stage may take, keeping the shares of the stages after it reserved."""
+        stages = list(self.STAGE_SHARES)
+        later_stages = stages[stages.index(stage) + 1:] if stage in stages else []
+        reserved = sum(self.STAGE_SHARES[s] for s in later_stages) * self.total_seconds
+        return max(0, self.remaining() - reserved)
+
+    def get_timeout(self, default=None):
+        """Returns the default timeout capped to the time left, or the time left if there is no default."""
+        remaining = max(MIN_TIMEOUT_SECONDS, self.remaining())
+        if default is None:
+            return remaining
+        if isinstance(default, tuple):
+            return tuple(min(t, remaining) if t is not None else remaining for t in default)
+        return min(default, remaining)
+
+    @contextmanager
+    def stage(self, stage):
+        """Times a stage and makes the budget available to the code running in it."""
+        token = _current_budget.set(self)
+        time_limit = self.stage_time_limit(stage)
+        start = time.monotonic()
+        try:
+            yield self
+        finally:
+            _current_budget.reset(token)
+            duration = time.monotonic() - start
+            self.stage_durations[stage] = duration
+            if duration > time_limit and stage not in self.overruns:
+                self.overruns.append(stage)
+                logger.warning(f"Refresh stage overran its time limit. | stage: {stage} | duration: {duration:.1f}s | time_limit: {time_limit:.1f}s")
+
+    def run_stage(self, stage, fn, *args, **kwargs):
+        """
+        Runs fn as the given stage on a watched thread and returns its result.
+
+        If the stage does not finish within its time limit, the processes it registered with `track_process` are
+        killed and the stage is abandoned. The thread itself cannot be stopped and finishes in the background, its result
+        is discarded.
+
+        Raises:
+            RefreshTimeoutError: If the stage did not finish within its time limit.
+        """
+        time_limit = self.stage_time_limit(stage)
+        processes = set()
+        result = {}
+
+        def target():
+            try:
+                with self.stage(stage):
+                    result["value"] = fn(*args, **kwargs)
+            except BaseException as e:
+                result["error"] = e
+
+        context = contextvars.copy_context()
+        context.run(_stage_processes.set, processes)
+        thread = threading.Thread(target=context.run, args=(target,), name=f"refresh-{stage}", daemon=True)
+        thread.start()
+        thread.join(time_limit)
+
+        if thread.is_alive():
+            if stage not in self.overruns:
+                self.overruns.append(stage)
+            killed = _kill_processes(set(processes))
+            logger.error(f"Abandoning refresh stage after its time limit. | stage: {stage} | time_limit: {time_limit:.1f}s | killed_processes: {killed}")
+            raise RefreshTimeoutError(stage, time_limit)
+
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+    def summary(self):
+        """Returns the stage durations and overruns as a loggable string."""
+        durations = ", ".join(f"{stage}: {duration:.1f}s" for stage, duration in self.stage_durations.items())
+        return f"stages: {{{durations}}} | overruns: {self.overruns}"
+
+
+def get_current_budget():
+    """Returns the budget of the refresh running in the current context, or None."""
+    return _current_budget.get()
+
+
+def get_timeout(default=None):
+    """
+    Returns a timeout in seconds for a blocking call made during a refresh.
+
+    Inside a refresh the default is capped to the time left in its budget. Outside of a refresh the default
+    is returned unchanged.
+    """
+    budget = _current_budget.get()
+    if budget is None:
+        return default
+    return budget.get_timeout(default)
+
+
+@contextmanager
+def track_process(pid):
+    """
+    Registers a process working for the current refresh stage while the context runs, so the stage's watchdog
+    kills it, and its children, if the stage runs out of time. Does nothing outside of a watched stage.
+    """
+    processes = _stage_processes.get()
+    if processes is None:
+        yield
+        return
+    processes.add(pid)
+    try:
+        yield
+    finally:
+        # the pid may be reused once the process has exited
+        processes.discard(pid)
+
+
+def _kill_processes(pids):
+    """Kills the processes and their children, returns their names."""
+    targets = []
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            targets += [process] + process.children(recursive=True)
+        except psutil.Error:
+            pass
+
+    killed = []
+    for process in targets:
+        try:
+            name = process.name()
+            process.kill()
+            killed.append(f"{name}({process.pid})")
+        except psutil.Error:
+            pass
+    return killed
@@ -0,0 +1,207 @@
+"""
+Render Cache for InkyPi
+
+Stores plugin screenshots on disk, addressed by a hash of the rendered HTML, the contents of the local files
+it references (style sheets, fonts, images and the files those style sheets reference) and the dimensions. A
+page that renders to the same HTML as before is loaded from the cache without starting the browser.
+
+Pages referencing remote resources are never cached, as their content can change without the HTML changing.
+The least recently used screenshots are removed once the cache exceeds `render_cache_mb` (default 64) of disk.
+Cache files are written atomically, so render worker processes can share the cache directory.
+
+Usage:
+    from utils.render_cache import get_render_cache
+
+    render_cache = get_render_cache()
+    key = render_cache.get_key(html, dimensions)
+    image = render_cache.get(key)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from PIL import Image
+
+from utils.app_utils import resolve_path
+from utils.image_writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MB = 64
+CACHE_DIR = resolve_path(os.path.join("static", "images", "render_cache"))
+
+# Files referenced by src and href attributes and by CSS url() values
+_REFERENCE_PATTERN = re.compile(r"""(?:src|href)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+?)["']?\s*\)""")
+_REMOTE_PREFIXES = ("http://", "https://", "//")
+
+# Global cache instance (singleton)
+_RENDER_CACHE = None
+
+
+class RenderCache:
+    """Disk cache of screenshots keyed by the content they were rendered from, evicting the least recently used."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # (path, mtime_ns, size) -> digest of the file contents
+        self.file_digests = {}
+
+    def get_key(self, html, dimensions):
+        """
+        Returns the cache key of a page, or None if the page must not be cached.
+
+        Args:
+            html (str): The rendered HTML.
+            dimensions (tuple): Screenshot size as (width, height).
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(html.encode("utf-8"))
+        digest.update(f"{int(dimensions[0])}x{int(dimensions[1])}".encode())
+
+        references = self._get_references(html)
+        if references is None:
+            return None
+
+        seen = set()
+        while references:
+            path = references.pop(0)
+            if path in seen:
+                continue
+            seen.add(path)
+            file_digest, content = self._get_file_digest(path)
+            digest.update(path.encode())
+            digest.update(file_digest)
+            if path.endswith(".css") and content is not None:
+                css_references = self._get_references(content.decode("utf-8", errors="replace"), os.path.dirname(path))
+                if css_references is None:
+                    return None
+                references.extend(css_references)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached screenshot for the key, None if there is none."""
+        if key is None:
+            return None
+        path = self._get_path(key)
+        try:
+            with Image.open(path) as img:
+                image = img.copy()
+            # the modification time orders the entries for eviction
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            return None
+        logger.debug(f"Render cache hit. | key: {key}")
+        return image
+
+    def put(self, key, image):
+        """Stores the screenshot for the key and evicts the least recently used entries above the size limit."""
+        if key is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_atomic(image, self._get_path(key), "PNG", compress_level=1)
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Failed to store screenshot in render cache: {e}")
+
+    def clear(self):
+        with self.lock:
+            for entry in self._list_entries():
+                try:
+                    os.remove(entry[2])
+                except OSError:
+                    pass
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _get_references(self, text, base_dir=None):
+        """Returns the local files referenced in the text, None if it references remote resources."""
+        references = []
+        for match in _REFERENCE_PATTERN.finditer(text):
+            reference = (match.group(1) or match.group(2)).strip()
+            if reference.startswith(_REMOTE_PREFIXES):
+                return None
+            if reference.startswith("file://"):
+                reference = reference[len("file://"):]
+            if not os.path.isabs(reference):
+                if base_dir is None or reference.startswith(("data:", "#")):
+                    continue
+                reference = os.path.normpath(os.path.join(base_dir, reference))
+            references.append(reference)
+        return references
+
+    def _get_file_digest(self, path):
+        """Returns the digest of a file and, for style sheets, its contents. Digests are reused while the file is unchanged."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return b"missing", None
+
+        file_key = (path, stat.st_mtime_ns, stat.st_size)
+        is_css = path.endswith(".css")
+        with self.lock:
+            file_digest = self.file_digests.get(file_key)
+        if file_digest is not None and not is_css:
+            return file_digest, None
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return b"missing", None
+        file_digest = hashlib.blake2b(content, digest_size=16).digest()
+        with self.lock:
+            self.file_digests[file_key] = file_digest
+        return file_digest, content if is_css else None
+
+    def _list_entries(self):
+        """Returns the cache files as (mtime, size, path), oldest first."""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return sorted(entries)
+
+    def _evict(self):
+        with self.lock:
+            entries = self._list_entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.debug(f"Evicted screenshot from render cache. | path: {path}")
+                except OSError:
+                    pass
+
+
+def get_render_cache(device_config=None) -> RenderCache:
+    """
+    Get the shared render cache instance.
+    Creates it on first call, and applies the configured size limit when a device config is given.
+
+    Returns:
+        RenderCache: Shared render cache
+    """
+    global _RENDER_CACHE
+
+    if _RENDER_CACHE is None:
+        _RENDER_CACHE = RenderCache(CACHE_DIR, DEFAULT_CACHE_MB * 1024 * 1024)
+
+    if device_config is not None:
+        _RENDER_CACHE.max_bytes = int(device_config.get_config("render_cache_mb", default=DEFAULT_CACHE_MB) * 1024 * 1024)
+
+    return _RENDER_CACHE
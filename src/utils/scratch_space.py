@@ -0,0 +1,243 @@
+"""
+Scratch Space for InkyPi
+
+Provides the temporary files of renders and downloads, such as the HTML page and screenshot of a render or
+a streamed image download. Scratch files are kept in RAM on /dev/shm, which saves SD card writes and wear,
+as long as all scratch files together stay within `scratch_quota_mb` (default 32) of the device config.
+Files that would exceed the quota, or that grow beyond it while being written, are kept in the system
+temporary directory instead.
+
+Files count towards the quota with their allocated size, and with the bytes reserved for them: the size hint
+when they are created, and the bytes written to them, which may still be buffered.
+
+Scratch files are named after the process that created them. Files left behind by processes that are no
+longer running, such as after a crash, are removed at startup.
+
+Usage:
+    from utils.scratch_space import get_scratch_space
+
+    with get_scratch_space().file(suffix=".html", size_hint=len(data)) as scratch_file:
+        scratch_file.write(data)
+        scratch_file.close()
+        load(scratch_file.path)
+"""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUOTA_MB = 32
+RAM_ROOT = "/dev/shm"
+DIR_NAME = "inkypi-scratch"
+FILE_PREFIX = "scratch_"
+
+_OWNER_PATTERN = re.compile(rf"^{FILE_PREFIX}(\d+)_")
+
+# Global scratch space instance (singleton)
+_SCRATCH_SPACE = None
+
+
+class ScratchFile:
+    """A writable scratch file that moves from RAM to disk once its writes would exceed the quota."""
+
+    def __init__(self, scratch_space, path, in_ram):
+        self.scratch_space = scratch_space
+        self.path = path
+        self.in_ram = in_ram
+        self.size = 0
+        self.file = open(path, "wb")
+
+    def write(self, data):
+        if self.in_ram and not self.scratch_space.reserve(self.path, self.size + len(data)):
+            self._move_to_disk()
+        self.file.write(data)
+        self.size += len(data)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        self.scratch_space.remove(self.path)
+
+    def _move_to_disk(self):
+        self.file.close()
+        disk_path = self.scratch_space.create_path(os.path.splitext(self.path)[1], in_ram=False)
+        shutil.copyfile(self.path, disk_path)
+        self.scratch_space.remove(self.path)
+        logger.debug(f"Scratch file exceeded the RAM quota, moved to disk. | path: {disk_path}")
+        self.path = disk_path
+        self.in_ram = False
+        self.file = open(disk_path, "ab")
+
+
+class ScratchSpace:
+    """Creates scratch files in RAM within a quota, and on disk beyond it."""
+
+    def __init__(self, ram_root, disk_root, quota_bytes):
+        self.ram_dir = os.path.join(ram_root, DIR_NAME) if ram_root else None
+        self.disk_dir = os.path.join(disk_root, DIR_NAME)
+        self.quota_bytes = quota_bytes
+        # bytes reserved by this process for its scratch files in RAM, by path
+        self.reservations = {}
+        self.lock = threading.RLock()
+
+    def is_ram_available(self):
+        if self.ram_dir is None:
+            return False
+        try:
+            os.makedirs(self.ram_dir, exist_ok=True)
+        except OSError:
+            return False
+        return os.access(self.ram_dir, os.W_OK)
+
+    def get_ram_usage(self):
+        """Returns the bytes allocated for the scratch files in RAM of all processes, or reserved by this process."""
+        if not self.ram_dir:
+            return 0
+        with self.lock:
+            files = _list_files(self.ram_dir)
+            return sum(max(size, self.reservations.get(path, 0)) for path, size in files)
+
+    def get_ram_available(self):
+        """Returns the bytes left for scratch files in RAM, within the quota and the free space of the RAM disk."""
+        if not self.is_ram_available():
+            return 0
+        try:
+            free = shutil.disk_usage(self.ram_dir).free
+        except OSError:
+            return 0
+        return max(0, min(self.quota_bytes - self.get_ram_usage(), free))
+
+    def create_path(self, suffix="", size_hint=0, in_ram=None):
+        """
+        Creates an empty scratch file and returns its path, the caller has to remove it.
+
+        Args:
+            suffix (str): File name suffix, such as ".png".
+            size_hint (int): Expected size of the file, it is created on disk if it would not fit the quota.
+            in_ram (bool, optional): Creates the file in RAM or on disk, instead of deciding by the quota.
+        """
+        with self.lock:
+            if in_ram is None:
+                in_ram = self.get_ram_available() > size_hint
+            directory = self.ram_dir if in_ram else self.disk_dir
+            os.makedirs(directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=directory, prefix=f"{FILE_PREFIX}{os.getpid()}_", suffix=suffix)
+            if in_ram:
+                self.reservations[path] = size_hint
+        os.close(fd)
+        return path
+
+    def reserve(self, path, size):
+        """
+        Reserves RAM for a scratch file to grow to the given size, returns False if it does not fit the quota.
+        Reservations grow ahead of the size, so a file written in chunks does not check the quota for each one.
+        """
+        with self.lock:
+            reserved = self.reservations.get(path, 0)
+            if size <= reserved:
+                return True
+            available = self.get_ram_available()
+            for reservation in (max(size, 2 * reserved), size):
+                if reservation - reserved <= available:
+                    self.reservations[path] = reservation
+                    return True
+            return False
+
+    def file(self, suffix="", size_hint=0):
+        """Returns a new writable scratch file, removed when used as a context manager exits."""
+        path = self.create_path(suffix, size_hint)
+        return ScratchFile(self, path, os.path.dirname(path) == self.ram_dir)
+
+    @contextmanager
+    def path(self, suffix="", size_hint=0):
+        """Yields the path of a new scratch file for another program to write, removed when the context exits."""
+        path = self.create_path(suffix, size_hint)
+        try:
+            yield path
+        finally:
+            self.remove(path)
+
+    def remove(self, path):
+        with self.lock:
+            self.reservations.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete scratch file {path}: {e}")
+
+    def cleanup_orphans(self):
+        """Removes the scratch files of processes that are no longer running, and of this process, at startup."""
+        removed = 0
+        for directory in (self.ram_dir, self.disk_dir):
+            for path, _ in _list_files(directory):
+                match = _OWNER_PATTERN.match(os.path.basename(path))
+                pid = int(match.group(1)) if match else None
+                if pid is not None and pid != os.getpid() and _is_running(pid):
+                    continue
+                self.remove(path)
+                removed += 1
+        if removed:
+            logger.info(f"Removed orphaned scratch files. | count: {removed}")
+
+
+def _list_files(directory):
+    """Returns the (path, allocated size) of the files in the directory."""
+    files = []
+    if directory is None:
+        return files
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        files.append((entry.path, entry.stat().st_blocks * 512))
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_scratch_space(device_config=None) -> ScratchSpace:
+    """
+    Get the shared scratch space instance.
+    Creates it on first call, and applies the configured quota when a device config is given.
+
+    Returns:
+        ScratchSpace: Shared scratch space
+    """
+    global _SCRATCH_SPACE
+
+    if _SCRATCH_SPACE is None:
+        ram_root = RAM_ROOT if os.path.isdir(RAM_ROOT) else None
+        _SCRATCH_SPACE = ScratchSpace(ram_root, tempfile.gettempdir(), DEFAULT_QUOTA_MB * 1024 * 1024)
+
+    if device_config is not None:
+        quota_mb = device_config.get_config("scratch_quota_mb", default=DEFAULT_QUOTA_MB)
+        _SCRATCH_SPACE.quota_bytes = int(quota_mb * 1024 * 1024)
+
+    return _SCRATCH_SPACE
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# the app modules import each other from the src directory, as when the app runs
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+class FakeDeviceConfig:
+    """Stands in for Config with a config dict in memory, keeping the image files in a temporary directory."""
+
+    def __init__(self, base_dir, resolution=(800, 480), plugins=(), playlist_manager=None, refresh_info=None, **config):
+        self.config = dict(config)
+        if resolution is not None:
+            self.config["resolution"] = list(resolution)
+        self.plugins_list = [{"id": plugin_id} for plugin_id in plugins]
+        self.playlist_manager = playlist_manager
+        self.refresh_info = refresh_info
+        self.current_image_file = os.path.join(base_dir, "current_image.png")
+        self.plugin_image_dir = base_dir
+        # the config as it was last written to disk
+        self.written = {}
+
+    def write_config(self):
+        self.written = dict(self.config)
+
+    def get_config(self, key=None, default={}):
+        if key is not None:
+            return self.config.get(key, default)
+        return self.config
+
+    def get_plugin(self, plugin_id):
+        return next((plugin for plugin in self.plugins_list if plugin["id"] == plugin_id), None)
+
+    def get_resolution(self):
+        width, height = self.config["resolution"]
+        return (int(width), int(height))
+
+    def update_value(self, key, value, write=False):
+        self.config[key] = value
+        if write:
+            self.write_config()
+
+    def get_playlist_manager(self):
+        return self.playlist_manager
+
+    def get_refresh_info(self):
+        return self.refresh_info
+
+
+@pytest.fixture
+def make_device_config(tmp_path):
+    """Returns a factory of fake device configs, taking the resolution, None if it is not set yet, and config values."""
+    def make(resolution=(800, 480), **config):
+        return FakeDeviceConfig(str(tmp_path), resolution, **config)
+    return make
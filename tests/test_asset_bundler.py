@@ -0,0 +1,67 @@
+import base64
+import io
+import os
+
+import pytest
+from PIL import ImageFont
+
+from utils import asset_bundler
+from utils.asset_bundler import AssetBundler
+
+PAGE = """<html><head><style>{style}</style></head>
+<body><div class="text" style="font-family: Jost">Tschüss &amp; bye</div></body></html>"""
+
+
+def get_font_urls(font_faces):
+    return [rule.split("src: url(", 1)[1].split(")", 1)[0] for rule in font_faces.splitlines()]
+
+
+def test_style_sheet_inlined_with_absolute_urls(tmp_path):
+    css = tmp_path / "plugin.css"
+    css.write_text('.a { background: url("images/bg.png"); } .b { background: url(data:image/png;base64,AA==); }')
+    bundler = AssetBundler()
+
+    style_sheet = bundler.get_style_sheet([str(css)])
+    assert f'url("{tmp_path / "images" / "bg.png"}")' in style_sheet
+    assert "url(data:image/png;base64,AA==)" in style_sheet
+
+    # read again only after the file changed
+    css.write_text(".a { color: red; }")
+    os.utime(css, ns=(1, 1))
+    assert bundler.get_style_sheet([str(css)]) == ".a { color: red; }"
+
+
+def test_only_used_families_are_added():
+    bundler = AssetBundler()
+    html = bundler.add_font_faces(PAGE.format(style=""))
+
+    assert html.count("@font-face") == 2
+    assert 'font-family: "Jost"' in html
+    assert "Dogica" not in html
+    assert html.index("@font-face") < html.index("</head>")
+
+    assert bundler.add_font_faces("<p>plain</p>", ".a { font-family: sans-serif; }") == "<p>plain</p>"
+
+
+def test_pages_with_scripts_use_full_fonts(monkeypatch):
+    monkeypatch.setattr(asset_bundler, "FONT_SUBSETTING_AVAILABLE", True)
+    page = PAGE.format(style="") + "<script>document.body.append('more')</script>"
+
+    for url in get_font_urls(AssetBundler().get_font_faces(page)):
+        assert url.endswith(".ttf")
+
+
+def test_fonts_subset_to_page_text():
+    pytest.importorskip("fontTools")
+    bundler = AssetBundler()
+    page = PAGE.format(style=".text { text-transform: uppercase; }")
+
+    urls = get_font_urls(bundler.get_font_faces(page))
+    assert all(url.startswith("data:font/ttf;base64,") for url in urls)
+    # subsets are cached by font and characters
+    assert get_font_urls(bundler.get_font_faces(page)) == urls
+    assert len(bundler.subsets) == 2
+
+    font = ImageFont.truetype(io.BytesIO(base64.b64decode(urls[0].split(",", 1)[1])), 20)
+    assert font.getmask("TSCHÜSS").getbbox() is not None
+    assert font.getmask("Q").getbbox() is None
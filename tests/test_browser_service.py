@@ -0,0 +1,32 @@
+import os
+
+from utils import browser_service
+from utils.browser_service import _PipeConnection
+
+
+def test_forked_children_do_not_inherit_the_service(monkeypatch, make_device_config):
+    monkeypatch.setattr(browser_service, "_BROWSER_SERVICE", None)
+    service = browser_service.start_browser_service(make_device_config())
+    assert browser_service.get_browser_service() is service
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if browser_service.get_browser_service() is None else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert browser_service.get_browser_service() is service
+
+
+def test_discarded_event_waiters_are_removed():
+    read_fd, write_fd = os.pipe()
+    connection = _PipeConnection(read_fd, write_fd)
+    try:
+        first = connection.expect_event("S1", "Page.loadEventFired")
+        second = connection.expect_event("S1", "Page.loadEventFired")
+
+        connection.discard_event("S1", "Page.loadEventFired", first)
+        assert connection.event_waiters == {("S1", "Page.loadEventFired"): [second]}
+        connection.discard_event("S1", "Page.loadEventFired", second)
+        assert connection.event_waiters == {}
+    finally:
+        connection.close()
@@ -0,0 +1,147 @@
+import threading
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from display.display_manager import MAX_REGIONS, REGION_MERGE_GAP, DisplayManager, get_changed_regions
+from display.mock_display import MockDisplay
+from utils.image_utils import compute_image_hash
+from utils.image_writer import get_image_writer
+
+
+@pytest.fixture
+def device_config(make_device_config, tmp_path):
+    return make_device_config((40, 30), display_type="mock", output_dir=str(tmp_path / "mock"), orientation="horizontal")
+
+
+class BlockingDisplay(MockDisplay):
+    """Records the color of each frame it shows, each update waits until it is released."""
+
+    def __init__(self, device_config):
+        super().__init__(device_config)
+        self.started = threading.Semaphore(0)
+        self.release = threading.Semaphore(0)
+        self.shown = []
+
+    def display_image(self, image, image_settings=[]):
+        self.started.release()
+        self.release.acquire()
+        self.shown.append(image.getpixel((0, 0)))
+
+
+@pytest.fixture
+def blocking_manager(device_config):
+    display_manager = DisplayManager(device_config)
+    display_manager.display = BlockingDisplay(display_manager.device_config)
+    display_manager.start()
+    yield display_manager
+    display_manager.display.release.release(10)
+    display_manager.stop()
+
+
+def test_waiting_frame_is_replaced_by_a_newer_frame(blocking_manager):
+    first, second, third = (Image.new("RGB", (40, 30), color) for color in ("red", "green", "blue"))
+    display = blocking_manager.display
+
+    first_future = blocking_manager.submit_image(first)
+    assert display.started.acquire(timeout=5)
+    # the panel is busy, so the second frame waits in the slot until the third replaces it
+    second_future = blocking_manager.submit_image(second)
+    third_future = blocking_manager.submit_image(third)
+    assert second_future.cancelled()
+
+    display.release.release(2)
+    assert first_future.result(timeout=5)
+    assert third_future.result(timeout=5)
+    assert display.shown == [(255, 0, 0), (0, 0, 255)]
+
+
+def test_display_image_raises_when_superseded(blocking_manager):
+    display = blocking_manager.display
+    blocking_manager.submit_image(Image.new("RGB", (40, 30), "red"))
+    assert display.started.acquire(timeout=5)
+
+    errors = []
+
+    def show_superseded_image():
+        try:
+            blocking_manager.display_image(Image.new("RGB", (40, 30), "green"))
+        except CancelledError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=show_superseded_image)
+    thread.start()
+    # wait until the frame of display_image waits in the slot
+    while blocking_manager.pending_frame is None:
+        thread.join(0.01)
+    blocking_manager.submit_image(Image.new("RGB", (40, 30), "blue"))
+    thread.join(5)
+    assert len(errors) == 1
+
+
+def test_stop_cancels_the_waiting_frame(blocking_manager):
+    display = blocking_manager.display
+    shown_future = blocking_manager.submit_image(Image.new("RGB", (40, 30), "red"))
+    assert display.started.acquire(timeout=5)
+    waiting_future = blocking_manager.submit_image(Image.new("RGB", (40, 30), "green"))
+
+    display.release.release()
+    blocking_manager.stop()
+    assert shown_future.result(timeout=5)
+    assert waiting_future.cancelled()
+    assert display.shown == [(255, 0, 0)]
+
+
+def test_panel_digest_is_written_and_shown_image_tracked(device_config):
+    display_manager = DisplayManager(device_config)
+    image = Image.new("RGB", (40, 30), "white")
+    image_hash = compute_image_hash(image)
+
+    assert not display_manager.shows_image(image_hash)
+    assert display_manager.display_image(image)
+    get_image_writer().flush(timeout=10)
+
+    # the digest is on disk once the panel shows the frame
+    assert device_config.written["panel_digest"] == device_config.config["panel_digest"]
+    assert display_manager.shows_image(image_hash)
+    assert not display_manager.shows_image(image_hash, ["brightness"])
+
+    # the frame is prepared differently once the display settings change
+    device_config.config["orientation"] = "vertical"
+    assert not display_manager.shows_image(image_hash)
+
+
+def test_equal_frames_have_no_changed_regions():
+    frame = np.zeros((30, 40), dtype=np.uint8)
+    assert get_changed_regions(frame, frame.copy()) == []
+
+
+def test_bands_within_the_merge_gap_are_merged():
+    previous = np.zeros((100, 40), dtype=np.uint8)
+    current = previous.copy()
+    current[10, 5] = 1
+    current[10 + REGION_MERGE_GAP, 20] = 1
+    current[60, 30:35] = 1
+
+    assert get_changed_regions(previous, current) == [(5, 10, 21, 11 + REGION_MERGE_GAP), (30, 60, 35, 61)]
+
+
+def test_too_many_regions_collapse_into_their_bounding_box():
+    previous = np.zeros(((MAX_REGIONS + 1) * (REGION_MERGE_GAP + 2), 40), dtype=np.uint8)
+    current = previous.copy()
+    rows = [i * (REGION_MERGE_GAP + 2) for i in range(MAX_REGIONS + 1)]
+    for column, row in enumerate(rows):
+        current[row, column + 3] = 1
+
+    assert get_changed_regions(previous, current) == [(3, rows[0], MAX_REGIONS + 4, rows[-1] + 1)]
+
+
+def test_changed_regions_of_rgb_frames():
+    previous = np.zeros((30, 40, 3), dtype=np.uint8)
+    current = previous.copy()
+    # a change in a single channel changes the pixel
+    current[7, 12, 2] = 255
+
+    assert get_changed_regions(previous, current) == [(12, 7, 13, 8)]
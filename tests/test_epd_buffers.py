@@ -0,0 +1,204 @@
+import pytest
+
+import numpy as np
+from PIL import Image
+
+from src.display.epd_buffers import detect_buffer_format, get_buffer, split_bi_color_buffers
+
+# Panel sizes in their native orientation, 122 wide panels pad their rows
+PANEL_SIZES = [(16, 24), (122, 250)]
+
+
+class VendorLoopEPD:
+    """getbuffer of the older Waveshare drivers, a per-pixel loop setting bits for white."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def getbuffer(self, image):
+        linewidth = (self.width + 7) // 8
+        buf = [0xFF] * (linewidth * self.height)
+        image_monocolor = image.convert('1')
+        imwidth, imheight = image_monocolor.size
+        pixels = image_monocolor.load()
+        if imwidth == self.width and imheight == self.height:
+            for y in range(imheight):
+                for x in range(imwidth):
+                    if pixels[x, y] == 0:
+                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+        elif imwidth == self.height and imheight == self.width:
+            for y in range(imheight):
+                for x in range(imwidth):
+                    newx = y
+                    newy = self.height - x - 1
+                    if pixels[x, y] == 0:
+                        buf[int(newx / 8) + newy * linewidth] &= ~(0x80 >> (y % 8))
+        return buf
+
+
+class VendorInvertingEPD(VendorLoopEPD):
+    """getbuffer of the newer Waveshare drivers, packing with tobytes and inverting the bytes."""
+
+    def getbuffer(self, image):
+        if image.size == (self.width, self.height):
+            img = image.convert('1')
+        else:
+            img = image.rotate(90, expand=True).convert('1')
+        buf = bytearray(img.tobytes('raw'))
+        for i in range(len(buf)):
+            buf[i] ^= 0xFF
+        return buf
+
+
+class Vendor4GrayEPD(VendorLoopEPD):
+    """getbuffer_4Gray of the 4 gray Waveshare drivers."""
+
+    def getbuffer(self, image):
+        buf = [0xFF] * (int(self.width / 4) * self.height)
+        image_monocolor = image.convert('L')
+        imwidth, imheight = image_monocolor.size
+        pixels = image_monocolor.load()
+        i = 0
+        if imwidth == self.width and imheight == self.height:
+            for y in range(imheight):
+                for x in range(imwidth):
+                    if pixels[x, y] == 0xC0:
+                        pixels[x, y] = 0x80
+                    elif pixels[x, y] == 0x80:
+                        pixels[x, y] = 0x40
+                    i = i + 1
+                    if i % 4 == 0:
+                        buf[int((x + (y * self.width)) / 4)] = ((pixels[x-3, y] & 0xc0) | (pixels[x-2, y] & 0xc0) >> 2 | (pixels[x-1, y] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
+        elif imwidth == self.height and imheight == self.width:
+            for x in range(imwidth):
+                for y in range(imheight):
+                    newx = y
+                    newy = self.height - x - 1
+                    if pixels[x, y] == 0xC0:
+                        pixels[x, y] = 0x80
+                    elif pixels[x, y] == 0x80:
+                        pixels[x, y] = 0x40
+                    i = i + 1
+                    if i % 4 == 0:
+                        buf[int((newx + (newy * self.width)) / 4)] = ((pixels[x, y-3] & 0xc0) | (pixels[x, y-2] & 0xc0) >> 2 | (pixels[x, y-1] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
+        return buf
+
+
+class Vendor7ColorEPD(VendorLoopEPD):
+    """getbuffer of the 7 color ACeP Waveshare drivers."""
+
+    palette = (0, 0, 0, 255, 255, 255, 0, 255, 0, 0, 0, 255, 255, 0, 0, 255, 255, 0, 255, 128, 0)
+
+    def getbuffer(self, image):
+        pal_image = Image.new("P", (1, 1))
+        pal_image.putpalette(self.palette + (0, 0, 0) * 249)
+        imwidth, imheight = image.size
+        if imwidth == self.width and imheight == self.height:
+            image_temp = image
+        else:
+            image_temp = image.rotate(90, expand=True)
+        image_7color = image_temp.convert("RGB").quantize(palette=pal_image)
+        buf_7color = bytearray(image_7color.tobytes('raw'))
+        buf = [0x00] * int(self.width * self.height / 2)
+        idx = 0
+        for i in range(0, len(buf_7color), 2):
+            buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
+            idx += 1
+        return buf
+
+
+class VendorSpectra6EPD(Vendor7ColorEPD):
+    """getbuffer of the Spectra 6 Waveshare drivers."""
+
+    palette = (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0, 0, 0, 0, 0, 0, 255, 0, 255, 0)
+
+
+VENDOR_FORMATS = [
+    (VendorLoopEPD, "1bpp"),
+    (VendorInvertingEPD, "1bpp_inverted"),
+    (Vendor4GrayEPD, "2bpp_gray"),
+    (Vendor7ColorEPD, "4bpp_7color"),
+    (VendorSpectra6EPD, "4bpp_spectra6"),
+]
+
+
+def vendor_bi_color_split(image):
+    """The per-pixel bi-color split the drivers' buffers were built from before."""
+    palette_img = Image.new('P', (1, 1))
+    palette_img.putpalette([0, 0, 0, 255, 255, 255, 255, 0, 0])
+    indexed_img = image.quantize(palette=palette_img, dither=Image.Dither.FLOYDSTEINBERG)
+    black_layer = indexed_img.point(lambda p: 0 if p == 0 else 1, mode='1')
+    red_layer = indexed_img.point(lambda p: 0 if p == 2 else 1, mode='1')
+    return black_layer, red_layer
+
+
+def random_image(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+def strip_padding(buffer, width, height):
+    bytes_per_row = (width + 7) // 8
+    rows = np.frombuffer(bytes(bytearray(buffer)), dtype=np.uint8).reshape(height, bytes_per_row).copy()
+    if width % 8:
+        rows[:, -1] &= (0xFF << (8 - width % 8)) & 0xFF
+    return rows
+
+
+@pytest.mark.parametrize("epd_class,buffer_format", VENDOR_FORMATS)
+@pytest.mark.parametrize("panel_size", PANEL_SIZES)
+def test_detect_buffer_format(epd_class, buffer_format, panel_size):
+    if buffer_format == "2bpp_gray" and panel_size[0] % 4:
+        pytest.skip("4 gray drivers need a width that is a multiple of 4")
+    epd = epd_class(*panel_size)
+    assert detect_buffer_format(epd.getbuffer, panel_size) == buffer_format
+
+
+def test_detect_buffer_format_unknown_layout():
+    # a driver packing least significant bit first is not recognized
+    def getbuffer(image):
+        return bytearray(np.packbits(np.asarray(image.convert('1')), axis=1, bitorder='little').tobytes())
+
+    assert detect_buffer_format(getbuffer, (16, 24)) is None
+
+
+def test_detect_buffer_format_driver_error():
+    def getbuffer(image):
+        raise RuntimeError("SPI not available")
+
+    assert detect_buffer_format(getbuffer, (16, 24)) is None
+
+
+@pytest.mark.parametrize("epd_class,buffer_format", VENDOR_FORMATS)
+@pytest.mark.parametrize("landscape", [False, True])
+def test_get_buffer_matches_vendor(epd_class, buffer_format, landscape):
+    width, height = 24, 40
+    epd = epd_class(width, height)
+    image = random_image((height, width) if landscape else (width, height), seed=1)
+    if buffer_format == "2bpp_gray":
+        # 4 gray images are drawn in the panel's gray levels
+        levels = np.array([0x00, 0x80, 0xC0, 0xFF], dtype=np.uint8)
+        image = Image.fromarray(levels[np.asarray(image.convert('L')) % 4])
+    if landscape and epd_class is VendorLoopEPD:
+        # the loop drivers dither before rotating, so they are compared on black and white images
+        image = image.convert('1')
+
+    buffer = get_buffer(image, (width, height), buffer_format)
+
+    assert bytes(buffer) == bytes(bytearray(epd.getbuffer(image)))
+
+
+@pytest.mark.parametrize("epd_class,invert", [(VendorLoopEPD, False), (VendorInvertingEPD, True)])
+@pytest.mark.parametrize("panel_size", PANEL_SIZES)
+@pytest.mark.parametrize("landscape", [False, True])
+def test_split_bi_color_buffers_matches_vendor(epd_class, invert, panel_size, landscape):
+    width, height = panel_size
+    epd = epd_class(width, height)
+    image = random_image((height, width) if landscape else (width, height))
+
+    black_buffer, red_buffer = split_bi_color_buffers(image, panel_size, invert)
+    black_layer, red_layer = vendor_bi_color_split(image)
+
+    assert np.array_equal(strip_padding(black_buffer, width, height), strip_padding(epd.getbuffer(black_layer), width, height))
+    assert np.array_equal(strip_padding(red_buffer, width, height), strip_padding(epd.getbuffer(red_layer), width, height))
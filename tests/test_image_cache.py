@@ -0,0 +1,72 @@
+import os
+
+from PIL import Image
+
+from utils.image_cache import ImageCache
+from utils.image_utils import compute_image_hash, get_stored_image_hash
+
+# decoded size of a 10x10 RGB image
+IMAGE_BYTES = 10 * 10 * 3
+
+
+def save_image(path, color, mtime_offset=0):
+    image = Image.new("RGB", (10, 10), color)
+    image.save(path)
+    # distinct modification times, also on filesystems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset * 1_000_000_000))
+    return image
+
+
+def test_replaced_files_are_not_served_stale(tmp_path):
+    cache = ImageCache(1024 * 1024)
+    path = str(tmp_path / "plugin.png")
+    save_image(path, "red")
+
+    assert cache.get_image(path).getpixel((0, 0)) == (255, 0, 0)
+    encoded, mtime_ns = cache.get_encoded(path)
+
+    save_image(path, "blue", mtime_offset=1)
+    assert cache.get_image(path).getpixel((0, 0)) == (0, 0, 255)
+    new_encoded, new_mtime_ns = cache.get_encoded(path)
+    assert new_mtime_ns != mtime_ns
+    assert new_encoded != encoded
+    assert cache.size == IMAGE_BYTES + len(new_encoded)
+
+
+def test_put_image_is_served_as_a_copy_with_its_hash(tmp_path):
+    cache = ImageCache(1024 * 1024)
+    path = str(tmp_path / "plugin.png")
+    image = save_image(path, "green")
+    image_hash = compute_image_hash(image)
+
+    cache.put_image(path, image)
+    assert cache.entries[path].image is image
+
+    cached = cache.get_image(path)
+    assert cached is not image
+    assert get_stored_image_hash(cached) == image_hash
+    cached.putpixel((0, 0), (0, 0, 0))
+    assert cache.get_image(path).getpixel((0, 0)) == (0, 128, 0)
+
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    cache = ImageCache(2 * IMAGE_BYTES)
+    paths = [str(tmp_path / f"plugin_{i}.png") for i in range(3)]
+    for path in paths:
+        save_image(path, "white")
+
+    cache.get_image(paths[0])
+    cache.get_image(paths[1])
+    # reading the first image makes the second the least recently used
+    cache.get_image(paths[0])
+    cache.get_image(paths[2])
+
+    assert list(cache.entries) == [paths[0], paths[2]]
+    assert cache.size == 2 * IMAGE_BYTES
+
+    # entries are evicted until the newest one fits the budget
+    cache.max_bytes = IMAGE_BYTES
+    cache.get_image(paths[1])
+    assert list(cache.entries) == [paths[1]]
+    assert cache.size == IMAGE_BYTES
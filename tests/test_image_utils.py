@@ -0,0 +1,117 @@
+import gc
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+
+from utils import image_utils
+from utils.image_utils import compute_image_hash, prepare_panel_image
+
+RESOLUTION = (800, 480)
+
+# Cropping and scaling in one resample differs from cropping first by a few levels at the crop edges
+MAX_PIXEL_DIFFERENCE = 16
+# Contrast uses the image mean estimated from the grayscale histogram, off by up to a level or so where brightness clips
+MAX_MEAN_DIFFERENCE = 1.5
+
+
+def reference_panel_image(image, resolution, orientation, inverted, image_settings, enhancements):
+    """The post-processing chain prepare_panel_image replaced: rotate, crop, resize, rotate and enhance."""
+    image = image.rotate(90 if orientation == "vertical" else 0, expand=1)
+
+    width, height = resolution
+    image_ratio, desired_ratio = image.width / image.height, width / height
+    left, top, crop_width, crop_height = 0, 0, image.width, image.height
+    if image_ratio > desired_ratio:
+        crop_width = int(image.height * desired_ratio)
+        if "keep-width" not in image_settings:
+            left = (image.width - crop_width) // 2
+    else:
+        crop_height = int(image.width / desired_ratio)
+        if "keep-width" not in image_settings:
+            top = (image.height - crop_height) // 2
+    image = image.crop((left, top, left + crop_width, top + crop_height))
+    image = image.resize(resolution, Image.LANCZOS)
+
+    if inverted:
+        image = image.rotate(180)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image = ImageEnhance.Brightness(image).enhance(enhancements.get("brightness", 1.0))
+    image = ImageEnhance.Contrast(image).enhance(enhancements.get("contrast", 1.0))
+    image = ImageEnhance.Color(image).enhance(enhancements.get("saturation", 1.0))
+    return ImageEnhance.Sharpness(image).enhance(enhancements.get("sharpness", 1.0))
+
+
+def plugin_image(size):
+    """Color gradients with noise and some text, a stand-in for a rendered plugin page."""
+    width, height = size
+    x = np.linspace(0, 255, width)[None, :]
+    y = np.linspace(0, 255, height)[:, None]
+    pixels = np.stack(np.broadcast_arrays(x, y, (x + y) / 2), axis=2)
+    pixels = pixels + np.random.default_rng(1).normal(0, 20, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    ImageDraw.Draw(image).text((10, 10), "InkyPi", fill="black")
+    return image
+
+
+@pytest.mark.parametrize("orientation,inverted,enhancements", [
+    ("horizontal", False, {}),
+    ("horizontal", False, {"brightness": 1.3}),
+    ("horizontal", False, {"contrast": 1.5}),
+    ("horizontal", False, {"brightness": 1.2, "contrast": 0.7}),
+    ("horizontal", False, {"saturation": 1.5, "sharpness": 2.0}),
+    ("horizontal", True, {}),
+    ("vertical", False, {}),
+    ("vertical", True, {"brightness": 0.8, "contrast": 1.4}),
+])
+@pytest.mark.parametrize("resized", [False, True])
+def test_matches_the_previous_post_processing(orientation, inverted, enhancements, resized):
+    size = (1024, 700) if resized else RESOLUTION if orientation == "horizontal" else RESOLUTION[::-1]
+    image = plugin_image(size)
+
+    expected = np.asarray(reference_panel_image(image, RESOLUTION, orientation, inverted, [], enhancements), dtype=int)
+    actual = np.asarray(prepare_panel_image(image, RESOLUTION, orientation, inverted, [], enhancements), dtype=int)
+
+    assert actual.shape == expected.shape
+    difference = np.abs(actual - expected)
+    assert difference.max() <= MAX_PIXEL_DIFFERENCE
+    assert difference.mean() <= MAX_MEAN_DIFFERENCE
+
+
+def test_default_settings_pass_the_frame_through():
+    image = plugin_image(RESOLUTION)
+
+    panel_image = prepare_panel_image(image, RESOLUTION, "horizontal")
+    assert panel_image is image
+    assert panel_image.tobytes() == reference_panel_image(image, RESOLUTION, "horizontal", False, [], {}).tobytes()
+
+
+@pytest.mark.parametrize("modify", [
+    lambda image: image.putpixel((0, 0), (0, 0, 0)),
+    lambda image: ImageDraw.Draw(image).rectangle((2, 2, 5, 5), fill="black"),
+    lambda image: image.paste((0, 0, 255), (0, 0, 4, 4)),
+])
+def test_modified_frames_are_hashed_again(modify):
+    image = Image.new("RGB", (10, 10), "white")
+    image_hash = compute_image_hash(image)
+    assert compute_image_hash(image) == image_hash
+
+    modify(image)
+    # a copy is never hashed before, so its hash is computed from its pixels
+    assert compute_image_hash(image) == compute_image_hash(image.copy()) != image_hash
+
+
+def test_recycled_ids_do_not_get_a_stale_hash():
+    image = Image.new("RGB", (10, 10), "white")
+    compute_image_hash(image)
+    image_id = id(image)
+
+    del image
+    gc.collect()
+    assert image_id not in image_utils._frame_hashes
+
+    # new frames often reuse the id of a freed one
+    for color in ("red", "green", "blue"):
+        image = Image.new("RGB", (10, 10), color)
+        assert compute_image_hash(image) == compute_image_hash(image.copy())
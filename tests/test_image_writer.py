@@ -0,0 +1,87 @@
+import os
+import stat
+import threading
+
+import pytest
+from PIL import Image
+
+from utils.image_writer import PREVIEW_FORMAT, ImageWriter, get_preview_file, write_atomic
+
+
+class GatedWriter(ImageWriter):
+    """Records the written images, each write waits until it is released."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Semaphore(0)
+        self.release = threading.Semaphore(0)
+        self.written = []
+
+    def write(self, image, device_config):
+        self.started.release()
+        self.release.acquire()
+        self.written.append(image)
+
+
+def test_latest_image_wins(make_device_config):
+    writer = GatedWriter()
+    device_config = make_device_config()
+    first, second, third = (Image.new("RGB", (4, 4), color) for color in ("red", "green", "blue"))
+    notified = []
+
+    writer.submit(first, device_config)
+    assert writer.started.acquire(timeout=5)
+    # the second image is replaced while the first one is written
+    writer.submit(second, device_config)
+    writer.submit(third, device_config, on_written=lambda: notified.append(True))
+
+    writer.release.release()
+    writer.release.release()
+    assert writer.flush(timeout=5)
+    assert writer.written == [first, third]
+    assert notified == [True]
+
+
+def test_flush_timeout(make_device_config):
+    writer = GatedWriter()
+    writer.submit(Image.new("RGB", (4, 4)), make_device_config())
+    assert writer.started.acquire(timeout=5)
+
+    assert not writer.flush(timeout=0.05)
+    writer.release.release()
+    assert writer.flush(timeout=5)
+
+
+def test_write_atomic_replaces_or_keeps_the_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "image.png")
+    write_atomic(Image.new("RGB", (4, 4), "red"), path, "PNG")
+    write_atomic(Image.new("RGB", (4, 4), "blue"), path, "PNG")
+
+    with Image.open(path) as image:
+        assert image.getpixel((0, 0)) == (0, 0, 255)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+    def failing_save(self, fp, format=None, **params):
+        fp.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Image.Image, "save", failing_save)
+    with pytest.raises(OSError):
+        write_atomic(Image.new("RGB", (4, 4), "green"), path, "PNG")
+
+    # the previous image is kept and the temporary file removed
+    monkeypatch.undo()
+    with Image.open(path) as image:
+        assert image.getpixel((0, 0)) == (0, 0, 255)
+    assert os.listdir(tmp_path) == ["image.png"]
+
+
+@pytest.mark.parametrize("size,preview_size", [((1600, 960), (800, 480)), ((400, 240), (400, 240))])
+def test_preview_size_and_format(make_device_config, size, preview_size):
+    device_config = make_device_config(current_image_preview_width=800)
+    ImageWriter().write(Image.new("RGB", size, "white"), device_config)
+
+    with Image.open(device_config.current_image_file) as image:
+        assert (image.format, image.size) == ("PNG", size)
+    with Image.open(get_preview_file(device_config)) as preview:
+        assert (preview.format, preview.size) == (PREVIEW_FORMAT, preview_size)
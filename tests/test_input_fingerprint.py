@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+import pytest
+from PIL import Image
+
+from model import PluginInstance
+from plugins.base_plugin.base_plugin import INPUT_FINGERPRINT_KEY
+from refresh_task import PlaylistRefresh
+
+ITEM = {"title": "Title", "description": "First", "published": "today", "link": "https://example.com/1", "image": None}
+
+
+class FakePlaylist:
+    name = "Default"
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    pytest.importorskip("feedparser")
+    from plugins.rss.rss import Rss
+
+    plugin = Rss({"id": "rss"})
+    feed = {"items": [dict(ITEM)], "fetches": 0, "rendered": []}
+
+    def parse_rss_feed(url, timeout=10):
+        feed["fetches"] += 1
+        return [dict(item) for item in feed["items"]]
+
+    def render_image(dimensions, html_file, css_file=None, template_params=None):
+        feed["rendered"].append(template_params["items"])
+        return Image.new("RGB", dimensions, "white")
+
+    monkeypatch.setattr(plugin, "parse_rss_feed", parse_rss_feed)
+    monkeypatch.setattr(plugin, "render_image", render_image)
+    return plugin, feed
+
+
+def refresh(plugin, plugin_instance, device_config):
+    action = PlaylistRefresh(FakePlaylist(), plugin_instance, force=True)
+    action.execute(plugin, device_config, datetime.now(timezone.utc))
+    return action
+
+
+def test_render_uses_the_items_fetched_for_the_fingerprint(rss, make_device_config):
+    plugin, feed = rss
+    device_config = make_device_config((80, 48))
+    plugin_instance = PluginInstance("rss", "News", {"feedUrl": "https://example.com/feed"}, {"interval": 60})
+
+    refresh(plugin, plugin_instance, device_config)
+    assert feed["fetches"] == 1
+    assert feed["rendered"] == [[ITEM]]
+    assert INPUT_FINGERPRINT_KEY not in plugin_instance.settings
+
+    # unchanged items reuse the saved image
+    assert refresh(plugin, plugin_instance, device_config).inputs_unchanged
+    assert len(feed["rendered"]) == 1
+
+    # a changed description is rendered
+    feed["items"][0]["description"] = "Updated"
+    assert not refresh(plugin, plugin_instance, device_config).inputs_unchanged
+    assert feed["rendered"][-1][0]["description"] == "Updated"
+    assert feed["fetches"] == 3
+
+
+class FingerprintPlugin:
+    """Checks the settings it renders with, and changes one of them like plugins keeping state do."""
+
+    def __init__(self, plugin_instance):
+        self.plugin_instance = plugin_instance
+
+    def get_input_fingerprint(self, settings, device_config):
+        return {"items": ["a" * 1000]}
+
+    def generate_image(self, settings, device_config):
+        assert settings[INPUT_FINGERPRINT_KEY] == {"items": ["a" * 1000]}
+        # a config written during the render does not save the fingerprint
+        assert INPUT_FINGERPRINT_KEY not in self.plugin_instance.settings
+        settings["page"] = settings.get("page", 0) + 1
+        return Image.new("RGB", device_config.get_resolution(), "white")
+
+
+def test_render_settings_are_a_copy_without_the_fingerprint(make_device_config):
+    device_config = make_device_config((80, 48))
+    plugin_instance = PluginInstance("fingerprint", "Test", {"title": "Test"}, {"interval": 60})
+
+    refresh(FingerprintPlugin(plugin_instance), plugin_instance, device_config)
+    assert plugin_instance.settings == {"title": "Test", "page": 1}
@@ -0,0 +1,146 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.browser_service import find_chromium_binary
+from utils.layout import Column, ProgressBar, Text, get_content_box, render_layout
+
+from plugins.countdown.countdown import Countdown
+from plugins.ferien.ferien import Ferien
+from plugins.schuljahr.schuljahr import Schuljahr
+from plugins.todo_list.todo_list import TodoList
+from plugins.year_progress.year_progress import YearProgress
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "layout")
+# Set to re-create the reference screenshots of the HTML templates with the installed Chromium
+UPDATE_FIXTURES = os.environ.get("UPDATE_LAYOUT_FIXTURES") == "1"
+# Largest share of differing ink between the native layouts and their reference screenshots, the
+# layouts differ by up to 0.075 from their own screenshot and by more than 0.35 from the others
+MAX_INK_DIFFERENCE = 0.1
+# The date the reference screenshots show
+FIXTURE_DATE = datetime(2026, 3, 15, 12, 0)
+TIMEZONE = "Europe/Berlin"
+
+STYLE_SETTINGS = {
+    "selectedFrame": "Rectangle",
+    "backgroundOption": "color",
+    "backgroundColor": "#ffffff",
+    "textColor": "#000000",
+}
+
+PLUGIN_CASES = [
+    (Countdown, {"title": "Summer Vacation", "date": "2030-06-01"}),
+    (YearProgress, {}),
+    (Schuljahr, {"startDate": "2025-09-01", "endDate": "2026-07-15"}),
+    (Ferien, {"holidayName[]": ["Sommerferien", "Herbstferien"], "holidayDate[]": ["2030-07-01", "2030-10-20"]}),
+    (TodoList, {"title": "Todo", "list-title[]": ["Home", "Work"], "list[]": ["Milk\nEggs\nBread", "Report"]}),
+]
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return tz.localize(FIXTURE_DATE) if tz else FIXTURE_DATE
+
+
+@pytest.fixture
+def frozen_date(monkeypatch):
+    for plugin_class, _ in PLUGIN_CASES:
+        module = __import__(plugin_class.__module__, fromlist=["datetime"])
+        if hasattr(module, "datetime"):
+            monkeypatch.setattr(module, "datetime", FrozenDatetime)
+
+
+def ink(image):
+    return np.asarray(image.convert("L")) < 128
+
+
+def ink_difference(first, second, reduction=8):
+    """Share of ink that differs between two images, compared on a reduced grid to allow for small offsets."""
+    cells = []
+    for image in (first, second):
+        mask = Image.fromarray(ink(image).astype(np.uint8) * 255)
+        cells.append(np.asarray(mask.reduce(reduction), dtype=np.float64))
+    return np.abs(cells[0] - cells[1]).sum() / max(1, cells[0].sum() + cells[1].sum())
+
+
+def test_text_wraps_to_width():
+    text = Text("one two three four five six", 20)
+    width = text.get_text_width("one two three")
+    lines = text.get_lines(width)
+
+    assert len(lines) > 1
+    assert all(text.get_text_width(line) <= width for line in lines)
+    assert " ".join(lines) == text.text
+
+
+def test_text_ellipsis():
+    text = Text("a rather long holiday name", 20, wrap=False, ellipsis=True)
+    line, = text.get_lines(60)
+
+    assert line.endswith("…")
+    assert text.get_text_width(line) <= 60
+
+
+def test_page_frame_margins_and_colors():
+    settings = {**STYLE_SETTINGS, "backgroundColor": "#ff0000", "textColor": "#0000ff", "topMargin": "10"}
+    image = render_layout((200, 100), Column([]), settings)
+
+    # the frame starts inside the margins, the page around it has the background color
+    assert image.getpixel((100, 9)) == (255, 0, 0)
+    assert image.getpixel((100, 10)) == (0, 0, 255)
+    assert image.getpixel((4, 50)) == (255, 0, 0)
+    assert image.getpixel((5, 50)) == (0, 0, 255)
+    assert image.getpixel((100, 50)) == (255, 0, 0)
+
+    x, y, width, height = get_content_box((200, 100), settings)
+    assert (x, y) == (5 + 1 + 3, 10 + 1 + 3)
+    assert (width, height) == (200 - 2 * x, 100 - y - 9)
+
+
+def test_progress_bar_fill():
+    settings = {**STYLE_SETTINGS, "selectedFrame": "None"}
+    image = render_layout((400, 200), Column([ProgressBar(25, 40)], justify="center"), settings)
+    rows = ink(image)[90:110]
+    x, _, width, _ = get_content_box((400, 200), settings)
+
+    filled = rows[:, round(x) + 5:round(x + width * 0.25) - 5]
+    dotted = rows[:, round(x + width * 0.25) + 5:round(x + width) - 5]
+    assert filled.all()
+    assert 0 < dotted.mean() < 0.5
+
+
+@pytest.mark.parametrize("resolution,orientation", [((800, 480), "horizontal"), ((800, 480), "vertical")])
+@pytest.mark.parametrize("plugin_class,settings", PLUGIN_CASES)
+def test_native_layout_renders(plugin_class, settings, resolution, orientation, make_device_config):
+    plugin = plugin_class({"id": "test"})
+    device_config = make_device_config(resolution, orientation=orientation, timezone=TIMEZONE)
+    image = plugin.generate_image({**STYLE_SETTINGS, **settings}, device_config)
+
+    expected = resolution[::-1] if orientation == "vertical" else resolution
+    assert image.size == expected
+    # more than the frame is drawn
+    assert ink(image).mean() > 0.03
+
+
+@pytest.mark.parametrize("plugin_class,settings", PLUGIN_CASES)
+def test_native_layout_matches_html(plugin_class, settings, frozen_date, make_device_config):
+    plugin_id = plugin_class.__module__.split(".")[1]
+    plugin = plugin_class({"id": plugin_id})
+    device_config = make_device_config((800, 480), orientation="horizontal", timezone=TIMEZONE)
+    settings = {**STYLE_SETTINGS, **settings}
+    fixture_path = os.path.join(FIXTURES_DIR, f"{plugin_id}.png")
+
+    if UPDATE_FIXTURES:
+        assert find_chromium_binary() is not None, "Chromium is needed to update the reference screenshots"
+        html = plugin.generate_image({**settings, "renderer": "html"}, device_config)
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+        html.convert("L").save(fixture_path, optimize=True)
+
+    native = plugin.generate_image(settings, device_config)
+    with Image.open(fixture_path) as html:
+        assert native.size == html.size
+        assert ink_difference(native, html) < MAX_INK_DIFFERENCE
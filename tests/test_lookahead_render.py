@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+
+import refresh_task
+from model import PluginInstance
+from refresh_task import LookaheadRender, _get_instance_lock
+
+
+class CountingPlugin:
+    def __init__(self):
+        self.renders = 0
+
+    def generate_image(self, settings, device_config):
+        self.renders += 1
+        return Image.new("RGB", device_config.get_resolution(), "white")
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    plugin = CountingPlugin()
+    monkeypatch.setattr(refresh_task, "get_plugin_instance", lambda plugin_config: plugin)
+    return plugin
+
+
+def lookahead_render(plugin_instance, device_config):
+    boundary_dt = datetime.now(timezone.utc) + timedelta(minutes=1)
+    lookahead = LookaheadRender("Default", plugin_instance, boundary_dt, boundary_dt - timedelta(seconds=30))
+    lookahead.start(device_config, lambda instance_key, duration: None)
+    return lookahead.get_image()
+
+
+def test_lookahead_renders_the_next_instance(plugin, make_device_config):
+    plugin_instance = PluginInstance("counter", "Lookahead", {}, {"interval": 60})
+
+    assert lookahead_render(plugin_instance, make_device_config((40, 30), plugins=["counter"])).size == (40, 30)
+    assert plugin.renders == 1
+    assert _get_instance_lock(plugin_instance).acquire(blocking=False)
+    _get_instance_lock(plugin_instance).release()
+
+
+def test_lookahead_is_skipped_while_the_instance_is_refreshed(plugin, make_device_config):
+    plugin_instance = PluginInstance("counter", "Busy", {}, {"interval": 60})
+
+    with _get_instance_lock(plugin_instance):
+        assert lookahead_render(plugin_instance, make_device_config(plugins=["counter"])) is None
+    assert plugin.renders == 0
@@ -0,0 +1,75 @@
+from collections import deque
+
+import pytest
+
+from utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "_spans", deque(maxlen=metrics.MAX_SPANS))
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Makes each perf_counter call return the next of the given times."""
+    def set_times(*times):
+        values = iter(times)
+        monkeypatch.setattr(metrics.time, "perf_counter", lambda: next(values))
+    return set_times
+
+
+def refresh(plugin_id, instance):
+    with metrics.labels(plugin_id=plugin_id, instance=instance):
+        with metrics.span("generate"):
+            with metrics.span("template"):
+                pass
+            with metrics.span("screenshot"):
+                pass
+
+
+def test_spans_of_a_refresh(clock):
+    # generate runs 0 - 3s, with the template 0.5 - 0.6s and the screenshot 1 - 2.5s
+    clock(0, 0.5, 0.6, 1, 2.5, 3)
+    refresh("weather", "Home")
+
+    spans = {span.stage: span for span in metrics.get_recent_spans()}
+    assert spans.keys() == {"generate", "template", "screenshot", "fetch"}
+    assert spans["generate"].duration == pytest.approx(3)
+    assert spans["template"].duration == pytest.approx(0.1)
+    assert spans["screenshot"].duration == pytest.approx(1.5)
+    # the time outside of rendering is attributed to fetching the data
+    assert spans["fetch"].duration == pytest.approx(1.4)
+    assert {(span.plugin_id, span.instance) for span in spans.values()} == {("weather", "Home")}
+    assert [span.stage for span in metrics.get_recent_spans(2)] == ["generate", "fetch"]
+
+
+def test_prometheus_histograms(clock):
+    clock(0, 0.5, 0.6, 1, 2.5, 3)
+    refresh("weather", "Home")
+    clock(10, 10, 10.05, 10.05, 10.1, 10.2)
+    refresh("weather", "Home")
+    clock(0, 1)
+    with pytest.raises(ValueError), metrics.labels(plugin_id="clock"), metrics.span("display"):
+        raise ValueError("panel busy")
+
+    lines = metrics.export_prometheus().splitlines()
+    labels = 'stage="generate",plugin_id="weather",instance="Home"'
+    # cumulative buckets, the renders took 0.2s and 3s
+    assert f'inkypi_stage_duration_seconds_bucket{{{labels},le="0.1"}} 0' in lines
+    assert f'inkypi_stage_duration_seconds_bucket{{{labels},le="0.25"}} 1' in lines
+    assert f'inkypi_stage_duration_seconds_bucket{{{labels},le="2.5"}} 1' in lines
+    assert f'inkypi_stage_duration_seconds_bucket{{{labels},le="5"}} 2' in lines
+    assert f'inkypi_stage_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"inkypi_stage_duration_seconds_sum{{{labels}}} 3.200000" in lines
+    assert f"inkypi_stage_duration_seconds_count{{{labels}}} 2" in lines
+    assert f"inkypi_stage_errors_total{{{labels}}} 0" in lines
+
+    display_labels = 'stage="display",plugin_id="clock",instance=""'
+    assert f"inkypi_stage_duration_seconds_count{{{display_labels}}} 1" in lines
+    assert f"inkypi_stage_errors_total{{{display_labels}}} 1" in lines
+    assert lines[:2] == [
+        "# HELP inkypi_stage_duration_seconds Duration of refresh stages.",
+        "# TYPE inkypi_stage_duration_seconds histogram",
+    ]
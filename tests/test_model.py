@@ -1,6 +1,10 @@
 import pytest
+import pytz
 
-from src.model import Playlist
+from datetime import datetime, timedelta
+
+from src.model import Playlist, PlaylistManager, PluginInstance, RefreshInfo
+from src.refresh_scheduler import RefreshScheduler
 
 class TestPlaylist:
 
@@ -76,4 +80,148 @@ class TestPlaylist:
         result = playlist.reorder_plugins(["p2:inst2", "p1:inst1", "p4:inst4"])
         assert result is False
         assert [p.name for p in playlist.plugins] == ["inst2", "inst1", "inst3"]
-        
\ No newline at end of file
+        
+    def test_peek_next_plugin(self):
+        playlist = Playlist("Test Playlist", "00:00", "24:00", plugins=[
+            {"plugin_id": "p1", "name": "inst1", "plugin_settings": {}, "refresh": {}},
+            {"plugin_id": "p2", "name": "inst2", "plugin_settings": {}, "refresh": {}},
+        ])
+
+        # Peeking does not advance the playlist
+        assert playlist.peek_next_plugin().name == "inst1"
+        assert playlist.peek_next_plugin().name == "inst1"
+        assert playlist.current_plugin_index is None
+
+        # Peeking matches what get_next_plugin returns, including wrap around
+        for _ in range(3):
+            expected = playlist.peek_next_plugin()
+            assert playlist.get_next_plugin() is expected
+
+        assert Playlist("Empty", "00:00", "24:00").peek_next_plugin() is None
+
+
+class TestPluginInstance:
+
+    @pytest.mark.parametrize(
+        "refresh,latest,current,expected",
+        [
+            # --- Never refreshed ---
+            ({"interval": 3600}, None, "2025-01-02 10:00", True),
+
+            # --- Interval ---
+            ({"interval": 3600}, "2025-01-02 09:00", "2025-01-02 09:59", False),
+            ({"interval": 3600}, "2025-01-02 09:00", "2025-01-02 10:00", True),
+
+            # --- Scheduled 07:00 ---
+            ({"scheduled": "07:00"}, "2025-01-02 06:00", "2025-01-02 06:30", False),  # before scheduled time
+            ({"scheduled": "07:00"}, "2025-01-02 06:00", "2025-01-02 07:00", True),   # at scheduled time
+            ({"scheduled": "07:00"}, "2025-01-02 07:00", "2025-01-02 23:00", False),  # already refreshed today
+            ({"scheduled": "07:00"}, "2025-01-02 08:00", "2025-01-03 06:59", False),  # before scheduled time next day
+            ({"scheduled": "07:00"}, "2025-01-02 08:00", "2025-01-03 07:00", True),   # scheduled time next day
+            ({"scheduled": "07:00"}, "2024-12-31 08:00", "2025-01-02 06:00", True),   # missed a day
+        ]
+    )
+    def test_should_refresh(self, refresh, latest, current, expected):
+        latest_refresh_time = datetime.strptime(latest, "%Y-%m-%d %H:%M").isoformat() if latest else None
+        plugin_instance = PluginInstance("p1", "inst1", {}, refresh, latest_refresh_time)
+        assert plugin_instance.should_refresh(datetime.strptime(current, "%Y-%m-%d %H:%M")) == expected
+
+    def test_get_next_refresh_dt(self):
+        plugin_instance = PluginInstance("p1", "inst1", {}, {"interval": 7200, "scheduled": "07:00"}, "2025-01-02T06:00:00")
+        current_dt = datetime(2025, 1, 2, 6, 30)
+        # The scheduled refresh comes before the interval expires
+        assert plugin_instance.get_next_refresh_dt(current_dt) == datetime(2025, 1, 2, 7, 0)
+
+        plugin_instance.refresh = {}
+        assert plugin_instance.get_next_refresh_dt(current_dt) is None
+
+    @pytest.mark.parametrize(
+        "refresh,latest,current,expected",
+        [
+            # --- Interval ---
+            ({"interval": 3600}, "2025-01-02 09:00", "2025-01-02 09:30", "2025-01-02 10:00"),
+            ({"interval": 3600}, "2025-01-02 23:30", "2025-01-02 23:45", "2025-01-03 00:30"),  # across midnight
+
+            # --- Scheduled ---
+            ({"scheduled": "00:30"}, "2025-01-02 23:00", "2025-01-02 23:30", "2025-01-03 00:30"),  # after midnight
+            ({"scheduled": "23:30"}, "2025-01-02 23:45", "2025-01-03 00:15", "2025-01-03 23:30"),  # refreshed before midnight
+            ({"scheduled": "07:00"}, "2024-12-30 08:00", "2025-01-02 06:00", "2024-12-31 07:00"),  # missed days are overdue
+
+            # --- Earliest of interval and scheduled ---
+            ({"interval": 7200, "scheduled": "23:00"}, "2025-01-02 22:30", "2025-01-02 22:45", "2025-01-02 23:00"),
+            ({"interval": 1800, "scheduled": "23:00"}, "2025-01-02 22:15", "2025-01-02 22:30", "2025-01-02 22:45"),
+        ]
+    )
+    def test_get_next_refresh_dt_deadlines(self, refresh, latest, current, expected):
+        latest_refresh_time = datetime.strptime(latest, "%Y-%m-%d %H:%M").isoformat()
+        plugin_instance = PluginInstance("p1", "inst1", {}, refresh, latest_refresh_time)
+        current_dt = datetime.strptime(current, "%Y-%m-%d %H:%M")
+        assert plugin_instance.get_next_refresh_dt(current_dt) == datetime.strptime(expected, "%Y-%m-%d %H:%M")
+
+    @pytest.mark.parametrize(
+        "latest,current,expected",
+        [
+            # the latest refresh is stored in UTC, the scheduled time is local to the device
+            ("2025-01-02T06:30:00+00:00", "2025-01-02 01:45", "2025-01-02 07:00"),
+            ("2025-01-02T13:00:00+00:00", "2025-01-02 09:00", "2025-01-03 07:00"),
+            # daylight saving time starts overnight, 07:00 is then at a different UTC offset
+            ("2025-03-08T13:00:00+00:00", "2025-03-09 06:00", "2025-03-09 07:00"),
+            ("2025-11-01T12:00:00+00:00", "2025-11-02 06:00", "2025-11-02 07:00"),
+        ]
+    )
+    def test_scheduled_deadline_in_device_timezone(self, latest, current, expected):
+        tz = pytz.timezone("America/New_York")
+        plugin_instance = PluginInstance("p1", "inst1", {}, {"scheduled": "07:00"}, latest)
+        current_dt = tz.localize(datetime.strptime(current, "%Y-%m-%d %H:%M"))
+
+        next_refresh_dt = plugin_instance.get_next_refresh_dt(current_dt)
+        assert next_refresh_dt == tz.localize(datetime.strptime(expected, "%Y-%m-%d %H:%M"))
+        assert next_refresh_dt.strftime("%H:%M") == "07:00"
+
+    def test_input_fingerprint_round_trip(self):
+        instance = PluginInstance("rss", "News", {"feedUrl": "https://example.com/feed"}, {"interval": 3600},
+                                  latest_refresh_time="2025-01-02T09:00:00", input_fingerprint="abc123")
+
+        restored = PluginInstance.from_dict(instance.to_dict())
+
+        assert restored.input_fingerprint == "abc123"
+        assert PluginInstance.from_dict({**instance.to_dict(), "input_fingerprint": None}).input_fingerprint is None
+
+
+class TestRefreshScheduler:
+
+    def schedule(self, make_device_config, current_dt, last_cycle_check_dt=None, last_instance_check_dt=None):
+        instance = {"plugin_id": "p1", "name": "inst1", "plugin_settings": {}, "refresh": {"interval": 600},
+                    "latest_refresh_time": "2025-01-02T09:00:00"}
+        playlist_manager = PlaylistManager([Playlist("Default", "00:00", "24:00", [instance])], "Default")
+        refresh_info = RefreshInfo("Playlist", "p1", "2025-01-02T09:00:00", None, "Default", "inst1")
+        device_config = make_device_config(playlist_manager=playlist_manager, refresh_info=refresh_info,
+                                           plugin_cycle_interval_seconds=3600)
+
+        scheduler = RefreshScheduler()
+        scheduler.schedule(device_config, current_dt, last_cycle_check_dt, last_instance_check_dt)
+        return {trigger: deadline_dt for deadline_dt, _, trigger, _ in scheduler.deadlines}
+
+    def test_earliest_deadline(self, make_device_config):
+        current_dt = datetime(2025, 1, 2, 9, 5)
+        deadlines = self.schedule(make_device_config, current_dt)
+
+        assert deadlines[RefreshScheduler.CYCLE] == datetime(2025, 1, 2, 10, 0)
+        assert deadlines[RefreshScheduler.INSTANCE_REFRESH] == datetime(2025, 1, 2, 9, 10)
+        assert deadlines[RefreshScheduler.PLAYLIST_WINDOW] == datetime(2025, 1, 3, 0, 0)
+
+    def test_checked_deadlines_are_deferred(self, make_device_config):
+        # the instance was due at 09:10 and checked at 09:15, without being refreshed
+        current_dt = datetime(2025, 1, 2, 9, 20)
+        check_dt = datetime(2025, 1, 2, 9, 15)
+        deadlines = self.schedule(make_device_config, current_dt, last_instance_check_dt=check_dt)
+        assert deadlines[RefreshScheduler.INSTANCE_REFRESH] == check_dt + timedelta(seconds=3600)
+
+        # a deadline after the last check is kept
+        deadlines = self.schedule(make_device_config, current_dt, last_instance_check_dt=datetime(2025, 1, 2, 9, 5))
+        assert deadlines[RefreshScheduler.INSTANCE_REFRESH] == datetime(2025, 1, 2, 9, 10)
+
+        # the cycle check at 10:00 found nothing to display
+        current_dt = datetime(2025, 1, 2, 10, 5)
+        deadlines = self.schedule(make_device_config, current_dt, last_cycle_check_dt=datetime(2025, 1, 2, 10, 0))
+        assert deadlines[RefreshScheduler.CYCLE] == datetime(2025, 1, 2, 11, 0)
@@ -0,0 +1,31 @@
+import subprocess
+import time
+
+import pytest
+
+from utils.refresh_budget import RefreshBudget, RefreshTimeoutError, track_process
+
+
+def test_watchdog_kills_only_processes_of_the_stage():
+    unrelated = subprocess.Popen(["sleep", "30"])
+    started = {}
+
+    def stage():
+        with subprocess.Popen(["sleep", "30"]) as process, track_process(process.pid):
+            started["process"] = process
+            process.wait()
+
+    try:
+        with pytest.raises(RefreshTimeoutError):
+            RefreshBudget(1).run_stage(RefreshBudget.GENERATE, stage)
+
+        assert started["process"].wait(5) != 0
+        assert unrelated.poll() is None
+    finally:
+        unrelated.kill()
+        unrelated.wait()
+
+
+def test_track_process_outside_of_a_watched_stage():
+    with track_process(1):
+        time.sleep(0)
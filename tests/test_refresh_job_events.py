@@ -0,0 +1,40 @@
+import json
+
+from flask import Flask
+
+from blueprints import plugin as plugin_blueprint
+from refresh_task import ManualRefresh, RefreshJob
+
+
+class FakeRefreshTask:
+    def __init__(self, job):
+        self.job = job
+
+    def get_job(self, job_id):
+        return self.job if job_id == self.job.job_id else None
+
+
+def get_events(job, monkeypatch, max_seconds):
+    monkeypatch.setattr(plugin_blueprint, "REFRESH_JOB_EVENTS_MAX_SECONDS", max_seconds)
+    app = Flask(__name__)
+    app.config["REFRESH_TASK"] = FakeRefreshTask(job)
+    app.register_blueprint(plugin_blueprint.plugin_bp)
+
+    response = app.test_client().get(f"/refresh_job/{job.job_id}/events")
+    return [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_events_end_when_the_job_finishes(monkeypatch):
+    job = RefreshJob(ManualRefresh("clock", {}))
+    job.update(RefreshJob.DONE, "Display updated")
+
+    events = get_events(job, monkeypatch, 300)
+    assert [event["status"] for event in events] == [RefreshJob.DONE]
+
+
+def test_events_end_at_the_time_limit(monkeypatch):
+    job = RefreshJob(ManualRefresh("clock", {}))
+
+    events = get_events(job, monkeypatch, 0.1)
+    assert events[-1]["status"] == RefreshJob.QUEUED
+    assert not events[-1]["finished"]
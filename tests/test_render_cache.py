@@ -0,0 +1,81 @@
+import os
+
+from PIL import Image
+
+from utils import render_cache
+from utils.render_cache import DEFAULT_CACHE_MB, RenderCache, get_render_cache
+
+DIMENSIONS = (40, 30)
+
+
+def write_file(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+    # the digests are reused while the modification time and size are unchanged
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_key_changes_with_referenced_style_sheets_and_fonts(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 1024 * 1024)
+    font = str(tmp_path / "font.ttf")
+    style_sheet = str(tmp_path / "style.css")
+    write_file(font, "font v1")
+    write_file(style_sheet, "@font-face { src: url('font.ttf'); } body { color: black; }")
+    html = f'<link rel="stylesheet" href="{style_sheet}"><p>Hello</p>'
+
+    key = cache.get_key(html, DIMENSIONS)
+    assert key is not None
+    assert cache.get_key(html, DIMENSIONS) == key
+    assert cache.get_key(html, (30, 40)) != key
+
+    write_file(style_sheet, "@font-face { src: url('font.ttf'); } body { color: red; }")
+    css_key = cache.get_key(html, DIMENSIONS)
+    assert css_key != key
+
+    # the font is only referenced from the style sheet
+    write_file(font, "font v2")
+    assert cache.get_key(html, DIMENSIONS) != css_key
+
+
+def test_remote_references_are_not_cached(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 1024 * 1024)
+    style_sheet = str(tmp_path / "style.css")
+    write_file(style_sheet, "@import url('https://example.com/font.css');")
+
+    assert cache.get_key('<img src="https://example.com/image.png">', DIMENSIONS) is None
+    assert cache.get_key('<img src="//example.com/image.png">', DIMENSIONS) is None
+    assert cache.get_key(f'<link rel="stylesheet" href="{style_sheet}">', DIMENSIONS) is None
+
+    cache.put(None, Image.new("RGB", DIMENSIONS))
+    assert cache.get(None) is None
+    assert not os.path.exists(cache.cache_dir)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 1024 * 1024)
+    keys = [cache.get_key(f"<p>{i}</p>", DIMENSIONS) for i in range(3)]
+    # the same screenshot for every key, so each entry has the same size
+    image = Image.effect_noise((64, 64), 64).convert("RGB")
+
+    cache.put(keys[0], image)
+    cache.put(keys[1], image)
+    # room for two screenshots, not for three
+    cache.max_bytes = sum(entry[1] for entry in cache._list_entries())
+    for i, key in enumerate(keys[:2]):
+        os.utime(cache._get_path(key), (i, i))
+
+    # reading the oldest entry makes the other one the least recently used
+    assert cache.get(keys[0]).tobytes() == image.tobytes()
+    cache.put(keys[2], image)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert sum(entry[1] for entry in cache._list_entries()) <= cache.max_bytes
+
+
+def test_size_limit_is_configured(monkeypatch, make_device_config):
+    monkeypatch.setattr(render_cache, "_RENDER_CACHE", None)
+    assert get_render_cache().max_bytes == DEFAULT_CACHE_MB * 1024 * 1024
+    assert get_render_cache(make_device_config(render_cache_mb=2)).max_bytes == 2 * 1024 * 1024
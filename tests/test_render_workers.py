@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from PIL import Image
+
+from plugins import plugin_registry
+from render_workers import RenderWorkerPool
+
+PLUGIN_ID = "workertest"
+
+
+class PidPlugin:
+    """Draws a frame in a color derived from the worker's pid, and counts its renders in the settings."""
+
+    config = {"id": PLUGIN_ID}
+
+    def generate_image(self, settings, device_config):
+        settings["renders"] = settings.get("renders", 0) + 1
+        return Image.new("RGB", device_config.get_resolution(), (os.getpid() % 256, 0, 0))
+
+
+@pytest.fixture
+def pool(monkeypatch, make_device_config):
+    monkeypatch.setitem(plugin_registry.PLUGIN_CLASSES, PLUGIN_ID, PidPlugin())
+    pool = RenderWorkerPool(make_device_config((40, 30), render_worker_max_renders=2), 1)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_workers_are_forked_by_the_spawner(pool):
+    worker = pool.all_workers[0]
+    assert worker.process.ppid() == pool.spawner.pid
+
+    settings = {}
+    image = pool.render(PidPlugin(), settings, pool.device_config)
+    assert image.size == (40, 30)
+    assert image.getpixel((0, 0)) == (worker.process.pid % 256, 0, 0)
+    assert settings == {"renders": 1}
+
+
+def test_replacement_worker_takes_over_the_slot(pool):
+    first = pool.all_workers[0]
+    for _ in range(2):
+        pool.render(PidPlugin(), {}, pool.device_config)
+
+    # recycled after the configured number of renders
+    second, = pool.all_workers
+    assert second is not first
+    assert not first.is_alive()
+    assert second.process.ppid() == pool.spawner.pid
+    assert second.frame_slot is first.frame_slot
+
+    second.process.kill()
+    second.process.wait(5)
+    with pytest.raises(Exception):
+        pool.render(PidPlugin(), {}, pool.device_config)
+    image = pool.render(PidPlugin(), {}, pool.device_config)
+    assert image.getpixel((0, 0)) == (pool.all_workers[0].process.pid % 256, 0, 0)
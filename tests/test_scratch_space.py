@@ -0,0 +1,76 @@
+import os
+import subprocess
+
+import pytest
+
+from utils.scratch_space import DIR_NAME, ScratchSpace
+
+KB = 1024
+
+
+@pytest.fixture
+def scratch_space(tmp_path):
+    return ScratchSpace(str(tmp_path / "ram"), str(tmp_path / "disk"), quota_bytes=64 * KB)
+
+
+def test_files_within_quota_stay_in_ram(scratch_space):
+    with scratch_space.file(".html", size_hint=10) as scratch_file:
+        scratch_file.write(b"<html></html>")
+        scratch_file.close()
+        assert scratch_file.in_ram
+        assert os.path.dirname(scratch_file.path) == scratch_space.ram_dir
+        with open(scratch_file.path, "rb") as f:
+            assert f.read() == b"<html></html>"
+        assert scratch_space.get_ram_usage() >= 13
+
+    assert not os.path.exists(scratch_file.path)
+    assert scratch_space.get_ram_usage() == 0
+
+
+def test_files_over_quota_go_to_disk(scratch_space):
+    with scratch_space.path(".png", size_hint=100 * KB) as path:
+        assert os.path.dirname(path) == scratch_space.disk_dir
+    assert not os.path.exists(path)
+
+    with scratch_space.file(".jpg") as scratch_file:
+        scratch_file.write(b"a" * 40 * KB)
+        ram_path = scratch_file.path
+        scratch_file.write(b"b" * 40 * KB)
+        scratch_file.close()
+
+        # moved to disk once the writes exceeded the quota, keeping what was written
+        assert not scratch_file.in_ram
+        assert not os.path.exists(ram_path)
+        with open(scratch_file.path, "rb") as f:
+            assert f.read() == b"a" * 40 * KB + b"b" * 40 * KB
+
+
+def test_open_files_reserve_their_quota(scratch_space):
+    # the size hint of a file is reserved before anything is written
+    with scratch_space.path(".png", size_hint=40 * KB) as first, \
+            scratch_space.path(".png", size_hint=40 * KB) as second:
+        assert os.path.dirname(first) == scratch_space.ram_dir
+        assert os.path.dirname(second) == scratch_space.disk_dir
+
+    # written bytes are reserved while they may still be buffered
+    with scratch_space.file(".html") as scratch_file:
+        scratch_file.write(b"a" * 50 * KB)
+        assert scratch_file.in_ram
+        with scratch_space.file(".html", size_hint=20 * KB) as other_file:
+            assert not other_file.in_ram
+
+
+def test_cleanup_orphans_keeps_files_of_running_processes(scratch_space):
+    finished = subprocess.Popen(["true"])
+    finished.wait()
+
+    os.makedirs(scratch_space.ram_dir)
+    orphan = os.path.join(scratch_space.ram_dir, f"scratch_{finished.pid}_page.html")
+    running = os.path.join(scratch_space.ram_dir, "scratch_1_page.html")
+    for path in (orphan, running):
+        with open(path, "w") as f:
+            f.write("page")
+
+    scratch_space.cleanup_orphans()
+    assert os.listdir(scratch_space.ram_dir) == [os.path.basename(running)]
+    assert scratch_space.ram_dir.endswith(DIR_NAME)
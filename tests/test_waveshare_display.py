@@ -0,0 +1,135 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from display.display_manager import DisplayManager
+from display.panel_power import PanelPower
+from display.waveshare_display import WaveshareDisplay
+
+DISPLAY_TYPE = "epdstub"
+
+
+class StubEPD:
+    """A driver with the methods of the single color Waveshare drivers, recording its calls."""
+
+    width = 16
+    height = 24
+
+    def __init__(self):
+        self.calls = []
+
+    def init(self):
+        self.calls.append("init")
+
+    def init_part(self):
+        self.calls.append("init_part")
+
+    def getbuffer(self, image):
+        return bytes(image.convert("1").tobytes())
+
+    def display(self, image):
+        self.calls.append("display")
+
+    def display_Partial(self, image):
+        self.calls.append("display_Partial")
+
+    def Clear(self):
+        self.calls.append("Clear")
+
+    def sleep(self):
+        self.calls.append("sleep")
+
+
+class RegionStubEPD(StubEPD):
+    """A driver whose partial refresh takes a region buffer with its coordinates."""
+
+    def display_Partial(self, image, Xstart, Ystart, Xend, Yend):
+        self.calls.append(("display_Partial", bytes(image), Xstart, Ystart, Xend, Yend))
+
+
+@pytest.fixture(autouse=True)
+def stub_driver(monkeypatch):
+    module = types.ModuleType(f"display.waveshare_epd.{DISPLAY_TYPE}")
+    module.EPD = StubEPD
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    return module
+
+
+@pytest.fixture
+def make_config(make_device_config):
+    """Returns a factory of device configs for the stub driver, which sets the resolution."""
+    return lambda **config: make_device_config(None, display_type=DISPLAY_TYPE, **config)
+
+
+def test_initialize_display_with_stub_driver(make_config):
+    device_config = make_config(panel_idle_sleep_seconds=60)
+    display = WaveshareDisplay(device_config)
+
+    assert display.power.state == PanelPower.FULL
+    assert display.power.sleep_timer is not None
+    assert display.supports_partial_refresh()
+    assert device_config.get_config("resolution") == [24, 16]
+    display.shutdown()
+    assert display.epd_display.calls == ["init", "sleep"]
+
+
+def test_controller_sleeps_right_away_without_idle_timeout(make_config):
+    display = WaveshareDisplay(make_config(panel_idle_sleep_seconds=0))
+    assert display.power.state == PanelPower.ASLEEP
+
+    display.display_image(Image.new("RGB", (24, 16), "white"))
+    assert display.epd_display.calls == ["init", "sleep", "init", "display", "sleep"]
+
+
+def test_partial_refresh_until_panel_is_due_to_be_cleared(make_config):
+    device_config = make_config(panel_idle_sleep_seconds=60, clear_policy={"default": {"clear_every": 3}})
+    display_manager = DisplayManager.__new__(DisplayManager)
+    display_manager.device_config = device_config
+    display_manager.display = WaveshareDisplay(device_config)
+
+    image = Image.new("RGB", (24, 16), "white")
+    display_manager.display.display_image(image)
+    display_manager.last_frame = np.asarray(image)
+
+    changed = image.copy()
+    changed.putpixel((0, 0), (0, 0, 0))
+    frame = np.asarray(changed)
+    assert display_manager._get_partial_refresh_regions(frame, changed) == [(0, 0, 1, 1)]
+
+    # the third update since the last clear clears the panel, which takes a full refresh
+    display_manager.display.display_partial(changed, [(0, 0, 1, 1)])
+    assert display_manager._get_partial_refresh_regions(frame, changed) is None
+    display_manager.display.shutdown()
+
+
+def test_region_partial_refresh_slices_the_1bpp_buffer(stub_driver, make_config):
+    stub_driver.EPD = RegionStubEPD
+    display = WaveshareDisplay(make_config(panel_idle_sleep_seconds=60))
+    assert display.buffer_format in ("1bpp", "1bpp_inverted")
+    assert display.supports_partial_refresh()
+
+    # a portrait image matches the panel, so the region is not rotated
+    image = Image.new("1", (16, 24), 1)
+    image.putpixel((9, 2), 0)
+    display.display_partial(image, [(9, 2, 10, 4)])
+
+    buffer = display.get_buffer(image)
+    region = bytes(buffer[2 * 2 + 1:2 * 2 + 2]) + bytes(buffer[3 * 2 + 1:3 * 2 + 2])
+    assert display.epd_display.calls[-1] == ("display_Partial", region, 8, 2, 16, 4)
+    display.shutdown()
+
+
+@pytest.mark.parametrize("buffer_format", ["2bpp_gray", "4bpp_7color", None])
+def test_region_partial_refresh_needs_a_1bpp_buffer(stub_driver, buffer_format, make_config):
+    stub_driver.EPD = RegionStubEPD
+    device_config = make_config(
+        panel_idle_sleep_seconds=60,
+        epd_buffer_format={"display_type": DISPLAY_TYPE, "format": buffer_format})
+    display = WaveshareDisplay(device_config)
+
+    assert display.buffer_format == buffer_format
+    assert not display.supports_partial_refresh()
+    display.shutdown()